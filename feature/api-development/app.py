@@ -1,10 +1,493 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
 import os
+import sys
+import time
 
-app = FastAPI(title="Recommender System API")
+import numpy as np
+
+# The model code and the top-N table reader ship with the app (copied next to app.py in the image)
+ml_model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ml-model")
+if os.path.isdir(ml_model_dir):
+    sys.path.append(ml_model_dir)
+
+from instrumentation import LATENCY_BUCKETS
+from topn_table import TopNTable
+
+logger = logging.getLogger(__name__)
+
+# Product ids are strings in the cleaned data ("id" column) and integers in some test data
+ProductId = Union[int, str]
+
+# Trained model written by train_with_mlflow (directory format, or a .pkl file)
+MODEL_PATH = os.getenv("MODEL_PATH", "models/recommendation_model")
+# Seconds between checks for a new model version (0 disables watching), and the token
+# /admin/reload requires when set
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Threads scoring requests per server worker, and requests allowed to wait for one
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "2"))
+SCORING_QUEUE_SIZE = int(os.getenv("SCORING_QUEUE_SIZE", "32"))
+# Largest number of users accepted by one /predict/batch call
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+# Coalescing of concurrent /predict calls: how long the first call waits for others (0 disables it)
+# and how many calls are scored together at most
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "0"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+
+# Response cache: entries kept per server worker (0 disables the cache), their lifetime,
+# and an optional shared backend (redis://...) used instead of the local one
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_URL = os.getenv("CACHE_URL", "")
+
+# Upper bounds of the coalesced batch size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# Prometheus metrics. With PROMETHEUS_MULTIPROC_DIR set (one directory for all uvicorn workers,
+# emptied before they start) each worker writes its samples to files there and /metrics
+# aggregates every worker, whichever one answers the scrape.
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "endpoint", "status"])
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "endpoint"], buckets=LATENCY_BUCKETS
+)
+RECOMMENDATIONS = Counter("recommendations_total", "Users served recommendations", ["source"])
+SCORING_LATENCY = Histogram(
+    "recommendation_latency_seconds", "Time spent scoring in the model per call", ["mode"], buckets=LATENCY_BUCKETS
+)
+# Cold-start ratio: the session and popular shares of this counter's rate
+SCORED_USERS = Counter("recommender_scored_users_total", "Users scored by the model", ["user_type"])
+CANDIDATES_SCORED = Histogram(
+    "recommender_candidates_scored", "Catalog products ranked for a scored user", buckets=(10, 100, 1e3, 1e4, 1e5, 1e6, 1e7)
+)
+# Children bound once, as label lookups cost more than the updates themselves
+RECOMMENDED_FROM = {source: RECOMMENDATIONS.labels(source) for source in ("table", "cache", "model")}
+SCORED_BY_TYPE = {user_type: SCORED_USERS.labels(user_type) for user_type in ("known", "session", "popular")}
+SCORED_IN = {mode: SCORING_LATENCY.labels(mode) for mode in ("single", "batch")}
+MODEL_INFO = Gauge(
+    "recommender_model_info", "1 for the model version serving requests", ["version"], multiprocess_mode="mostrecent"
+)
+BATCH_SIZE = Histogram("recommender_batch_size", "Calls scored together by the /predict coalescer", buckets=BATCH_SIZE_BUCKETS)
+BATCH_QUEUE_WAIT = Histogram(
+    "recommender_batch_queue_wait_seconds", "Time a /predict call waited for its batch to be sent", buckets=LATENCY_BUCKETS
+)
+CACHE_HITS = Counter("recommender_cache_hits_total", "Live scoring calls answered by the response cache")
+CACHE_MISSES = Counter("recommender_cache_misses_total", "Live scoring calls the response cache could not answer")
+CACHE_EVICTIONS = Counter("recommender_cache_evictions_total", "Cache entries dropped to stay under the size limit")
+CACHE_EXPIRATIONS = Counter("recommender_cache_expirations_total", "Cache entries dropped after their TTL")
+CACHE_ENTRIES = Gauge("recommender_cache_entries", "Entries held by the local response cache", multiprocess_mode="livesum")
+
+# Precomputed top-N table written by train_with_mlflow next to the model, and reloaded with it
+TOPN_TABLE_PATH = os.getenv("TOPN_TABLE_PATH", "models/topn_table")
+
+
+def model_version(path: str) -> Optional[str]:
+    """Version of the model at ``path``, None while there is no model
+
+    The content of the ``<path>.version`` file written by the retraining pipeline
+    once the model and its top-N table are in place, or else the model's
+    modification time.
+    """
+    try:
+        with open(f"{path}.version") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    try:
+        return str(os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+def load_model(path: str):
+    """Load and warm up the model at ``path``; None when no model has been trained yet"""
+    if not os.path.exists(path):
+        logger.warning(f"No model at {path}, serving from the top-N table only")
+        return None
+
+    from recommendation_model import CollaborativeFilteringModel
+
+    loaded = CollaborativeFilteringModel.load_model(path)
+    # Fault in the memory-mapped arrays and build lazy caches before the first request
+    if len(loaded.user_lookup):
+        loaded.recommend_products(loaded.user_lookup.labels[0])
+    logger.info(f"Model loaded from {path}")
+    return loaded
+
+
+class ServingState:
+    """The model and the top-N table written with it, under the version they were published as
+
+    Requests read the module-level ``serving`` once and use its model and table
+    together, so a reload that swaps the whole state never mixes two versions.
+    """
+
+    def __init__(self, model=None, table: Optional[TopNTable] = None, version: Optional[str] = None):
+        self.model = model
+        self.table = table
+        self.version = version
+
+
+def load_serving(model_path: str, table_path: str) -> ServingState:
+    """Load the model and top-N table to serve; either is None when it has not been written"""
+    # Read first: files published after this point belong to the next version
+    version = model_version(model_path)
+    table = TopNTable(table_path) if TopNTable.exists(table_path) else None
+    return ServingState(load_model(model_path), table, version)
+
+
+class ScoringPool:
+    """Bounded thread pool for CPU-bound scoring, so the event loop keeps serving
+
+    At most ``workers`` calls run at once and ``queue_size`` more wait for a
+    thread; further calls are rejected with a 503 instead of queueing latency.
+    The in-flight count is only touched on the event loop, so it needs no lock.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scoring")
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+
+    async def run(self, function, *args):
+        if self.in_flight >= self.capacity:
+            raise HTTPException(status_code=503, detail="Server overloaded, retry later", headers={"Retry-After": "1"})
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self.in_flight -= 1
+
+
+class MicroBatcher:
+    """Coalesces concurrent /predict calls into one batch scoring call
+
+    The first call to arrive opens a batch and waits up to ``window`` seconds for
+    others; the batch is sent earlier once it holds ``max_batch_size`` calls. It is
+    scored with a single recommend_products_batch call in one slot of the scoring
+    pool, and each waiting call gets its own entry back. Like ScoringPool, all
+    state is only touched on the event loop. The batch size and queue wait (time
+    from arrival to dispatch) histograms show how to trade the window against latency.
+    """
+
+    def __init__(self, pool: ScoringPool, window: float, max_batch_size: int):
+        self.pool = pool
+        self.window = window
+        self.max_batch_size = max_batch_size
+        # (user_id, viewed_products, future, arrival time) of the open batch
+        self.pending = []
+        self.pending_model = None
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, serving_model, user_id: int, viewed_products: List[ProductId]) -> list:
+        # A batch is scored by a single model: a model swap closes the open batch
+        if self.pending and serving_model is not self.pending_model:
+            self.flush()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((user_id, viewed_products, future, time.perf_counter()))
+        self.pending_model = serving_model
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        """Send the open batch to the scoring pool"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        # Drop the reference so a swapped-out model is not kept alive by the batcher
+        serving_model, self.pending_model = self.pending_model, None
+        if batch:
+            task = asyncio.ensure_future(self._score(serving_model, batch))
+            # The loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, serving_model, batch):
+        dispatched = time.perf_counter()
+        BATCH_SIZE.observe(len(batch))
+        for _, _, _, arrived in batch:
+            BATCH_QUEUE_WAIT.observe(dispatched - arrived)
+        try:
+            user_ids = [user_id for user_id, _, _, _ in batch]
+            sessions = [viewed_products for _, viewed_products, _, _ in batch]
+            results = await self.pool.run(recommend_batch, serving_model, user_ids, sessions)
+        except Exception as error:
+            # Load shedding and scoring errors reach every call of the batch
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for (_, _, future, _), recommendations in zip(batch, results):
+                # Callers that went away have cancelled their future
+                if not future.done():
+                    future.set_result(recommendations)
+
+
+class LocalCacheBackend:
+    """In-process LRU cache whose entries expire ``ttl`` seconds after being stored
+
+    The default backend, and the stand-in for a shared one in tests and single
+    worker setups. Expired entries are dropped when they are next read.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expiry time, value), least recently used first
+        self.entries = OrderedDict()
+
+    async def get_many(self, keys: List[str]) -> list:
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                CACHE_EXPIRATIONS.inc()
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+            values.append(None if entry is None else entry[1])
+        return values
+
+    async def set_many(self, items: dict):
+        expiry = time.monotonic() + self.ttl
+        for key, value in items.items():
+            self.entries[key] = (expiry, value)
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            CACHE_EVICTIONS.inc()
+        CACHE_ENTRIES.set(len(self.entries))
+
+    async def clear(self):
+        self.entries.clear()
+        CACHE_ENTRIES.set(0)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisCacheBackend:
+    """Cache shared by every worker and pod through Redis (needs the ``redis`` package)
+
+    Redis applies the TTL and its own eviction policy, which show in its own
+    metrics rather than here. Keys carry the model version, so clear() leaves old
+    entries to expire.
+    """
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.ttl = ttl
+
+    async def get_many(self, keys: List[str]) -> list:
+        return [None if raw is None else json.loads(raw) for raw in await self.client.mget(keys)]
+
+    async def set_many(self, items: dict):
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for key, value in items.items():
+                pipeline.set(key, json.dumps(value), px=int(self.ttl * 1000))
+            await pipeline.execute()
+
+    async def clear(self):
+        pass
+
+
+class ResponseCache:
+    """Recommendations of the live scoring path, keyed on (model version, user, viewed products)
+
+    Viewed products are normalized to their sorted distinct ids, since scoring
+    ignores order and repeats. Users the model does not know are scored from
+    their session alone (popularity without one), so their keys leave the user
+    out and share one entry per session. The first lookup with a new model
+    version clears the backend, so a model swap never serves the previous model's answers.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.version = None
+
+    @staticmethod
+    def key(version: str, user_id: Optional[int], viewed_products: List[ProductId]) -> str:
+        """Cache key of a history; ``user_id`` is None for users unknown to the model"""
+        user = "anonymous" if user_id is None else user_id
+        # repr keeps 10 and "10" apart and sorts ids of mixed types
+        return f"recommendations:{version}:{user}:{','.join(sorted(map(repr, set(viewed_products))))}"
+
+    def _keys(self, version: str, model, histories: List["UserHistory"]) -> List[str]:
+        known = model.user_lookup
+        return [self.key(version, h.user_id if h.user_id in known else None, h.viewed_products) for h in histories]
+
+    async def _use_version(self, version: str):
+        if version != self.version:
+            await self.backend.clear()
+            self.version = version
+
+    async def get_many(self, version: str, model, histories: List["UserHistory"]) -> list:
+        """Cached recommendations of each history scored by ``model``, None for misses"""
+        await self._use_version(version)
+        values = await self.backend.get_many(self._keys(version, model, histories))
+        found = sum(value is not None for value in values)
+        CACHE_HITS.inc(found)
+        CACHE_MISSES.inc(len(values) - found)
+        return values
+
+    async def set_many(self, version: str, model, histories: List["UserHistory"], recommendations: List[list]):
+        if version != self.version:
+            # The model changed while these were scored
+            return
+        await self.backend.set_many(dict(zip(self._keys(version, model, histories), recommendations)))
+
+
+def create_response_cache():
+    """Response cache configured by CACHE_URL and CACHE_MAX_ENTRIES, or None when disabled"""
+    if CACHE_URL:
+        return ResponseCache(RedisCacheBackend(CACHE_URL, CACHE_TTL_SECONDS))
+    if CACHE_MAX_ENTRIES > 0:
+        return ResponseCache(LocalCacheBackend(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS))
+    return None
+
+
+serving = ServingState()
+scoring_pool = ScoringPool(SCORING_WORKERS, SCORING_QUEUE_SIZE)
+micro_batcher = MicroBatcher(scoring_pool, BATCH_WINDOW_MS / 1000, BATCH_MAX_SIZE) if BATCH_WINDOW_MS > 0 else None
+response_cache = create_response_cache()
+
+
+class ModelReloader:
+    """Loads new model versions in the background and swaps them in once warm
+
+    The model and its top-N table are loaded into a new ServingState that
+    replaces ``serving`` in one assignment. Requests read that reference once,
+    so in-flight requests finish on the state they started with, whose arrays
+    are released when the last of them drops it. Loading runs on its own
+    thread, so the scoring threads keep serving meanwhile.
+    """
+
+    def __init__(self, path: str, table_path: str, interval: float):
+        self.path = path
+        self.table_path = table_path
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self.lock = asyncio.Lock()
+
+    async def reload(self, force: bool = False) -> bool:
+        """Swap in the model and table at ``path`` if their version changed (or ``force``); True when swapped"""
+        global serving
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            version = await loop.run_in_executor(self.executor, model_version, self.path)
+            if version is None or (not force and version == serving.version):
+                return False
+            loaded = await loop.run_in_executor(self.executor, load_serving, self.path, self.table_path)
+            if loaded.model is None:
+                return False
+            previous, serving = serving, loaded
+            publish_model_version(previous, loaded)
+            logger.info(f"Serving model version {loaded.version} (was {previous.version})")
+            return True
+
+    async def watch(self):
+        """Check for a new version every ``interval`` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reload()
+            except Exception as error:
+                # A half-written or broken model keeps the current one serving; the next check retries
+                logger.error(f"Model reload from {self.path} failed: {error}")
+
+
+def publish_model_version(previous: ServingState, current: ServingState):
+    """Point the model info gauge at the version of ``current``"""
+    if previous.version is not None and previous.version != current.version:
+        MODEL_INFO.labels(previous.version).set(0)
+    if current.version is not None:
+        MODEL_INFO.labels(current.version).set(1)
+
+
+model_reloader = ModelReloader(MODEL_PATH, TOPN_TABLE_PATH, MODEL_RELOAD_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load once per server worker, off the event loop, before accepting traffic
+    global serving
+    previous = serving
+    serving = await asyncio.get_running_loop().run_in_executor(
+        scoring_pool.executor, load_serving, MODEL_PATH, TOPN_TABLE_PATH
+    )
+    publish_model_version(previous, serving)
+    watcher = asyncio.create_task(model_reloader.watch()) if model_reloader.interval > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+
+
+class PrometheusMiddleware:
+    """Counts requests and times them per method, endpoint and status
+
+    A plain ASGI middleware, so it adds no task or request object per call. The
+    endpoint label is the route's path template (every unmatched path is
+    ``unmatched``), which keeps the label set bounded, and metric children are
+    kept by label values to skip the client's own lookup on the hot path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.children = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "unmatched", status)
+            children = self.children.get(key)
+            if children is None:
+                children = self.children[key] = (
+                    HTTP_REQUESTS.labels(key[0], key[1], str(status)),
+                    HTTP_REQUEST_DURATION.labels(key[0], key[1]),
+                )
+            children[0].inc()
+            children[1].observe(elapsed)
+
+
+app = FastAPI(title="Recommender System API", lifespan=lifespan)
+app.add_middleware(PrometheusMiddleware)
 
 # Mount static directory if it exists
 static_dir = os.path.join(os.path.dirname(__file__), "static")
@@ -15,12 +498,86 @@ if os.path.exists(static_dir):
 # Modèles de données
 class UserHistory(BaseModel):
     user_id: int
-    viewed_products: List[int]
+    viewed_products: List[ProductId]
 
 
 class Response(BaseModel):
     user_id: int
-    recommendations: List[int]
+    recommendations: List[Union[int, str]]
+
+
+class BatchRequest(BaseModel):
+    users: List[UserHistory] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class BatchResponse(BaseModel):
+    # Parallel arrays in request order, without per-user keys or scores
+    user_ids: List[int]
+    recommendations: List[List[Union[int, str]]]
+
+
+def observe_scored_users(serving_model, user_ids: List[int], sessions: List[List[ProductId]]):
+    """Feed the user type counts and candidate histogram for users scored by ``serving_model``
+
+    Known users rank every product they have not rated, session users every
+    product but the ones they viewed; popular users are served a stored ranking.
+    """
+    user_lookup, indptr = serving_model.user_lookup, serving_model.user_item_matrix.indptr
+    n_products = len(serving_model.product_lookup)
+    counts = {"known": 0, "session": 0, "popular": 0}
+    for user_id, session in zip(user_ids, sessions):
+        if user_id in user_lookup:
+            user_index = user_lookup[user_id]
+            CANDIDATES_SCORED.observe(n_products - int(indptr[user_index + 1] - indptr[user_index]))
+            counts["known"] += 1
+        elif session:
+            CANDIDATES_SCORED.observe(n_products - len(set(session)))
+            counts["session"] += 1
+        else:
+            counts["popular"] += 1
+    for user_type, count in counts.items():
+        if count:
+            SCORED_BY_TYPE[user_type].inc(count)
+
+
+def recommend(serving_model, user_id: int, viewed_products: List[ProductId]) -> list:
+    """Product ids recommended by ``serving_model``, as JSON-ready Python values"""
+    start = time.perf_counter()
+    recommendations = serving_model.recommend_products(user_id, viewed_products=viewed_products)
+    SCORED_IN["single"].observe(time.perf_counter() - start)
+    observe_scored_users(serving_model, [user_id], [viewed_products])
+    return np.asarray([product for product, _ in recommendations]).tolist()
+
+
+def recommend_batch(serving_model, user_ids: List[int], sessions: List[List[ProductId]]) -> List[list]:
+    """Product ids recommended for each user, scored together in one batch"""
+    start = time.perf_counter()
+    recommendations = serving_model.recommend_products_batch(user_ids, viewed_products=sessions)
+    SCORED_IN["batch"].observe(time.perf_counter() - start)
+    observe_scored_users(serving_model, user_ids, sessions)
+    return [np.asarray([product for product, _ in user_recommendations]).tolist() for user_recommendations in recommendations]
+
+
+def lookup_table(table: Optional[TopNTable], history: UserHistory):
+    """Precomputed top-N of a known user in ``table``, or None
+
+    One O(1) slice of memory-mapped arrays: cheaper than a hop to the scoring pool, so it runs on the event loop.
+    """
+    if table is None:
+        return None
+    top_n = table.lookup(history.user_id)
+    return None if top_n is None else top_n[0].tolist()
+
+
+def score_table_session(table: TopNTable, history: UserHistory):
+    """Recommendations for ``history``'s viewed products from the table's item neighbor graph, or None"""
+    top_n = table.score_session(history.viewed_products, table.manifest.get("n", 10))
+    return None if top_n is None else top_n[0].tolist()
+
+
+def score_table_sessions(table: TopNTable, users: List[UserHistory]) -> list:
+    """score_table_session for every user of a batch, in one call so it takes a single scoring pool slot"""
+    return [score_table_session(table, history) for history in users]
 
 
 @app.get("/health")
@@ -28,8 +585,101 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.post("/admin/reload")
+async def reload_model(x_admin_token: str = Header(default="")):
+    """Load and swap in the model at MODEL_PATH now, in this server worker"""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    try:
+        reloaded = await model_reloader.reload(force=True)
+    except Exception as error:
+        logger.error(f"Model reload from {model_reloader.path} failed: {error}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {error}")
+    return {"reloaded": reloaded, "version": serving.version}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Samples of every server worker, read from the shared directory
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return PlainTextResponse(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/predict", response_model=Response)
-def predict(history: UserHistory):
-    # Logique fictive (Mock)
-    recommendations = [101, 102, 103]
+async def predict(history: UserHistory):
+    # Known users: one slice of the precomputed table.
+    # Anonymous and new users: their viewed products scored against the table's item neighbor graph
+    # Slices stay on the event loop; session scoring is numpy work and runs in the scoring pool
+    state = serving
+    recommendations = lookup_table(state.table, history)
+    if recommendations is None and state.table is not None and history.viewed_products:
+        recommendations = await scoring_pool.run(score_table_session, state.table, history)
+    if recommendations is not None:
+        RECOMMENDED_FROM["table"].inc()
+        return {"user_id": history.user_id, "recommendations": recommendations}
+
+    # Everything else is scored live by the model (popularity for cold-start users)
+    serving_model = state.model
+    if serving_model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    cache, version = response_cache, state.version
+    if cache is not None:
+        recommendations = (await cache.get_many(version, serving_model, [history]))[0]
+        if recommendations is not None:
+            RECOMMENDED_FROM["cache"].inc()
+            return {"user_id": history.user_id, "recommendations": recommendations}
+
+    if micro_batcher is not None:
+        recommendations = await micro_batcher.submit(serving_model, history.user_id, history.viewed_products)
+    else:
+        recommendations = await scoring_pool.run(recommend, serving_model, history.user_id, history.viewed_products)
+    if cache is not None:
+        await cache.set_many(version, serving_model, [history], [recommendations])
+    RECOMMENDED_FROM["model"].inc()
     return {"user_id": history.user_id, "recommendations": recommendations}
+
+
+@app.post("/predict/batch", response_model=BatchResponse)
+async def predict_batch(batch: BatchRequest):
+    users = batch.users
+    state = serving
+    recommendations = [lookup_table(state.table, history) for history in users]
+    sessions = [
+        position for position, found in enumerate(recommendations) if found is None and users[position].viewed_products
+    ]
+    if state.table is not None and sessions:
+        scored = await scoring_pool.run(score_table_sessions, state.table, [users[position] for position in sessions])
+        for position, user_recommendations in zip(sessions, scored):
+            recommendations[position] = user_recommendations
+
+    # Users the table cannot answer are scored by the model in a single call
+    remaining = [position for position, found in enumerate(recommendations) if found is None]
+    RECOMMENDED_FROM["table"].inc(len(users) - len(remaining))
+    if remaining:
+        serving_model = state.model
+        if serving_model is None:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        cache, version = response_cache, state.version
+        if cache is not None:
+            cached = await cache.get_many(version, serving_model, [users[position] for position in remaining])
+            for position, user_recommendations in zip(remaining, cached):
+                recommendations[position] = user_recommendations
+            remaining = [position for position in remaining if recommendations[position] is None]
+            RECOMMENDED_FROM["cache"].inc(len(cached) - len(remaining))
+
+    if remaining:
+        misses = [users[position] for position in remaining]
+        user_ids = [history.user_id for history in misses]
+        sessions = [history.viewed_products for history in misses]
+        scored = await scoring_pool.run(recommend_batch, serving_model, user_ids, sessions)
+        for position, user_recommendations in zip(remaining, scored):
+            recommendations[position] = user_recommendations
+        if cache is not None:
+            await cache.set_many(version, serving_model, misses, scored)
+        RECOMMENDED_FROM["model"].inc(len(misses))
+
+    # Plain lists are already JSON-ready: skip re-validating the response model
+    return JSONResponse({"user_ids": [history.user_id for history in users], "recommendations": recommendations})
@@ -0,0 +1,98 @@
+"""
+Benchmark: per-request overhead of the Prometheus instrumentation
+Branch: feature/api-development
+
+Drives a one-route FastAPI app straight through ASGI (no sockets), once bare
+and once wrapped in PrometheusMiddleware, and reports the difference per
+request, plus the cost of the per-call model metrics (observe_scored_users).
+With --multiprocess the metrics are written to a PROMETHEUS_MULTIPROC_DIR, as
+under multi-worker uvicorn.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def request_us(asgi_app, requests: int) -> float:
+    """Mean time of one GET /ping through ``asgi_app`` in microseconds, best of 5 runs"""
+    scope = {"type": "http", "method": "GET", "path": "/ping", "raw_path": b"/ping", "root_path": "",
+             "query_string": b"", "headers": [], "scheme": "http", "server": ("bench", 80), "http_version": "1.1"}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def run():
+        for _ in range(requests):
+            await asgi_app(dict(scope), receive, send)
+
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        asyncio.run(run())
+        best = min(best, time.perf_counter() - start)
+    return best / requests * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overhead of the Prometheus middleware and model metrics")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--multiprocess", action="store_true", help="write metrics to a multiprocess directory")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.multiprocess:
+            # Must be set before prometheus_client creates the metrics
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = tmp
+
+        import numpy as np
+        import pandas as pd
+        from fastapi import FastAPI
+
+        from app import PrometheusMiddleware, observe_scored_users
+        from recommendation_model import CollaborativeFilteringModel
+
+        async def ping():
+            return {"status": "ok"}
+
+        def build(instrumented: bool):
+            bench_app = FastAPI()
+            bench_app.add_api_route("/ping", ping, methods=["GET"])
+            if instrumented:
+                bench_app.add_middleware(PrometheusMiddleware)
+            return bench_app
+
+        # Alternate the two apps so machine noise hits both alike
+        bare_app, instrumented_app = build(False), build(True)
+        bare, instrumented = float("inf"), float("inf")
+        for _ in range(3):
+            bare = min(bare, request_us(bare_app, args.requests))
+            instrumented = min(instrumented, request_us(instrumented_app, args.requests))
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({"user_id": rng.integers(0, 200, 4000), "product_id": rng.integers(0, 500, 4000),
+                           "rating": rng.integers(1, 6, 4000).astype(float)})
+        model = CollaborativeFilteringModel(min_interactions=1).fit(df.drop_duplicates(["user_id", "product_id"]))
+        user_id = model.user_lookup.labels[0]
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            observe_scored_users(model, [user_id], [[]])
+        model_metrics = (time.perf_counter() - start) / args.requests * 1e6
+
+    print(f"Mode: {'multiprocess' if args.multiprocess else 'single process'}, requests: {args.requests}")
+    print(f"{'path':>32} {'us/request':>11}")
+    print(f"{'bare app':>32} {bare:11.2f}")
+    print(f"{'with PrometheusMiddleware':>32} {instrumented:11.2f}")
+    print(f"{'middleware overhead':>32} {instrumented - bare:11.2f}")
+    print(f"{'observe_scored_users (1 user)':>32} {model_metrics:11.2f}")
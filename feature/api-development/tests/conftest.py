@@ -0,0 +1,43 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Ajout du dossier parent au chemin système pour trouver app.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+
+
+@pytest.fixture(scope="session", autouse=True)
+def trained_model(tmp_path_factory):
+    """
+    Entraîne un petit modèle (utilisateurs 0-19, produits 1-40), l'enregistre
+    au format répertoire et le charge dans l'API, comme le ferait le démarrage.
+    """
+    from recommendation_model import CollaborativeFilteringModel
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "user_id": rng.integers(0, 20, 300),
+            "product_id": rng.integers(1, 41, 300),
+            "rating": rng.integers(1, 6, 300).astype(float),
+        }
+    ).drop_duplicates(subset=["user_id", "product_id"])
+
+    path = str(tmp_path_factory.mktemp("models") / "recommendation_model")
+    CollaborativeFilteringModel(min_interactions=1).fit(df).save_model(path)
+
+    app_module.serving = app_module.ServingState(app_module.load_model(path), None, app_module.model_version(path))
+    yield app_module.serving.model
+    app_module.serving = app_module.ServingState()
+
+
+@pytest.fixture
+def model_path(trained_model, tmp_path):
+    """Chemin d'un modèle enregistré, pour tester le chargement au démarrage"""
+    path = str(tmp_path / "recommendation_model")
+    trained_model.save_model(path)
+    return path
@@ -10,6 +10,13 @@ from app import app  # On importe depuis 'app', pas 'main'
 client = TestClient(app)
 
 
+def sample(name, **labels):
+    """Valeur courante d'une métrique Prometheus (0 tant qu'elle n'a rien enregistré)"""
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
@@ -23,3 +30,397 @@ def test_predict_endpoint():
     data = response.json()
     assert "recommendations" in data
     assert data["user_id"] == 1
+
+
+def test_predict_uses_topn_table(tmp_path, monkeypatch):
+    import app as app_module
+    from topn_table import TopNTable, save_topn_arrays
+
+    path = str(tmp_path / "topn")
+    save_topn_arrays(path, [1, 2], [501, 502, 503], [0, 2, 3], [2, 0, 1], [0.9, 0.4, 0.8])
+    monkeypatch.setattr(app_module.serving, "table", TopNTable(path))
+
+    response = client.post("/predict", json={"user_id": 1, "viewed_products": []})
+    assert response.json()["recommendations"] == [503, 501]
+
+    # Users missing from the table fall back to live scoring
+    response = client.post("/predict", json={"user_id": 3, "viewed_products": [10]})
+    assert response.status_code == 200
+    assert response.json()["user_id"] == 3
+
+
+def test_predict_scores_viewed_products(tmp_path, monkeypatch):
+    import app as app_module
+    from topn_table import TopNTable, save_topn_arrays
+
+    # Neighbors 501 -> 502 (0.5), 503 (0.2) and 503 -> 502 (0.4)
+    neighbors = ([0, 2, 2, 3], [1, 2, 1], [0.5, 0.2, 0.4])
+    path = str(tmp_path / "topn")
+    save_topn_arrays(path, [1], [501, 502, 503], [0, 1], [2], [0.9], {"n": 5}, neighbors)
+    monkeypatch.setattr(app_module.serving, "table", TopNTable(path))
+
+    response = client.post("/predict", json={"user_id": 7, "viewed_products": [501, 999]})
+    assert response.json()["recommendations"] == [502, 503]
+
+    response = client.post("/predict", json={"user_id": 7, "viewed_products": [501, 503]})
+    assert response.json()["recommendations"] == [502]
+
+
+def test_table_sessions_run_in_scoring_pool(tmp_path, monkeypatch):
+    import threading
+    import app as app_module
+    from topn_table import TopNTable, save_topn_arrays
+
+    neighbors = ([0, 1, 1], [1], [0.5])
+    path = str(tmp_path / "topn")
+    save_topn_arrays(path, [1], [501, 502], [0, 1], [1], [0.9], {"n": 5}, neighbors)
+    table = TopNTable(path)
+    monkeypatch.setattr(app_module.serving, "table", table)
+
+    # Les tranches O(1) des utilisateurs connus restent dans la boucle, seul le score de session part dans le pool
+    threads = {"lookup": [], "score_session": []}
+    for name in threads:
+        original = getattr(table, name)
+
+        def recorded(*args, original=original, name=name):
+            threads[name].append(threading.current_thread().name)
+            return original(*args)
+
+        monkeypatch.setattr(table, name, recorded)
+
+    assert client.post("/predict", json={"user_id": 1, "viewed_products": []}).json()["recommendations"] == [502]
+    users = [{"user_id": 1, "viewed_products": []}, {"user_id": 9, "viewed_products": [501]}]
+    response = client.post("/predict/batch", json={"users": users})
+    assert response.json()["recommendations"] == [[502], [502]]
+    assert len(threads["lookup"]) == 3 and not any(name.startswith("scoring") for name in threads["lookup"])
+    assert len(threads["score_session"]) == 1 and threads["score_session"][0].startswith("scoring")
+
+
+def test_predict_uses_model(trained_model):
+    # Sans table top-N, les utilisateurs connus sont notés par le modèle
+    user_id = int(trained_model.user_lookup.labels[0])
+    response = client.post("/predict", json={"user_id": user_id, "viewed_products": []})
+    assert response.status_code == 200
+    expected = [product for product, _ in trained_model.recommend_products(user_id)]
+    assert response.json()["recommendations"] == expected
+
+    # Utilisateur inconnu : score de session à partir des produits vus
+    response = client.post("/predict", json={"user_id": 999, "viewed_products": [1, 2]})
+    expected = [product for product, _ in trained_model.recommend_for_session([1, 2])]
+    assert response.json()["recommendations"] == expected
+
+
+def test_predict_without_model(monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.serving, "model", None)
+    response = client.post("/predict", json={"user_id": 1, "viewed_products": [10]})
+    assert response.status_code == 503
+
+
+def test_predict_sheds_load_when_pool_is_full(monkeypatch):
+    import app as app_module
+
+    # Un seul thread déjà occupé et aucune place dans la file : la requête est rejetée
+    pool = app_module.ScoringPool(workers=1, queue_size=0)
+    pool.in_flight = 1
+    monkeypatch.setattr(app_module, "scoring_pool", pool)
+    monkeypatch.setattr(app_module, "response_cache", None)
+
+    response = client.post("/predict", json={"user_id": 1, "viewed_products": [10]})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_lifespan_loads_model(model_path, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "serving", app_module.ServingState())
+    monkeypatch.setattr(app_module, "MODEL_PATH", model_path)
+    with TestClient(app) as started:
+        assert app_module.serving.model is not None
+        response = started.post("/predict", json={"user_id": 1, "viewed_products": []})
+        assert response.status_code == 200
+        assert len(response.json()["recommendations"]) > 0
+
+
+def test_predict_batch_matches_predict(trained_model):
+    # Utilisateurs connus, inconnu avec session et inconnu sans session, dans l'ordre de la requête
+    known = [int(user_id) for user_id in trained_model.user_lookup.labels[:3]]
+    users = [
+        {"user_id": known[0], "viewed_products": []},
+        {"user_id": 999, "viewed_products": [1, 2]},
+        {"user_id": known[1], "viewed_products": [3]},
+        {"user_id": 998, "viewed_products": []},
+        {"user_id": known[2], "viewed_products": []},
+    ]
+    response = client.post("/predict/batch", json={"users": users})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user_ids"] == [user["user_id"] for user in users]
+    expected = [client.post("/predict", json=user).json()["recommendations"] for user in users]
+    assert data["recommendations"] == expected
+
+
+def test_predict_batch_uses_topn_table(tmp_path, monkeypatch):
+    import app as app_module
+    from topn_table import TopNTable, save_topn_arrays
+
+    path = str(tmp_path / "topn")
+    save_topn_arrays(path, [1, 2], [501, 502, 503], [0, 2, 3], [2, 0, 1], [0.9, 0.4, 0.8])
+    monkeypatch.setattr(app_module.serving, "table", TopNTable(path))
+
+    # La table répond seule : aucun modèle n'est nécessaire
+    monkeypatch.setattr(app_module.serving, "model", None)
+    users = [{"user_id": 2, "viewed_products": []}, {"user_id": 1, "viewed_products": []}]
+    response = client.post("/predict/batch", json={"users": users})
+    assert response.json() == {"user_ids": [2, 1], "recommendations": [[502], [503, 501]]}
+
+    # Un utilisateur hors table exige le modèle
+    users.append({"user_id": 3, "viewed_products": []})
+    response = client.post("/predict/batch", json={"users": users})
+    assert response.status_code == 503
+
+
+def test_predict_batch_size_limit():
+    import app as app_module
+
+    users = [{"user_id": user_id, "viewed_products": []} for user_id in range(app_module.MAX_BATCH_SIZE + 1)]
+    response = client.post("/predict/batch", json={"users": users})
+    assert response.status_code == 422
+
+
+def test_micro_batcher_coalesces_concurrent_calls(trained_model):
+    import asyncio
+    import app as app_module
+
+    users = [int(user_id) for user_id in trained_model.user_lookup.labels[:3]] + [999]
+    sessions = [[], [3], [], [1, 2]]
+
+    async def predict_concurrently():
+        # Fenêtre longue : seule la taille maximale déclenche l'envoi du lot
+        batcher = app_module.MicroBatcher(app_module.ScoringPool(workers=1, queue_size=4), window=5.0, max_batch_size=4)
+        results = await asyncio.gather(
+            *(batcher.submit(trained_model, user_id, session) for user_id, session in zip(users, sessions))
+        )
+        return batcher, results
+
+    batches, waits = sample("recommender_batch_size_count"), sample("recommender_batch_queue_wait_seconds_count")
+    batcher, results = asyncio.run(predict_concurrently())
+    expected = [app_module.recommend(trained_model, user_id, session) for user_id, session in zip(users, sessions)]
+    assert results == expected
+    assert sample("recommender_batch_size_count") == batches + 1
+    assert sample("recommender_batch_size_bucket", le="4.0") - sample("recommender_batch_size_bucket", le="2.0") >= 1
+    assert sample("recommender_batch_queue_wait_seconds_count") == waits + 4
+
+
+def test_predict_with_micro_batching(trained_model, monkeypatch):
+    import app as app_module
+
+    # Un appel isolé est envoyé à l'expiration de la fenêtre
+    batcher = app_module.MicroBatcher(app_module.ScoringPool(workers=1, queue_size=4), window=0.002, max_batch_size=64)
+    monkeypatch.setattr(app_module, "micro_batcher", batcher)
+    monkeypatch.setattr(app_module, "response_cache", None)
+    user_id = int(trained_model.user_lookup.labels[0])
+    batches = sample("recommender_batch_size_bucket", le="1.0")
+    response = client.post("/predict", json={"user_id": user_id, "viewed_products": []})
+    assert response.json()["recommendations"] == app_module.recommend(trained_model, user_id, [])
+    assert sample("recommender_batch_size_bucket", le="1.0") == batches + 1
+
+
+def test_response_cache_serves_repeated_calls(trained_model, monkeypatch):
+    import asyncio
+    import app as app_module
+
+    cache = app_module.ResponseCache(app_module.LocalCacheBackend(max_entries=10, ttl=60))
+    monkeypatch.setattr(app_module, "response_cache", cache)
+    user_id = int(trained_model.user_lookup.labels[0])
+    hits, misses = sample("recommender_cache_hits_total"), sample("recommender_cache_misses_total")
+
+    def counts():
+        return sample("recommender_cache_hits_total") - hits, sample("recommender_cache_misses_total") - misses
+
+    first = client.post("/predict", json={"user_id": 999, "viewed_products": [2, 1, 2]}).json()
+    assert counts() == (0, 1)
+
+    # Même session dans un autre ordre : réponse servie par le cache, sans passer par le pool
+    pool = app_module.ScoringPool(workers=1, queue_size=0)
+    pool.in_flight = 1
+    monkeypatch.setattr(app_module, "scoring_pool", pool)
+    second = client.post("/predict", json={"user_id": 999, "viewed_products": [1, 2]}).json()
+    assert second == first and counts() == (1, 1)
+
+    # Le lot mélange un succès de cache et un utilisateur à calculer
+    monkeypatch.setattr(app_module, "scoring_pool", app_module.ScoringPool(workers=1, queue_size=1))
+    users = [{"user_id": 999, "viewed_products": [1, 2]}, {"user_id": user_id, "viewed_products": []}]
+    response = client.post("/predict/batch", json={"users": users}).json()
+    assert response["recommendations"][0] == first["recommendations"]
+    assert counts() == (2, 2)
+
+    # Un nouveau modèle vide le cache
+    assert asyncio.run(cache.get_many("other-version", trained_model, [app_module.UserHistory(**users[0])])) == [None]
+    assert len(cache.backend) == 0
+    assert sample("recommender_cache_entries") == 0
+
+
+def test_response_cache_shares_popularity_answers(trained_model, monkeypatch):
+    import app as app_module
+
+    cache = app_module.ResponseCache(app_module.LocalCacheBackend(max_entries=10, ttl=60))
+    monkeypatch.setattr(app_module, "response_cache", cache)
+    monkeypatch.setattr(app_module.serving, "table", None)
+    user_id = int(trained_model.user_lookup.labels[0])
+    hits = sample("recommender_cache_hits_total")
+
+    # Utilisateurs inconnus sans session : une seule entrée (popularité) partagée entre eux
+    first = client.post("/predict", json={"user_id": 998, "viewed_products": []}).json()
+    second = client.post("/predict", json={"user_id": 997, "viewed_products": []}).json()
+    assert second["recommendations"] == first["recommendations"] and second["user_id"] == 997
+    assert sample("recommender_cache_hits_total") == hits + 1
+
+    # Les utilisateurs connus gardent leur propre entrée
+    known = client.post("/predict", json={"user_id": user_id, "viewed_products": []}).json()
+    assert known["recommendations"] == app_module.recommend(trained_model, user_id, [])
+    assert sample("recommender_cache_hits_total") == hits + 1
+    assert len(cache.backend) == 2
+
+
+def test_local_cache_backend_lru_and_ttl(monkeypatch):
+    import asyncio
+    import app as app_module
+
+    now = [0.0]
+    monkeypatch.setattr(app_module.time, "monotonic", lambda: now[0])
+    backend = app_module.LocalCacheBackend(max_entries=2, ttl=10)
+    evictions, expirations = sample("recommender_cache_evictions_total"), sample("recommender_cache_expirations_total")
+
+    async def scenario():
+        await backend.set_many({"a": [1], "b": [2]})
+        assert await backend.get_many(["a"]) == [[1]]
+        # "b" est le moins récemment utilisé
+        await backend.set_many({"c": [3]})
+        assert await backend.get_many(["a", "b", "c"]) == [[1], None, [3]]
+        now[0] = 11.0
+        assert await backend.get_many(["a", "c"]) == [None, None]
+
+    asyncio.run(scenario())
+    assert sample("recommender_cache_evictions_total") == evictions + 1
+    assert sample("recommender_cache_expirations_total") == expirations + 2
+
+
+def test_reload_swaps_model_when_version_changes(trained_model, model_path, tmp_path, monkeypatch):
+    import asyncio
+    import gc
+    import weakref
+    import app as app_module
+    from topn_table import save_topn_arrays, write_topn_table
+
+    table_path = str(tmp_path / "topn")
+    write_topn_table(trained_model, table_path)
+    monkeypatch.setattr(app_module, "serving", app_module.load_serving(model_path, table_path))
+    reloader = app_module.ModelReloader(model_path, table_path, interval=0)
+    # Même version : rien à recharger
+    assert asyncio.run(reloader.reload()) is False
+
+    # Une requête en cours garde l'ancien modèle et l'ancienne table jusqu'à sa fin
+    in_flight = app_module.serving
+    released = weakref.ref(in_flight.model)
+
+    # Nouvelle table puis fichier de version, comme retrain_pipeline.deploy_model
+    save_topn_arrays(table_path, [1], [501, 502], [0, 1], [1], [0.9])
+    with open(f"{model_path}.version", "w") as f:
+        f.write("v2\n")
+    assert asyncio.run(reloader.reload()) is True
+    assert app_module.serving is not in_flight and app_module.serving.version == "v2"
+    assert app_module.serving.model is not in_flight.model
+    # Le modèle et la table sont échangés ensemble
+    response = client.post("/predict", json={"user_id": 1, "viewed_products": []})
+    assert response.json()["recommendations"] == [502]
+    assert released() is not None
+
+    del in_flight
+    gc.collect()
+    assert released() is None
+
+
+def test_admin_reload_endpoint(model_path, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "serving", app_module.ServingState())
+    monkeypatch.setattr(app_module, "model_reloader", app_module.ModelReloader(model_path, "missing", interval=0))
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+
+    assert client.post("/admin/reload").status_code == 403
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json() == {"reloaded": True, "version": app_module.model_version(model_path)}
+    assert client.post("/predict", json={"user_id": 1, "viewed_products": []}).status_code == 200
+
+
+def test_metrics_endpoint(trained_model, monkeypatch):
+    import app as app_module
+
+    # Les noms suivent les règles d'alerte (prometheus/alerts.yml) et les tableaux de bord Grafana
+    monkeypatch.setattr(app_module, "response_cache", None)
+    user_id = int(trained_model.user_lookup.labels[0])
+    requests = sample("http_requests_total", method="POST", endpoint="/predict", status="200")
+    scored = sample("recommender_scored_users_total", user_type="session")
+    client.post("/predict", json={"user_id": user_id, "viewed_products": []})
+    client.post("/predict", json={"user_id": 12345, "viewed_products": [7, 8]})
+    client.get("/unknown/path")
+
+    assert sample("http_requests_total", method="POST", endpoint="/predict", status="200") >= requests + 1
+    assert sample("http_requests_total", method="GET", endpoint="unmatched", status="404") >= 1
+    assert sample("http_request_duration_seconds_count", method="POST", endpoint="/predict") >= 1
+    assert sample("recommender_scored_users_total", user_type="session") == scored + 1
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("http_requests_total", "http_request_duration_seconds_bucket", "recommendation_latency_seconds_bucket",
+                 "recommendations_total", "recommender_candidates_scored_bucket"):
+        assert name in response.text
+
+
+def test_lifespan_publishes_model_version(model_path, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "serving", app_module.ServingState())
+    monkeypatch.setattr(app_module, "MODEL_PATH", model_path)
+    with TestClient(app):
+        version = app_module.serving.version
+        assert sample("recommender_model_info", version=version) == 1
+
+
+def test_predict_with_string_product_ids(tmp_path, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    import app as app_module
+    from recommendation_model import CollaborativeFilteringModel
+    from topn_table import TopNTable, write_topn_table
+
+    # Identifiants produit en chaînes, comme la colonne "id" des données nettoyées
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(
+        {
+            "user_id": rng.integers(0, 15, 200),
+            "product_id": [f"P{code:04d}" for code in rng.integers(0, 30, 200)],
+            "rating": rng.integers(1, 6, 200).astype(float),
+        }
+    ).drop_duplicates(subset=["user_id", "product_id"])
+    string_model = CollaborativeFilteringModel(min_interactions=1).fit(df)
+    monkeypatch.setattr(app_module, "serving", app_module.ServingState(string_model, None, "strings"))
+    monkeypatch.setattr(app_module, "response_cache", None)
+
+    session = ["P0001", "P0002"]
+    response = client.post("/predict", json={"user_id": 999, "viewed_products": session})
+    assert response.status_code == 200
+    expected = [product for product, _ in string_model.recommend_for_session(session)]
+    assert expected and response.json()["recommendations"] == expected
+
+    # Même session servie par le graphe de voisins de la table top-N
+    path = str(tmp_path / "topn")
+    write_topn_table(string_model, path, neighbor_k=10)
+    table = TopNTable(path)
+    monkeypatch.setattr(app_module.serving, "table", table)
+    response = client.post("/predict/batch", json={"users": [{"user_id": 999, "viewed_products": session}]})
+    assert response.json()["recommendations"] == [table.score_session(session, table.manifest.get("n", 10))[0].tolist()]
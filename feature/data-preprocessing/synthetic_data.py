@@ -0,0 +1,370 @@
+"""
+Synthetic Interaction Generator for Capacity Testing
+Branch: feature/data-preprocessing
+
+Streams power-law (Zipf) user/product interactions in chunks, so tens of
+millions of rows can be written to CSV or Parquet with memory bounded by the
+chunk size plus a few arrays per user and per product. Two schemas are
+available:
+
+- ``raw``: the Amazon review columns ``DataPreprocessor`` reads
+- ``cleaned``: the columns ``DataPreprocessor`` writes and the model trains on,
+  aggregate columns included (computed in a first counting pass)
+
+Each chunk draws from its own seeded generator, so the same parameters always
+produce the same file.
+"""
+
+import argparse
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMAS = ("raw", "cleaned")
+
+# Columns read by DataPreprocessor.run_pipeline
+RAW_COLUMNS = [
+    "id",
+    "asins",
+    "brand",
+    "categories",
+    "name",
+    "prices",
+    "dateAdded",
+    "dateUpdated",
+    "keys",
+    "reviews.date",
+    "reviews.rating",
+    "reviews.text",
+    "reviews.title",
+    "reviews.username",
+    "reviews.numHelpful",
+    "reviews.sourceURLs",
+]
+
+# Columns written by DataPreprocessor.create_final_dataset
+CLEANED_COLUMNS = [
+    "product_id",
+    "user_id",
+    "username",
+    "asins",
+    "brand",
+    "name",
+    "main_category",
+    "price",
+    "rating",
+    "review_text",
+    "review_title",
+    "helpful_votes",
+    "review_date",
+    "avg_rating",
+    "num_reviews",
+    "rating_std",
+    "total_helpful",
+    "user_avg_rating",
+    "user_review_count",
+    "user_total_helpful",
+    "product_age_days",
+]
+
+CATEGORY_NAMES = [
+    "Electronics", "Books", "Home", "Toys", "Sports", "Beauty", "Clothing", "Garden",
+    "Grocery", "Automotive", "Health", "Music", "Movies", "Office", "Pets", "Tools",
+]
+REVIEW_TITLES = np.array(["Terrible", "Disappointing", "It's OK", "Good value", "Love it"])
+REVIEW_TEXTS = np.array([
+    "Stopped working after a week.",
+    "Not what I expected, would not buy again.",
+    "Does the job, nothing special.",
+    "Works well and arrived quickly.",
+    "Excellent product, highly recommend!",
+])
+
+
+def zipf_cdf(n: int, exponent: float) -> np.ndarray:
+    """Cumulative probabilities of ranks 1..n with weights ``rank ** -exponent``"""
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+class SyntheticInteractionGenerator:
+    """Power-law interactions with ratings, dates, brands and categories
+
+    ``density`` is the share of the users x products matrix that is drawn,
+    so the file holds ``round(density * n_users * n_products)`` rows; users
+    and products are picked with Zipf probabilities (``user_exponent`` and
+    ``product_exponent``) whose ranks are shuffled over the ids. A user may
+    rate a product more than once, as in the source data.
+    """
+
+    def __init__(
+        self,
+        n_users: int = 100_000,
+        n_products: int = 20_000,
+        density: float = 0.001,
+        user_exponent: float = 1.0,
+        product_exponent: float = 1.1,
+        n_brands: int = 500,
+        n_categories: int = 16,
+        start_date: str = "2014-01-01",
+        end_date: str = "2019-12-31",
+        seed: int = 42,
+    ):
+        if not 0 < density <= 1:
+            raise ValueError("density must be in (0, 1]")
+        if n_categories > len(CATEGORY_NAMES):
+            raise ValueError(f"n_categories must be at most {len(CATEGORY_NAMES)}")
+
+        self.n_users = n_users
+        self.n_products = n_products
+        self.density = density
+        self.n_interactions = int(round(density * n_users * n_products))
+        self.user_exponent = user_exponent
+        self.product_exponent = product_exponent
+        self.n_brands = n_brands
+        self.n_categories = n_categories
+        self.start_date = pd.Timestamp(start_date)
+        self.end_date = pd.Timestamp(end_date)
+        self.seed = seed
+
+        # Per-id tables: O(n_users + n_products) memory, independent of the row count
+        rng = np.random.default_rng([seed, 0])
+        self.user_cdf = zipf_cdf(n_users, user_exponent)
+        self.user_ids = rng.permutation(n_users)
+        self.product_cdf = zipf_cdf(n_products, product_exponent)
+        self.product_ids = rng.permutation(n_products)
+
+        self.product_brands = rng.integers(0, n_brands, n_products)
+        self.product_categories = rng.integers(0, n_categories, n_products)
+        self.product_prices = np.round(rng.lognormal(3.0, 1.0, n_products), 2)
+        self.product_quality = rng.normal(4.0, 0.6, n_products)
+        span_days = (self.end_date - self.start_date).days
+        self.product_added_days = rng.integers(0, max(span_days - 30, 1), n_products)
+
+    def _draw(self, chunk: int, size: int) -> Dict[str, np.ndarray]:
+        """Raw numeric draws of one chunk: user and product ids, rating, helpful votes and dates"""
+        rng = np.random.default_rng([self.seed, chunk + 1])
+        users = self.user_ids[np.searchsorted(self.user_cdf, rng.random(size))]
+        products = self.product_ids[np.searchsorted(self.product_cdf, rng.random(size))]
+
+        ratings = np.clip(np.rint(self.product_quality[products] + rng.normal(0, 1, size)), 1, 5)
+        helpful = rng.geometric(0.5, size) - 1
+
+        span_days = (self.end_date - self.start_date).days
+        added = self.product_added_days[products]
+        age = (rng.random(size) * (span_days - added)).astype(np.int64)
+        seconds = rng.integers(0, 86_400, size)
+        return {
+            "users": users, "products": products, "ratings": ratings, "helpful": helpful,
+            "added": added, "age": age, "seconds": seconds,
+        }
+
+    def _review_dates(self, draws: Dict[str, np.ndarray]) -> pd.DatetimeIndex:
+        return (
+            self.start_date
+            + pd.to_timedelta(draws["added"] + draws["age"], unit="D")
+            + pd.to_timedelta(draws["seconds"], unit="s")
+        )
+
+    def _chunk_sizes(self, chunk_size: int) -> Iterator[int]:
+        for start in range(0, self.n_interactions, chunk_size):
+            yield min(chunk_size, self.n_interactions - start)
+
+    def _statistics(self, chunk_size: int) -> Dict[str, np.ndarray]:
+        """Per-product and per-user rating counts, sums, squared sums and helpful votes over the whole stream"""
+        stats = {
+            name: np.zeros(n)
+            for name, n in (
+                ("product_count", self.n_products), ("product_sum", self.n_products),
+                ("product_squares", self.n_products), ("product_helpful", self.n_products),
+                ("user_count", self.n_users), ("user_sum", self.n_users), ("user_helpful", self.n_users),
+            )
+        }
+        for chunk, size in enumerate(self._chunk_sizes(chunk_size)):
+            draws = self._draw(chunk, size)
+            products, users, ratings = draws["products"], draws["users"], draws["ratings"]
+            stats["product_count"] += np.bincount(products, minlength=self.n_products)
+            stats["product_sum"] += np.bincount(products, weights=ratings, minlength=self.n_products)
+            stats["product_squares"] += np.bincount(products, weights=ratings**2, minlength=self.n_products)
+            stats["product_helpful"] += np.bincount(products, weights=draws["helpful"], minlength=self.n_products)
+            stats["user_count"] += np.bincount(users, minlength=self.n_users)
+            stats["user_sum"] += np.bincount(users, weights=ratings, minlength=self.n_users)
+            stats["user_helpful"] += np.bincount(users, weights=draws["helpful"], minlength=self.n_users)
+        return stats
+
+    def iter_chunks(self, schema: str = "cleaned", chunk_size: int = 250_000) -> Iterator[pd.DataFrame]:
+        """Yield the interactions as DataFrames of at most ``chunk_size`` rows in ``schema``"""
+        if schema not in SCHEMAS:
+            raise ValueError(f"schema must be one of {SCHEMAS}, got {schema!r}")
+        stats = self._statistics(chunk_size) if schema == "cleaned" else None
+
+        for chunk, size in enumerate(self._chunk_sizes(chunk_size)):
+            draws = self._draw(chunk, size)
+            if schema == "raw":
+                yield self._raw_frame(draws)
+            else:
+                yield self._cleaned_frame(draws, stats)
+
+    def _product_columns(self, products: np.ndarray) -> Dict[str, pd.Series]:
+        product_labels = pd.Series(products).map("P{:07d}".format)
+        return {
+            "product_id": product_labels,
+            "asins": "B" + product_labels.str[1:],
+            "brand": pd.Series(self.product_brands[products]).map("Brand{:04d}".format),
+            "name": "Product " + product_labels.str[1:],
+            "main_category": pd.Series(np.asarray(CATEGORY_NAMES)[self.product_categories[products]]),
+        }
+
+    def _raw_frame(self, draws: Dict[str, np.ndarray]) -> pd.DataFrame:
+        products, ratings = draws["products"], draws["ratings"]
+        columns = self._product_columns(products)
+        prices = pd.Series(self.product_prices[products]).map(
+            lambda price: json.dumps([{"amountMin": price, "amountMax": price, "currency": "USD"}])
+        )
+        added = self.start_date + pd.to_timedelta(draws["added"], unit="D")
+        reviewed = self._review_dates(draws)
+        usernames = pd.Series(draws["users"]).map("user{:08d}".format)
+        rating_index = ratings.astype(np.int64) - 1
+
+        frame = pd.DataFrame(
+            {
+                "id": columns["product_id"],
+                "asins": columns["asins"],
+                "brand": columns["brand"],
+                "categories": columns["main_category"] + "," + columns["brand"],
+                "name": columns["name"],
+                "prices": prices,
+                "dateAdded": added.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "dateUpdated": added.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "keys": columns["asins"].str.lower(),
+                "reviews.date": reviewed.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "reviews.rating": ratings,
+                "reviews.text": REVIEW_TEXTS[rating_index],
+                "reviews.title": REVIEW_TITLES[rating_index],
+                "reviews.username": usernames,
+                "reviews.numHelpful": draws["helpful"].astype(np.float64),
+                "reviews.sourceURLs": "https://www.example.com/review/" + columns["asins"],
+            }
+        )
+        return frame[RAW_COLUMNS]
+
+    def _cleaned_frame(self, draws: Dict[str, np.ndarray], stats: Dict[str, np.ndarray]) -> pd.DataFrame:
+        products, users, ratings = draws["products"], draws["users"], draws["ratings"]
+        columns = self._product_columns(products)
+        rating_index = ratings.astype(np.int64) - 1
+
+        count = stats["product_count"][products]
+        mean = stats["product_sum"][products] / count
+        # Sample standard deviation as pandas computes it, 0 for products rated once
+        variance = (stats["product_squares"][products] - count * mean**2) / np.maximum(count - 1, 1)
+        rating_std = np.where(count > 1, np.sqrt(np.maximum(variance, 0)), 0.0)
+
+        frame = pd.DataFrame(
+            {
+                "product_id": columns["product_id"],
+                "user_id": users,
+                "username": pd.Series(users).map("user{:08d}".format),
+                "asins": columns["asins"],
+                "brand": columns["brand"],
+                "name": columns["name"],
+                "main_category": columns["main_category"],
+                "price": self.product_prices[products],
+                "rating": ratings,
+                "review_text": REVIEW_TEXTS[rating_index],
+                "review_title": REVIEW_TITLES[rating_index],
+                "helpful_votes": draws["helpful"],
+                "review_date": self._review_dates(draws),
+                "avg_rating": mean,
+                "num_reviews": count.astype(np.int64),
+                "rating_std": rating_std,
+                "total_helpful": stats["product_helpful"][products].astype(np.int64),
+                "user_avg_rating": stats["user_sum"][users] / stats["user_count"][users],
+                "user_review_count": stats["user_count"][users].astype(np.int64),
+                "user_total_helpful": stats["user_helpful"][users].astype(np.int64),
+                "product_age_days": draws["age"],
+            }
+        )
+        return frame[CLEANED_COLUMNS]
+
+    def write(self, path: str, schema: str = "cleaned", chunk_size: int = 250_000) -> Dict:
+        """Stream the interactions to ``path`` (``.csv`` or ``.parquet``) and return a summary
+
+        Parquet needs pyarrow; each chunk becomes one row group.
+        """
+        is_parquet = path.endswith(".parquet")
+        if not is_parquet and not path.endswith(".csv"):
+            raise ValueError("path must end with .csv or .parquet")
+        if is_parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Writing Parquet requires pyarrow (pip install pyarrow)") from e
+
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        logger.info(
+            f"Generating {self.n_interactions} {schema} interactions for {self.n_users} users x "
+            f"{self.n_products} products into {path}"
+        )
+        n_rows, writer = 0, None
+        try:
+            for i, frame in enumerate(self.iter_chunks(schema, chunk_size)):
+                if is_parquet:
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+                else:
+                    frame.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+                n_rows += len(frame)
+                logger.info(f"{n_rows}/{self.n_interactions} rows written")
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return {
+            "path": path,
+            "schema": schema,
+            "rows": n_rows,
+            "n_users": self.n_users,
+            "n_products": self.n_products,
+            "density": self.density,
+            "seed": self.seed,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Zipf interactions for capacity testing")
+    parser.add_argument("--output", type=str, default="data/synthetic_interactions.csv",
+                        help="Output file (.csv or .parquet)")
+    parser.add_argument("--schema", choices=SCHEMAS, default="cleaned",
+                        help="raw: DataPreprocessor input, cleaned: model training input")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--density", type=float, default=0.001, help="Share of the users x products matrix drawn")
+    parser.add_argument("--user-exponent", type=float, default=1.0)
+    parser.add_argument("--product-exponent", type=float, default=1.1)
+    parser.add_argument("--chunk-size", type=int, default=250_000, help="Rows generated and written at a time")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generator = SyntheticInteractionGenerator(
+        n_users=args.users,
+        n_products=args.products,
+        density=args.density,
+        user_exponent=args.user_exponent,
+        product_exponent=args.product_exponent,
+        seed=args.seed,
+    )
+    summary = generator.write(args.output, schema=args.schema, chunk_size=args.chunk_size)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,102 @@
+import pytest
+import pandas as pd
+import numpy as np
+import os
+import sys
+
+# Ajoute le dossier parent au chemin pour pouvoir importer les scripts principaux
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data_preprocessing import DataPreprocessor
+from synthetic_data import CLEANED_COLUMNS, RAW_COLUMNS, SyntheticInteractionGenerator
+
+
+# --- Fixture (Générateur de test) ---
+@pytest.fixture
+def generator():
+    """Petit générateur : 200 utilisateurs x 100 produits, 5 % de densité (1000 lignes)"""
+    return SyntheticInteractionGenerator(n_users=200, n_products=100, density=0.05, n_brands=20, n_categories=8, seed=7)
+
+
+# --- Tests Unitaires ---
+
+
+def test_chunks_respect_size_and_total(generator):
+    """Chaque bloc fait au plus chunk_size lignes et le total correspond à la densité"""
+    sizes = [len(chunk) for chunk in generator.iter_chunks("raw", chunk_size=300)]
+    assert sizes == [300, 300, 300, 100]
+    assert sum(sizes) == generator.n_interactions == 1000
+
+
+def test_same_seed_same_data(generator):
+    """Même graine -> mêmes données, quel que soit le découpage en blocs"""
+    first = pd.concat(generator.iter_chunks("cleaned", chunk_size=250), ignore_index=True)
+    again = SyntheticInteractionGenerator(n_users=200, n_products=100, density=0.05, n_brands=20, n_categories=8, seed=7)
+    second = pd.concat(again.iter_chunks("cleaned", chunk_size=250), ignore_index=True)
+    pd.testing.assert_frame_equal(first, second)
+
+    other = SyntheticInteractionGenerator(n_users=200, n_products=100, density=0.05, n_brands=20, n_categories=8, seed=8)
+    third = pd.concat(other.iter_chunks("cleaned", chunk_size=250), ignore_index=True)
+    assert not first["product_id"].equals(third["product_id"])
+
+
+def test_popularity_is_skewed():
+    """La distribution Zipf concentre les interactions sur quelques produits"""
+    gen = SyntheticInteractionGenerator(n_users=1000, n_products=500, density=0.02, seed=1)
+    df = pd.concat(gen.iter_chunks("cleaned", chunk_size=5000), ignore_index=True)
+    counts = df["product_id"].value_counts()
+    # Les 5 % de produits les plus populaires dépassent largement 5 % des interactions
+    assert counts.iloc[: len(counts) // 20].sum() > 0.3 * len(df)
+
+
+def test_cleaned_schema_and_aggregates(generator):
+    """Le schéma nettoyé a les colonnes du modèle et des agrégats cohérents avec les lignes"""
+    df = pd.concat(generator.iter_chunks("cleaned", chunk_size=300), ignore_index=True)
+    assert list(df.columns) == CLEANED_COLUMNS
+    assert df["rating"].between(1, 5).all()
+
+    product_stats = df.groupby("product_id")["rating"].agg(["mean", "count", "std"]).fillna(0)
+    merged = df.drop_duplicates("product_id").set_index("product_id").join(product_stats)
+    np.testing.assert_allclose(merged["avg_rating"], merged["mean"])
+    np.testing.assert_array_equal(merged["num_reviews"], merged["count"])
+    np.testing.assert_allclose(merged["rating_std"], merged["std"], atol=1e-9)
+
+    user_stats = df.groupby("user_id")["helpful_votes"].sum()
+    users = df.drop_duplicates("user_id").set_index("user_id")
+    np.testing.assert_array_equal(users["user_total_helpful"], user_stats[users.index])
+
+
+def test_raw_output_runs_through_preprocessor(generator, tmp_path):
+    """Le schéma brut passe par DataPreprocessor et produit les colonnes du schéma nettoyé"""
+    raw_path = str(tmp_path / "raw.csv")
+    summary = generator.write(raw_path, schema="raw", chunk_size=300)
+    assert summary["rows"] == 1000
+    assert list(pd.read_csv(raw_path, nrows=1).columns) == RAW_COLUMNS
+
+    cleaned = DataPreprocessor(raw_path).run_pipeline(str(tmp_path / "cleaned.csv"))
+    assert list(cleaned.columns) == CLEANED_COLUMNS
+    assert len(cleaned) > 900
+    assert cleaned["price"].notna().all()
+    assert (cleaned["product_age_days"] >= 0).all()
+
+
+def test_parquet_round_trip(generator, tmp_path):
+    """L'écriture Parquet conserve toutes les lignes, un row group par bloc"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "interactions.parquet")
+    generator.write(path, schema="cleaned", chunk_size=400)
+
+    assert pq.ParquetFile(path).num_row_groups == 3
+    df = pd.read_parquet(path)
+    expected = pd.concat(generator.iter_chunks("cleaned", chunk_size=400), ignore_index=True)
+    assert list(df.columns) == CLEANED_COLUMNS
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_invalid_arguments(generator):
+    with pytest.raises(ValueError):
+        SyntheticInteractionGenerator(density=0)
+    with pytest.raises(ValueError):
+        next(generator.iter_chunks("unknown"))
+    with pytest.raises(ValueError):
+        generator.write("interactions.json")
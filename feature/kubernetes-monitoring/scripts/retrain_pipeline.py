@@ -6,6 +6,7 @@ Branch: feature/kubernetes-monitoring
 
 import os
 import sys
+import shlex
 import subprocess
 import logging
 from datetime import datetime
@@ -47,6 +48,16 @@ def train_model():
     mlflow_uri = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000")
     os.environ["MLFLOW_TRACKING_URI"] = mlflow_uri
 
+    # With NEW_DATA_PATH set, only the new interactions are folded into the saved model
+    # (partial_fit) and its top-N table is rewritten, instead of retraining from scratch
+    new_data_path = os.getenv("NEW_DATA_PATH")
+    if new_data_path:
+        # The update runs from ../ml-model, so a relative path is resolved from here first
+        new_data_path = os.path.abspath(new_data_path)
+        logger.info(f"Incremental update with {new_data_path}")
+        code = f"from recommendation_model import update_model; update_model({new_data_path!r})"
+        return run_command(f"python -c {shlex.quote(code)}", cwd="../ml-model")
+
     return run_command("python recommendation_model.py", cwd="../ml-model")
 
 
@@ -63,9 +74,26 @@ def deploy_model():
     """Deploy new model to Kubernetes"""
     logger.info("Deploying new model...")
 
-    # Update model version in ConfigMap
     version = datetime.now().strftime("%Y%m%d%H%M%S")
 
+    # The API pods watch the version file next to MODEL_PATH and hot-swap the new model and
+    # top-N table together without restarting; it is written last, once both are in place
+    model_path = os.getenv("MODEL_PATH", "../ml-model/models/recommendation_model")
+    topn_path = os.getenv("TOPN_TABLE_PATH", "../ml-model/models/topn_table")
+    if os.path.exists(model_path):
+        if not os.path.isfile(os.path.join(topn_path, "manifest.json")):
+            logger.error(f"Top-N table missing at {topn_path}, not publishing model version {version}")
+            return False
+        staging = f"{model_path}.version.tmp"
+        with open(staging, "w") as f:
+            f.write(f"{version}\n")
+        os.replace(staging, f"{model_path}.version")
+        logger.info(f"Published model version {version} for hot reload")
+
+    # Pods that do not share the model storage need a rolling restart to pick it up
+    if os.getenv("ROLLING_RESTART") != "1":
+        return True
+
     cmd = f"""
     kubectl set env deployment/recommendation-api \
         MODEL_VERSION={version} \
@@ -0,0 +1,132 @@
+"""
+Benchmark: LSH approximate item neighbors vs exact cosine similarity
+Branch: feature/ml-model
+
+Builds the item kNN graph exactly, with CosineLSHIndex defaults (bits
+calibrated to the target recall) and for a grid of table, bit and probe
+counts, and reports build time, candidate neighbors per item, recall@k
+against exact cosine_similarity on a sample of items, and the latency of a
+single "items like X" query. Exits with an error when the default index
+misses ``--min-recall``. Uniformly random ratings have no
+neighbor structure to find, so users draw most items from a taste cluster
+(``--clusters 0`` falls back to the plain random catalog).
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ann_index import CosineLSHIndex
+from bench_predict_item_based import make_interactions
+from recommendation_model import CollaborativeFilteringModel, _top_k_per_row
+
+
+def make_clustered_interactions(n_users: int, n_items: int, per_user: int, n_clusters: int, seed: int) -> pd.DataFrame:
+    """Random interactions where each user takes 80% of their items from one cluster of the catalog"""
+    if n_clusters == 0:
+        return make_interactions(n_users, n_items, per_user, seed)
+
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(n_users), per_user)
+    clusters = rng.integers(0, n_clusters, n_users)[users]
+    cluster_size = n_items // n_clusters
+    in_cluster = clusters * cluster_size + rng.integers(0, cluster_size, len(users))
+    items = np.where(rng.random(len(users)) < 0.8, in_cluster, rng.integers(0, n_items, len(users)))
+    df = pd.DataFrame({"user_id": users, "product_id": items, "rating": rng.integers(1, 6, len(users)).astype(float)})
+    return df.drop_duplicates(subset=["user_id", "product_id"])
+
+
+def recall_at_k(graph, exact_rows: np.ndarray, sample: np.ndarray, k: int) -> float:
+    """Share of each sampled item's exact top-k positive neighbors found in ``graph``"""
+    hits, total = 0, 0
+    for row, similarity in zip(sample, exact_rows):
+        similarity[row] = 0
+        top = np.argsort(-similarity, kind="stable")[:k]
+        truth = set(top[similarity[top] > 0])
+        hits += len(truth & set(graph[row].indices))
+        total += len(truth)
+    return hits / max(total, 1)
+
+
+def query_ms(index: CosineLSHIndex, sample: np.ndarray, k: int) -> float:
+    """Mean latency of one neighbor query in milliseconds"""
+    start = time.perf_counter()
+    for row in sample:
+        index.query_rows([row], k)
+    return (time.perf_counter() - start) / len(sample) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall and speed of LSH item neighbors")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--per-user", type=int, default=30)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20, help="neighbors kept per item and recall cutoff")
+    parser.add_argument("--tables", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--bits", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--probes", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--min-recall", type=float, default=0.9, help="recall@k the default index must reach")
+    parser.add_argument("--sample", type=int, default=500, help="items whose exact neighbors are checked")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    df = make_clustered_interactions(args.users, args.items, args.per_user, args.clusters, seed=42)
+    model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=args.k)
+    model.create_interaction_matrix(df)
+    items = model.user_item_matrix.T.tocsr()
+    n_items = items.shape[0]
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n_items, size=min(args.sample, n_items), replace=False)
+    normalized = normalize(items, norm="l2", axis=1)
+    exact_rows = cosine_similarity(normalized[sample], normalized)
+
+    start = time.perf_counter()
+    model.compute_item_similarity()
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for row in sample[:100]:
+        similarity = np.asarray((normalized @ normalized[row].T).toarray()).ravel()
+        np.argpartition(-similarity, args.k)[: args.k]
+    exact_query_ms = (time.perf_counter() - start) / min(len(sample), 100) * 1000
+
+    def run(label: str, index: CosineLSHIndex) -> float:
+        start = time.perf_counter()
+        index.fit(items)
+        candidates = index.candidate_graph()
+        graph = _top_k_per_row(candidates, args.k)
+        build_seconds = time.perf_counter() - start
+
+        recall = recall_at_k(graph, exact_rows.copy(), sample, args.k)
+        latency = query_ms(index, sample[:100], args.k)
+        print(
+            f"{label:>16} {index.n_bits:>5} {build_seconds:8.2f} {candidates.nnz / n_items:11.1f} "
+            f"{recall:9.3f} {latency:9.3f}"
+        )
+        return recall
+
+    print(f"{n_items} items x {args.users} users ({args.clusters} clusters), k={args.k}, recall over {len(sample)} items")
+    print(f"{'tables/probes':>16} {'bits':>5} {'build s':>8} {'cand/item':>11} {'recall@k':>9} {'query ms':>9}")
+    print(f"{'exact':>16} {'-':>5} {exact_seconds:8.2f} {n_items - 1:11d} {1.0:9.3f} {exact_query_ms:9.3f}")
+
+    default = CosineLSHIndex(recall_k=args.k, target_recall=args.min_recall)
+    default_recall = run(f"default {default.n_tables}/{default.n_probes}", default)
+    for n_tables in args.tables:
+        for n_probes in args.probes:
+            for n_bits in args.bits:
+                run(f"{n_tables}/{n_probes}", CosineLSHIndex(n_tables=n_tables, n_bits=n_bits, n_probes=n_probes))
+
+    print(f"default recall@{args.k} {default_recall:.3f}, floor {args.min_recall}")
+    assert default_recall >= args.min_recall, f"default LSH recall@{args.k} {default_recall:.3f} < {args.min_recall}"
@@ -0,0 +1,96 @@
+"""
+Benchmark: peak memory of full vs top-k pruned similarity
+Branch: feature/ml-model
+
+Each mode runs in its own subprocess so the reported peak RSS is not
+inflated by the previous run.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def run_mode(args, similarity_top_k):
+    """Train similarities in a fresh process and return its report"""
+    cmd = [
+        sys.executable,
+        __file__,
+        "--child",
+        "--users", str(args.users),
+        "--items", str(args.items),
+        "--per-user", str(args.per_user),
+        "--threshold", str(args.threshold),
+    ]
+    if similarity_top_k is not None:
+        cmd += ["--top-k", str(similarity_top_k)]
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def child(args):
+    """Compute both similarities once and print a JSON report"""
+    import logging
+
+    logging.disable(logging.INFO)
+
+    from bench_predict_item_based import make_interactions
+    from recommendation_model import CollaborativeFilteringModel, _peak_rss_mb
+
+    df = make_interactions(args.users, args.items, args.per_user, seed=42)
+    model = CollaborativeFilteringModel(
+        min_interactions=1, similarity_top_k=args.top_k, similarity_threshold=args.threshold
+    )
+    model.create_interaction_matrix(df)
+    baseline_mb = _peak_rss_mb()
+
+    start = time.perf_counter()
+    model.compute_user_similarity()
+    model.compute_item_similarity()
+    elapsed = time.perf_counter() - start
+
+    def stored_mb(matrix):
+        if hasattr(matrix, "data") and hasattr(matrix, "indices"):
+            return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+        return matrix.nbytes / 2**20
+
+    print(
+        json.dumps(
+            {
+                "seconds": elapsed,
+                "peak_rss_mb": _peak_rss_mb(),
+                "similarity_peak_mb": _peak_rss_mb() - baseline_mb,
+                "stored_mb": stored_mb(model.user_similarity) + stored_mb(model.item_similarity),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full and kNN similarity memory")
+    parser.add_argument("--users", type=int, default=8000)
+    parser.add_argument("--items", type=int, default=4000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--top-ks", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--threshold", type=float, default=0.0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        sys.exit(0)
+
+    print(f"{'mode':>12} {'seconds':>9} {'peak RSS MB':>12} {'sim peak MB':>12} {'stored MB':>10}")
+    for top_k in [None] + args.top_ks:
+        report = run_mode(args, top_k)
+        label = "full" if top_k is None else f"knn k={top_k}"
+        print(
+            f"{label:>12} {report['seconds']:9.2f} {report['peak_rss_mb']:12.1f} "
+            f"{report['similarity_peak_mb']:12.1f} {report['stored_mb']:10.1f}"
+        )
@@ -0,0 +1,100 @@
+"""
+Benchmark: load time and private memory of pickle vs memory-mapped models
+Branch: feature/ml-model
+
+The model is saved in both formats, then each format is loaded by several
+fresh processes at once, like uvicorn workers. Private (unshared) memory is
+read from /proc/self/smaps_rollup, so pages shared through the page cache
+are not counted.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def private_mb() -> float:
+    """Private memory of this process in MB (Linux only)"""
+    with open("/proc/self/smaps_rollup") as f:
+        fields = dict(line.split(":", 1) for line in f if ":" in line)
+    private_kb = sum(int(fields[key].split()[0]) for key in ("Private_Clean", "Private_Dirty"))
+    return private_kb / 1024
+
+
+def child(path):
+    """Load the model, touch every array once, print a JSON report"""
+    import logging
+
+    logging.disable(logging.INFO)
+
+    from recommendation_model import CollaborativeFilteringModel
+
+    baseline_mb = private_mb()
+    start = time.perf_counter()
+    model = CollaborativeFilteringModel.load_model(path)
+    load_seconds = time.perf_counter() - start
+
+    user_id = model.user_lookup.labels[0]
+    model.recommend_products(user_id)
+    for matrix in (model.user_item_matrix, model.user_similarity, model.item_similarity):
+        float(matrix.data.sum())
+
+    print(json.dumps({"load_seconds": load_seconds, "private_mb": private_mb() - baseline_mb}))
+
+
+def run_workers(path, n_workers):
+    """Load ``path`` in ``n_workers`` concurrent processes"""
+    workers = [
+        subprocess.Popen([sys.executable, __file__, "--child", path], stdout=subprocess.PIPE, text=True)
+        for _ in range(n_workers)
+    ]
+    reports = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+    return (
+        max(report["load_seconds"] for report in reports),
+        sum(report["private_mb"] for report in reports),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pickle and memory-mapped model loading")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--per-user", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--child", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        sys.exit(0)
+
+    import logging
+
+    logging.disable(logging.INFO)
+
+    from bench_predict_item_based import make_interactions
+    from recommendation_model import CollaborativeFilteringModel
+
+    df = make_interactions(args.users, args.items, args.per_user, seed=42)
+    model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=args.top_k)
+    model.create_interaction_matrix(df)
+    model.compute_user_similarity()
+    model.compute_item_similarity()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"pickle": os.path.join(tmp, "model.pkl"), "mmap": os.path.join(tmp, "model")}
+        for path in paths.values():
+            model.save_model(path)
+
+        print(f"{args.workers} workers loading the same model")
+        print(f"{'format':>8} {'load s (slowest)':>17} {'private MB (all)':>17}")
+        for name, path in paths.items():
+            load_seconds, total_private_mb = run_workers(path, args.workers)
+            print(f"{name:>8} {load_seconds:17.3f} {total_private_mb:17.1f}")
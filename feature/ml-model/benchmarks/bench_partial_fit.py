@@ -0,0 +1,71 @@
+"""
+Benchmark: full retrain vs partial_fit for a small delta of new interactions
+Branch: feature/ml-model
+
+Trains on the history, then times folding in deltas of increasing size
+against retraining on history + delta from scratch. Exits with status 1 when
+partial_fit of a 1% delta is less than ``--min-speedup`` times faster than
+the full retrain (2x by default), so retrain time keeps scaling with the delta.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_predict_item_based import make_interactions
+from recommendation_model import CollaborativeFilteringModel
+
+
+def train(df: pd.DataFrame, top_k: int) -> CollaborativeFilteringModel:
+    model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=top_k)
+    model.create_interaction_matrix(df)
+    model.compute_user_similarity()
+    model.compute_item_similarity()
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full retraining with partial_fit")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--delta-fractions", type=float, nargs="+", default=[0.001, 0.01, 0.05])
+    parser.add_argument("--min-speedup", type=float, default=2.0, help="required speedup at a 1%% delta")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    df = make_interactions(args.users, args.items, args.per_user, seed=42).sample(frac=1.0, random_state=0)
+    print(f"History: {len(df)} interactions, {args.users} users, {args.items} items (top_k={args.top_k})")
+    print(f"{'delta rows':>10} {'full retrain s':>15} {'partial_fit s':>14} {'speedup':>8}")
+    speedups = {}
+
+    for fraction in args.delta_fractions:
+        n_delta = max(int(len(df) * fraction), 1)
+        history, delta = df.iloc[:-n_delta], df.iloc[-n_delta:]
+        model = train(history, args.top_k)
+
+        start = time.perf_counter()
+        model.partial_fit(delta)
+        partial_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        train(df, args.top_k)
+        full_seconds = time.perf_counter() - start
+
+        speedups[fraction] = full_seconds / partial_seconds
+        print(f"{n_delta:>10} {full_seconds:15.2f} {partial_seconds:14.2f} {speedups[fraction]:7.1f}x")
+
+    if 0.01 in speedups:
+        assert speedups[0.01] >= args.min_speedup, (
+            f"partial_fit of a 1% delta is only {speedups[0.01]:.1f}x faster than a full retrain "
+            f"(floor {args.min_speedup:.1f}x)"
+        )
+        print(f"1% delta speedup {speedups[0.01]:.1f}x >= {args.min_speedup:.1f}x floor")
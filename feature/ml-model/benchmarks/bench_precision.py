@@ -0,0 +1,62 @@
+"""
+Benchmark: model memory and accuracy per storage precision
+Branch: feature/ml-model
+
+Trains the same model with float64, float32 and int8 storage and reports
+model size, RMSE and NDCG@k on a held-out split, each as a delta against
+float64, plus per-user recommendation latency.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_ann_index import make_clustered_interactions
+from recommendation_model import CollaborativeFilteringModel
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and accuracy of float64, float32 and int8 models")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--per-user", type=int, default=30)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=None, help="similarity_top_k (default: full similarity)")
+    parser.add_argument("--k", type=int, default=10, help="ranking cutoff")
+    parser.add_argument("--latency-users", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    df = make_clustered_interactions(args.users, args.items, args.per_user, args.clusters, seed=42)
+    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    print(f"Train: {len(train_df)}, Test: {len(test_df)}, similarity_top_k={args.top_k}")
+    print(f"{'precision':>9} {'size MB':>9} {'vs f64':>7} {'rmse':>8} {'delta':>8} {'ndcg':>8} {'delta':>8} {'ms/user':>8}")
+
+    reference = None
+    for precision in ("float64", "float32", "int8"):
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=args.top_k, precision=precision)
+        model.fit(train_df)
+        size_mb = model.model_size_mb()
+        rmse = model.evaluate(test_df)["rmse"]
+        ndcg = model.evaluate_ranking(test_df, k=args.k)[f"ndcg_at_{args.k}"]
+
+        users = model.user_lookup.labels[: args.latency_users]
+        start = time.perf_counter()
+        for user_id in users:
+            model.recommend_products(user_id)
+        latency = (time.perf_counter() - start) / len(users) * 1000
+
+        if reference is None:
+            reference = (size_mb, rmse, ndcg)
+        print(
+            f"{precision:>9} {size_mb:9.1f} {size_mb / reference[0]:6.2f}x {rmse:8.4f} {rmse - reference[1]:+8.4f} "
+            f"{ndcg:8.4f} {ndcg - reference[2]:+8.4f} {latency:8.3f}"
+        )
@@ -0,0 +1,97 @@
+"""
+Benchmark: per-user latency of item-based prediction
+Branch: feature/ml-model
+
+Compares the original per-item Python loop with the sparse engine in
+CollaborativeFilteringModel.predict_item_based on a random catalog.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from recommendation_model import CollaborativeFilteringModel
+
+
+def legacy_predict_item_based(model, user_idx: int, top_k: int = 50) -> np.ndarray:
+    """Original implementation: one similarity row and one Python list per unrated item"""
+    user_ratings = model.user_item_matrix[user_idx].toarray().ravel()
+    predictions = np.zeros(len(user_ratings))
+
+    for item_idx in range(len(user_ratings)):
+        if user_ratings[item_idx] == 0:
+            item_sim = model.item_similarity[item_idx].toarray().flatten()
+            rated_items = np.where(user_ratings > 0)[0]
+
+            if len(rated_items) > 0:
+                similar_rated = [(i, item_sim[i]) for i in rated_items if item_sim[i] > 0]
+                similar_rated.sort(key=lambda x: x[1], reverse=True)
+                similar_rated = similar_rated[:top_k]
+
+                if similar_rated:
+                    numerator = sum(user_ratings[i] * sim for i, sim in similar_rated)
+                    denominator = sum(sim for _, sim in similar_rated)
+                    predictions[item_idx] = numerator / denominator if denominator > 0 else 0
+
+    return predictions
+
+
+def make_interactions(n_users: int, n_items: int, per_user: int, seed: int) -> pd.DataFrame:
+    """Random interactions with a skewed item distribution"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_items + 1)
+    weights /= weights.sum()
+    users = np.repeat(np.arange(n_users), per_user)
+    items = rng.choice(n_items, size=len(users), p=weights)
+    df = pd.DataFrame({"user_id": users, "product_id": items, "rating": rng.integers(1, 6, len(users)).astype(float)})
+    return df.drop_duplicates(subset=["user_id", "product_id"])
+
+
+def time_per_user(fn, user_indices) -> float:
+    """Mean wall time per call in milliseconds"""
+    start = time.perf_counter()
+    for user_idx in user_indices:
+        fn(user_idx)
+    return (time.perf_counter() - start) / len(user_indices) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark item-based prediction latency")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=12000)
+    parser.add_argument("--per-user", type=int, default=60)
+    parser.add_argument("--legacy-users", type=int, default=3, help="Users timed with the slow legacy loop")
+    parser.add_argument("--users-timed", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df = make_interactions(args.users, args.items, args.per_user, args.seed)
+    model = CollaborativeFilteringModel(min_interactions=1)
+    model.create_interaction_matrix(df)
+    model.compute_item_similarity()
+
+    n_users, n_items = model.user_item_matrix.shape
+    print(f"Users: {n_users}, Items: {n_items}, Interactions: {model.user_item_matrix.nnz}")
+    print(f"Item similarity nnz: {model.item_similarity.nnz}")
+
+    rng = np.random.default_rng(args.seed)
+    legacy_users = rng.choice(n_users, size=args.legacy_users, replace=False)
+    timed_users = rng.choice(n_users, size=min(args.users_timed, n_users), replace=False)
+
+    for user_idx in legacy_users:
+        np.testing.assert_allclose(
+            model.predict_item_based(user_idx), legacy_predict_item_based(model, user_idx), atol=1e-10
+        )
+
+    legacy_ms = time_per_user(lambda u: legacy_predict_item_based(model, u), legacy_users)
+    sparse_ms = time_per_user(model.predict_item_based, timed_users)
+
+    print(f"Legacy loop:   {legacy_ms:10.2f} ms/user ({len(legacy_users)} users)")
+    print(f"Sparse engine: {sparse_ms:10.2f} ms/user ({len(timed_users)} users)")
+    print(f"Speedup:       {legacy_ms / sparse_ms:10.1f}x")
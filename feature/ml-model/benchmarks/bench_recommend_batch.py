@@ -0,0 +1,52 @@
+"""
+Benchmark: batch recommendation throughput
+Branch: feature/ml-model
+
+Compares a Python loop over recommend_products with recommend_products_batch
+at several block sizes.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_predict_item_based import make_interactions
+from recommendation_model import CollaborativeFilteringModel
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch recommendation throughput")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--per-user", type=int, default=30)
+    parser.add_argument("--loop-users", type=int, default=200, help="Users timed with the per-user loop")
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[128, 512, 2048])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df = make_interactions(args.users, args.items, args.per_user, args.seed)
+    model = CollaborativeFilteringModel(min_interactions=1)
+    model.create_interaction_matrix(df)
+    model.compute_user_similarity()
+    model.compute_item_similarity()
+
+    user_ids = np.array(list(model.user_lookup.keys()))
+    print(f"Users: {len(user_ids)}, Items: {model.user_item_matrix.shape[1]}")
+
+    start = time.perf_counter()
+    for user_id in user_ids[: args.loop_users]:
+        model.recommend_products(user_id)
+    loop_rate = args.loop_users / (time.perf_counter() - start)
+    print(f"{'loop':>22}: {loop_rate:10.0f} users/s")
+
+    for block_size in args.block_sizes:
+        start = time.perf_counter()
+        model.recommend_products_batch(user_ids, block_size=block_size)
+        rate = len(user_ids) / (time.perf_counter() - start)
+        label = f"block={block_size}"
+        print(f"{label:>22}: {rate:10.0f} users/s ({rate / loop_rate:.1f}x)")
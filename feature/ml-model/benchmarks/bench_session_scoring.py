@@ -0,0 +1,71 @@
+"""
+Benchmark: session scoring latency vs known-user lookups
+Branch: feature/ml-model
+
+Times one request of each serving path: a known user's slice of the top-N
+table, a session of viewed products scored against the table's neighbor
+graph, and the same two paths on the live model (recommend_products and
+recommend_for_session).
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_predict_item_based import make_interactions
+from recommendation_model import CollaborativeFilteringModel
+from topn_table import TopNTable, write_topn_table
+
+
+def latency_ms(function, requests) -> float:
+    """Mean latency of ``function(request)`` in milliseconds"""
+    start = time.perf_counter()
+    for request in requests:
+        function(request)
+    return (time.perf_counter() - start) / len(requests) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of session scoring vs known-user lookups")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--per-user", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=50, help="similarity_top_k of the model")
+    parser.add_argument("--neighbor-k", type=int, default=50, help="neighbors per product stored in the table")
+    parser.add_argument("--session-sizes", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    df = make_interactions(args.users, args.items, args.per_user, args.seed)
+    model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=args.top_k).fit(df)
+
+    rng = np.random.default_rng(args.seed)
+    user_ids = rng.choice(model.user_lookup.labels, args.requests)
+    product_ids = model.product_lookup.labels
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "topn")
+        write_topn_table(model, path, neighbor_k=args.neighbor_k)
+        table = TopNTable(path)
+
+        print(f"Users: {len(model.user_lookup)}, Items: {len(product_ids)}, neighbor_k={args.neighbor_k}")
+        print(f"{'path':>28} {'session':>8} {'ms/request':>11}")
+        print(f"{'table lookup (known user)':>28} {'-':>8} {latency_ms(table.lookup, user_ids):11.3f}")
+        print(f"{'model (known user)':>28} {'-':>8} {latency_ms(model.recommend_products, user_ids):11.3f}")
+
+        for size in args.session_sizes:
+            sessions = [list(rng.choice(product_ids, size, replace=False)) for _ in range(args.requests)]
+            table_ms = latency_ms(lambda session: table.score_session(session, model.n_recommendations), sessions)
+            model_ms = latency_ms(model.recommend_for_session, sessions)
+            print(f"{'table session':>28} {size:>8} {table_ms:11.3f}")
+            print(f"{'model session':>28} {size:>8} {model_ms:11.3f}")
@@ -0,0 +1,285 @@
+"""
+Benchmark suite: model hot paths with regression thresholds
+Branch: feature/ml-model
+
+Runs create_interaction_matrix, compute_user_similarity,
+compute_item_similarity, predict_hybrid, recommend_products, evaluate,
+save_model and load_model at several synthetic scales and records wall time
+(best of ``--repeat`` runs), peak RSS and throughput for each. The data comes
+from the power-law (Zipf) SyntheticInteractionGenerator of feature/data-preprocessing,
+so popular users and products are as skewed as in production. Every scale runs
+in a fresh process; peak RSS is reset before each step through
+/proc/self/clear_refs, so it is the peak of that step alone (Linux only).
+
+Results can be written to a JSON baseline (``--output``) and compared against
+one (``--baseline``): the run exits with status 1 when a step is slower or
+uses more memory than the baseline beyond the tolerance. Timings only compare
+on the same environment, so a baseline recorded with another Python, numpy,
+scipy, machine or CPU count is reported with a warning and never fails the run.
+CI records its baseline from the base commit on the same runner.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data-preprocessing")))
+
+# SyntheticInteractionGenerator parameters; density is the share of users x products drawn
+SCALES = {
+    "small": {"n_users": 2000, "n_products": 1000, "density": 0.02},
+    "medium": {"n_users": 10000, "n_products": 4000, "density": 0.0075},
+    "large": {"n_users": 40000, "n_products": 10000, "density": 0.003},
+}
+STEPS = (
+    ("create_interaction_matrix", "interactions/s"),
+    ("compute_user_similarity", "users/s"),
+    ("compute_item_similarity", "items/s"),
+    ("predict_hybrid", "users/s"),
+    ("recommend_products", "requests/s"),
+    ("evaluate", "rows/s"),
+    ("save_model", "MB/s"),
+    ("load_model", "MB/s"),
+)
+
+# Differences below these floors are treated as noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_RSS_MB = 5.0
+
+
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak_rss():
+    """Reset VmHWM so the next peak_rss_mb() covers only what follows"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB since the last reset"""
+    return _status_mb("VmHWM")
+
+
+def measure(step, repeat: int):
+    """Best wall time of ``repeat`` calls of ``step()`` and the peak RSS across them
+
+    ``step`` returns the amount of work it did, used for the throughput.
+    """
+    reset_peak_rss()
+    best, work = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work = step()
+        best = min(best, time.perf_counter() - start)
+    return {"wall_seconds": best, "peak_rss_mb": peak_rss_mb(), "throughput": work / best if best > 0 else 0.0}
+
+
+def run_scale(scale: dict, repeat: int, top_k: int, sample_users: int) -> dict:
+    """Time every step of STEPS on one synthetic dataset"""
+    import logging
+
+    import numpy as np
+    from sklearn.model_selection import train_test_split
+
+    logging.disable(logging.INFO)
+
+    import pandas as pd
+
+    from recommendation_model import CollaborativeFilteringModel
+    from synthetic_data import SyntheticInteractionGenerator
+
+    df = pd.concat(SyntheticInteractionGenerator(**scale, seed=42).iter_chunks("cleaned"), ignore_index=True)
+    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=top_k)
+
+    def create_interaction_matrix():
+        model.create_interaction_matrix(train_df)
+        return len(train_df)
+
+    def compute_user_similarity():
+        model.compute_user_similarity()
+        return model.user_item_matrix.shape[0]
+
+    def compute_item_similarity():
+        model.compute_item_similarity()
+        return model.user_item_matrix.shape[1]
+
+    user_indices = None
+
+    def predict_hybrid():
+        for user_idx in user_indices:
+            model.predict_hybrid(user_idx)
+        return len(user_indices)
+
+    def recommend_products():
+        for user_id in model.user_lookup.labels[user_indices]:
+            model.recommend_products(user_id)
+        return len(user_indices)
+
+    def evaluate():
+        model.evaluate(test_df)
+        return len(test_df)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model")
+
+        def save_model():
+            model.save_model(path)
+            return model.model_size_mb()
+
+        def load_model():
+            CollaborativeFilteringModel.load_model(path)
+            return model.model_size_mb()
+
+        steps = {
+            "create_interaction_matrix": create_interaction_matrix,
+            "compute_user_similarity": compute_user_similarity,
+            "compute_item_similarity": compute_item_similarity,
+            "predict_hybrid": predict_hybrid,
+            "recommend_products": recommend_products,
+            "evaluate": evaluate,
+            "save_model": save_model,
+            "load_model": load_model,
+        }
+        for name, unit in STEPS:
+            if name == "predict_hybrid":
+                # Users are sampled once the interaction matrix exists
+                n_users = model.user_item_matrix.shape[0]
+                user_indices = np.random.default_rng(42).choice(n_users, min(sample_users, n_users), replace=False)
+            results[name] = {**measure(steps[name], repeat), "unit": unit}
+    return results
+
+
+def run_child(scale_name: str, args) -> dict:
+    """Run one scale in a fresh interpreter so its memory is measured on its own"""
+    command = [
+        sys.executable, __file__, "--child", scale_name,
+        "--repeat", str(args.repeat), "--top-k", str(args.top_k), "--sample-users", str(args.sample_users),
+    ]
+    output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def environment_differences(results: dict, baseline: dict) -> dict:
+    """``{field: (baseline value, current value)}`` for each environment field that differs"""
+    recorded = baseline.get("environment", {})
+    return {
+        field: (recorded.get(field), value)
+        for field, value in results["environment"].items()
+        if recorded.get(field) != value
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float):
+    """Rows of (scale, step, time ratio, memory ratio, regressions) for steps present in both runs at the same scale"""
+    rows = []
+    for scale, steps in results["results"].items():
+        # A scale recorded with other generator parameters measures different data
+        if baseline.get("scales", {}).get(scale) != results["scales"][scale]:
+            continue
+        for name, current in steps.items():
+            reference = baseline.get("results", {}).get(scale, {}).get(name)
+            if reference is None:
+                continue
+            regressions = []
+            slower = current["wall_seconds"] - reference["wall_seconds"]
+            if slower > MIN_SECONDS and current["wall_seconds"] > reference["wall_seconds"] * (1 + tolerance):
+                regressions.append("time")
+            larger = current["peak_rss_mb"] - reference["peak_rss_mb"]
+            if larger > MIN_RSS_MB and current["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + memory_tolerance):
+                regressions.append("memory")
+            rows.append((
+                scale,
+                name,
+                current["wall_seconds"] / max(reference["wall_seconds"], 1e-9),
+                current["peak_rss_mb"] / max(reference["peak_rss_mb"], 1e-9),
+                regressions,
+            ))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the model hot paths and check them against a baseline")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per step, the fastest is kept")
+    parser.add_argument("--top-k", type=int, default=50, help="similarity_top_k of the model")
+    parser.add_argument("--sample-users", type=int, default=200, help="users timed by predict_hybrid/recommend_products")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed wall time increase (0.25 = +25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="allowed peak RSS increase")
+    parser.add_argument("--child", metavar="SCALE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scale(SCALES[args.child], args.repeat, args.top_k, args.sample_users)))
+        sys.exit(0)
+
+    import numpy as np
+    import scipy
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"repeat": args.repeat, "top_k": args.top_k, "sample_users": args.sample_users},
+        "scales": {name: SCALES[name] for name in args.scales},
+        "results": {},
+    }
+
+    print(f"{'scale':>7} {'step':>26} {'wall s':>9} {'peak MB':>9} {'throughput':>12} {'unit':>15}")
+    for scale in args.scales:
+        results["results"][scale] = run_child(scale, args)
+        for name, step in results["results"][scale].items():
+            print(
+                f"{scale:>7} {name:>26} {step['wall_seconds']:9.4f} {step['peak_rss_mb']:9.1f} "
+                f"{step['throughput']:12.1f} {step['unit']:>15}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance, args.memory_tolerance)
+
+        print(f"\nAgainst {args.baseline} (tolerance +{args.tolerance:.0%} time, +{args.memory_tolerance:.0%} memory)")
+        print(f"{'scale':>7} {'step':>26} {'time':>7} {'memory':>7} {'status':>10}")
+        for scale, name, time_ratio, memory_ratio, regressions in rows:
+            status = "REGRESSED " + "+".join(regressions) if regressions else "ok"
+            print(f"{scale:>7} {name:>26} {time_ratio:6.2f}x {memory_ratio:6.2f}x {status:>10}")
+
+        failed = [row for row in rows if row[4]]
+        differences = environment_differences(results, baseline)
+        if differences:
+            changed = ", ".join(f"{field} {recorded} -> {value}" for field, (recorded, value) in differences.items())
+            print(f"WARNING: baseline recorded on another environment ({changed}); regressions are not enforced")
+        if failed:
+            print(f"{len(failed)} step(s) regressed beyond the tolerance")
+            if not differences:
+                sys.exit(1)
+        else:
+            print("No regressions")
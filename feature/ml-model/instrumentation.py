@@ -0,0 +1,324 @@
+"""
+Phase Timing and Memory Instrumentation
+Branch: feature/ml-model
+
+Records, for each training phase (filtering, pivot, similarities, factors,
+evaluation...), its duration, how much it raised the process peak RSS and the
+size and nnz of the matrices it built, plus per-call latency histograms of the
+serving methods. Everything is off by default: a disabled instance hands out a
+shared no-op phase and the timed methods check one attribute before calling
+straight through.
+
+Results export as a flat dict for ``mlflow.log_metrics`` and as Prometheus
+metrics, either in the text exposition format (no dependency) or through
+``collect()`` when registered as a prometheus_client collector.
+"""
+
+import functools
+import resource
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# Upper bounds in seconds, from sub-millisecond lookups to multi-second cold paths
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident set size of this process in bytes (ru_maxrss is in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _bucket_label(bound: float) -> str:
+    """Prometheus ``le`` label of a bucket bound"""
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class LatencyHistogram:
+    """Cumulative-style latency histogram with fixed upper bounds, as Prometheus stores them"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bound, plus the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, calls at or under it) pairs, ending with (inf, count)"""
+        pairs, running = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the ``q`` quantile, interpolated inside its bucket like histogram_quantile"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, running in self.cumulative():
+            if running >= rank:
+                if bound == float("inf"):
+                    return lower
+                in_bucket = running - below
+                return lower + (bound - lower) * ((rank - below) / in_bucket if in_bucket else 0.0)
+            lower, below = bound, running
+        return lower
+
+
+class PhaseRecord:
+    """Duration, peak memory delta and matrix sizes of one run of a phase"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.peak_memory_delta_bytes = 0
+        self.matrices: Dict[str, Dict[str, int]] = {}
+
+    def matrix(self, name: str, value):
+        """Record the shape and stored entries of a matrix built by the phase"""
+        if value is None:
+            return
+        shape = getattr(value, "shape", ())
+        # Sparse and quantized matrices count stored entries, dense arrays every element
+        nnz = value.nnz if hasattr(value, "nnz") else getattr(value, "size", 0)
+        self.matrices[name] = {
+            "rows": int(shape[0]) if len(shape) > 0 else 0,
+            "cols": int(shape[1]) if len(shape) > 1 else 0,
+            "nnz": int(nnz),
+        }
+
+
+class _NullPhase:
+    """Shared phase handed out while instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def matrix(self, name: str, value):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, instrumentation: "Instrumentation", name: str):
+        self.instrumentation = instrumentation
+        self.record = PhaseRecord(name)
+
+    def __enter__(self) -> PhaseRecord:
+        self.start_rss = _peak_rss_bytes()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc_info):
+        self.record.seconds = time.perf_counter() - self.start
+        # Growth of the process high-water mark: 0 when an earlier phase peaked higher
+        self.record.peak_memory_delta_bytes = max(_peak_rss_bytes() - self.start_rss, 0)
+        self.instrumentation._add_phase(self.record)
+        return False
+
+
+class Instrumentation:
+    """Per-model phase records and latency histograms
+
+    ``phase(name)`` is a context manager yielding a PhaseRecord (``record.matrix``
+    adds matrix sizes); a phase that runs again replaces its previous record and
+    bumps its call count. ``observe(name, seconds)`` feeds the latency histogram
+    of ``name``, usually through the ``timed`` method decorator.
+    """
+
+    def __init__(self, enabled: bool = False, latency_buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.latency_buckets = tuple(latency_buckets)
+        self.phases: Dict[str, PhaseRecord] = {}
+        self.phase_calls: Dict[str, int] = {}
+        self.latencies: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks cannot be pickled; models are pickled to worker processes and MLflow
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        return self
+
+    def reset(self):
+        with self._lock:
+            self.phases, self.phase_calls, self.latencies = {}, {}, {}
+        return self
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def _add_phase(self, record: PhaseRecord):
+        with self._lock:
+            self.phases[record.name] = record
+            self.phase_calls[record.name] = self.phase_calls.get(record.name, 0) + 1
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.latencies.get(name)
+            if histogram is None:
+                histogram = self.latencies[name] = LatencyHistogram(self.latency_buckets)
+            histogram.observe(seconds)
+
+    def mlflow_metrics(self) -> Dict[str, float]:
+        """Flat metrics for ``mlflow.log_metrics``, e.g. ``phase_item_similarity_seconds``"""
+        metrics = {}
+        for name, record in self.phases.items():
+            metrics[f"phase_{name}_seconds"] = record.seconds
+            metrics[f"phase_{name}_peak_memory_delta_mb"] = record.peak_memory_delta_bytes / 2**20
+            for matrix, sizes in record.matrices.items():
+                for field, value in sizes.items():
+                    metrics[f"{matrix}_{field}"] = value
+        for name, histogram in self.latencies.items():
+            metrics[f"latency_{name}_count"] = histogram.count
+            metrics[f"latency_{name}_mean_ms"] = histogram.total / max(histogram.count, 1) * 1000
+            for q in (0.5, 0.95, 0.99):
+                metrics[f"latency_{name}_p{int(q * 100)}_ms"] = histogram.quantile(q) * 1000
+        return metrics
+
+    def log_to_mlflow(self, step: int = None):
+        """Log mlflow_metrics() to the active MLflow run"""
+        import mlflow
+
+        mlflow.log_metrics(self.mlflow_metrics(), step=step)
+
+    def prometheus_text(self, prefix: str = "recommender") -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def family(name, kind, documentation, samples):
+            if samples:
+                lines.append(f"# HELP {prefix}_{name} {documentation}")
+                lines.append(f"# TYPE {prefix}_{name} {kind}")
+                lines.extend(f"{prefix}_{sample}" for sample in samples)
+
+        family(
+            "phase_duration_seconds", "gauge", "Duration of the last run of a model phase",
+            [f'phase_duration_seconds{{phase="{name}"}} {record.seconds!r}' for name, record in self.phases.items()],
+        )
+        family(
+            "phase_peak_memory_delta_bytes", "gauge", "Growth of the process peak RSS during the last run of a phase",
+            [
+                f'phase_peak_memory_delta_bytes{{phase="{name}"}} {record.peak_memory_delta_bytes}'
+                for name, record in self.phases.items()
+            ],
+        )
+        family(
+            "phase_runs_total", "counter", "Runs of a model phase",
+            [f'phase_runs_total{{phase="{name}"}} {calls}' for name, calls in self.phase_calls.items()],
+        )
+        for field in ("rows", "cols", "nnz"):
+            family(
+                f"matrix_{field}", "gauge", f"{field} of a model matrix when its phase last ran",
+                [
+                    f'matrix_{field}{{phase="{name}",matrix="{matrix}"}} {sizes[field]}'
+                    for name, record in self.phases.items()
+                    for matrix, sizes in record.matrices.items()
+                ],
+            )
+
+        samples = []
+        for name, histogram in self.latencies.items():
+            for bound, running in histogram.cumulative():
+                samples.append(f'call_latency_seconds_bucket{{method="{name}",le="{_bucket_label(bound)}"}} {running}')
+            samples.append(f'call_latency_seconds_sum{{method="{name}"}} {histogram.total!r}')
+            samples.append(f'call_latency_seconds_count{{method="{name}"}} {histogram.count}')
+        family("call_latency_seconds", "histogram", "Latency of model calls", samples)
+
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def collect(self, prefix: str = "recommender"):
+        """prometheus_client custom collector hook: ``REGISTRY.register(model.instrumentation)``"""
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+        duration = GaugeMetricFamily(
+            f"{prefix}_phase_duration_seconds", "Duration of the last run of a model phase", labels=["phase"]
+        )
+        memory = GaugeMetricFamily(
+            f"{prefix}_phase_peak_memory_delta_bytes",
+            "Growth of the process peak RSS during the last run of a phase",
+            labels=["phase"],
+        )
+        runs = CounterMetricFamily(f"{prefix}_phase_runs", "Runs of a model phase", labels=["phase"])
+        sizes = {
+            field: GaugeMetricFamily(
+                f"{prefix}_matrix_{field}", f"{field} of a model matrix when its phase last ran", labels=["phase", "matrix"]
+            )
+            for field in ("rows", "cols", "nnz")
+        }
+        for name, record in self.phases.items():
+            duration.add_metric([name], record.seconds)
+            memory.add_metric([name], record.peak_memory_delta_bytes)
+            runs.add_metric([name], self.phase_calls.get(name, 0))
+            for matrix, values in record.matrices.items():
+                for field, family in sizes.items():
+                    family.add_metric([name, matrix], values[field])
+
+        latency = HistogramMetricFamily(f"{prefix}_call_latency_seconds", "Latency of model calls", labels=["method"])
+        for name, histogram in self.latencies.items():
+            buckets = [(_bucket_label(bound), running) for bound, running in histogram.cumulative()]
+            latency.add_metric([name], buckets, sum_value=histogram.total)
+
+        yield from (duration, memory, runs, *sizes.values(), latency)
+
+
+def timed(name: str):
+    """Method decorator feeding ``self.instrumentation``'s latency histogram ``name`` when it is enabled"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = self.instrumentation
+            if not instrumentation.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                instrumentation.observe(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def instrumented_phase(name: str):
+    """Method decorator running the whole call as ``self.instrumentation.phase(name)``"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrumentation.phase(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
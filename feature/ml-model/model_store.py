@@ -0,0 +1,135 @@
+"""
+Memory-Mapped Model Store
+Branch: feature/ml-model
+
+A saved model is a directory of raw ``.npy`` files plus ``manifest.json``:
+sparse matrices are split into ``<name>.data.npy``, ``<name>.indices.npy`` and
+``<name>.indptr.npy``, dense arrays and id labels are stored as ``<name>.npy``,
+and scalars live in the manifest. Loading with ``mmap_mode="r"`` maps the files
+instead of reading them, so several server workers loading the same model
+share its pages through the OS page cache.
+
+Every save writes a fresh ``<path>.v<timestamp>`` directory and then swaps the
+``path`` symlink over to it, so ``path`` always names a complete model and the
+files a running process has mapped are never rewritten underneath it.
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from typing import Dict, Tuple
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CSR_PARTS = ("data", "indices", "indptr")
+# Versions kept on disk: the published one and the one before, which a reader
+# that resolved the link just before a swap may still be opening
+KEEP_VERSIONS = 2
+
+
+def _storable(array) -> np.ndarray:
+    """Plain numpy array that np.load can memory-map (no object dtype)"""
+    array = np.asarray(array)
+    if array.dtype == object:
+        array = array.astype(str)
+    return array
+
+
+def is_model_directory(path: str) -> bool:
+    """Whether ``path`` holds a model saved in the directory format"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def new_version_directory(path: str) -> str:
+    """Create the empty ``<path>.v<timestamp>`` directory the next version of ``path`` is written to"""
+    directory = f"{path}.v{time.time_ns()}"
+    os.makedirs(directory)
+    return directory
+
+
+def publish_version(path: str, directory: str):
+    """Point ``path`` at ``directory`` from new_version_directory with one atomic rename
+
+    ``path`` is a relative symlink to the version, replaced in a single
+    ``os.replace``, so there is no moment without a complete directory. A plain
+    directory saved before versioning is first moved aside to ``<path>.v0``.
+    Versions older than the ``KEEP_VERSIONS`` newest are deleted; processes that
+    mapped their files keep reading them until they unmap.
+    """
+    link = f"{directory}.link"
+    os.symlink(os.path.basename(directory), link)
+    if os.path.isdir(path) and not os.path.islink(path):
+        os.replace(path, f"{path}.v0")
+    os.replace(link, path)
+
+    parent, name = os.path.split(os.path.abspath(path))
+    pattern = re.compile(rf"{re.escape(name)}\.v(\d+)$")
+    versions = sorted(
+        (int(match.group(1)), entry)
+        for entry in os.listdir(parent)
+        if (match := pattern.match(entry)) and entry != os.path.basename(directory)
+    )
+    for _, entry in versions[: max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def save_arrays(path: str, arrays: Dict, attributes: Dict) -> Dict:
+    """Write sparse and dense arrays plus JSON attributes as a model directory
+
+    ``None`` entries are skipped. The arrays go to a new version directory
+    that ``path`` is switched to at the end (see publish_version). Returns the manifest.
+    """
+    staging = new_version_directory(path)
+
+    entries = {}
+    for name, value in arrays.items():
+        if value is None:
+            continue
+        if issparse(value):
+            matrix = csr_matrix(value)
+            if not matrix.has_sorted_indices:
+                matrix = matrix.sorted_indices()
+            for part in CSR_PARTS:
+                np.save(os.path.join(staging, f"{name}.{part}.npy"), getattr(matrix, part), allow_pickle=False)
+            entries[name] = {"kind": "csr", "shape": list(matrix.shape)}
+        else:
+            np.save(os.path.join(staging, f"{name}.npy"), _storable(value), allow_pickle=False)
+            entries[name] = {"kind": "array"}
+
+    manifest = {"format_version": FORMAT_VERSION, "arrays": entries, "attributes": attributes}
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    publish_version(path, staging)
+    return manifest
+
+
+def load_arrays(path: str, mmap_mode: str = "r") -> Tuple[Dict, Dict]:
+    """Read a model directory, returning ``(arrays, attributes)``
+
+    With the default ``mmap_mode="r"`` every array is a read-only memory map;
+    pass ``None`` to read them into private memory instead.
+    """
+    # Resolve the version link once, so a save during the load cannot mix two versions
+    path = os.path.realpath(path)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format: {manifest.get('format_version')}")
+
+    def load(filename):
+        return np.load(os.path.join(path, filename), mmap_mode=mmap_mode, allow_pickle=False)
+
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        if entry["kind"] == "csr":
+            parts = tuple(load(f"{name}.{part}.npy") for part in CSR_PARTS)
+            arrays[name] = csr_matrix(parts, shape=tuple(entry["shape"]), copy=False)
+        else:
+            arrays[name] = load(f"{name}.npy")
+
+    return arrays, manifest["attributes"]
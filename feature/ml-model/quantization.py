@@ -0,0 +1,99 @@
+"""
+Compact Numeric Storage for Model Matrices
+Branch: feature/ml-model
+
+Similarity graphs can be held as float32 or as int8 codes with one float32
+scale per row (``value = code * scale``, the row's largest magnitude mapping to
+127), and rating matrices as float32 or as uint8 when every rating is a whole
+number. Quantized rows are dequantized to float32 only when they are read, so
+the resident model stays at a quarter of the float64 size.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+PRECISIONS = ("float64", "float32", "int8")
+INT8_MAX = 127
+
+
+class QuantizedCSR:
+    """Sparse matrix stored as an int8 CSR of codes plus one float32 scale per row
+
+    Only what the model reads is supported: selecting rows (``matrix[rows]``)
+    and converting back with ``tocsr()``, both returning float32 CSR.
+    """
+
+    def __init__(self, codes: csr_matrix, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_csr(cls, matrix) -> "QuantizedCSR":
+        """Quantize every row of ``matrix`` against its own largest magnitude"""
+        matrix = csr_matrix(matrix)
+        counts = np.diff(matrix.indptr)
+        peaks = np.zeros(matrix.shape[0])
+        nonempty = counts > 0
+        if nonempty.any():
+            peaks[nonempty] = np.maximum.reduceat(np.abs(matrix.data), matrix.indptr[:-1][nonempty])
+
+        scales = (peaks / INT8_MAX).astype(np.float32)
+        row_scales = np.repeat(np.where(scales > 0, scales, 1), counts)
+        codes = np.rint(matrix.data / row_scales).astype(np.int8)
+        return cls(csr_matrix((codes, matrix.indices, matrix.indptr), shape=matrix.shape), scales)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nnz(self) -> int:
+        return self.codes.nnz
+
+    def __getitem__(self, rows) -> csr_matrix:
+        rows = np.atleast_1d(rows)
+        return self._dequantize(self.codes[rows], self.scales[rows])
+
+    def tocsr(self) -> csr_matrix:
+        return self._dequantize(self.codes, self.scales)
+
+    @staticmethod
+    def _dequantize(codes: csr_matrix, scales: np.ndarray) -> csr_matrix:
+        data = codes.data * np.repeat(scales, np.diff(codes.indptr))
+        return csr_matrix((data.astype(np.float32), codes.indices, codes.indptr), shape=codes.shape)
+
+
+def compact_similarity(matrix, precision: str):
+    """Similarity matrix stored at ``precision``; float64 leaves it untouched"""
+    if matrix is None or precision == "float64":
+        return matrix
+    if isinstance(matrix, QuantizedCSR):
+        return matrix if precision == "int8" else matrix.tocsr()
+    if precision == "int8":
+        return QuantizedCSR.from_csr(matrix)
+    if issparse(matrix):
+        return matrix if matrix.dtype == np.float32 else csr_matrix(matrix, dtype=np.float32)
+    return np.asarray(matrix, dtype=np.float32)
+
+
+def compact_ratings(matrix: csr_matrix, precision: str) -> csr_matrix:
+    """Rating matrix stored at ``precision``
+
+    int8 stores uint8 ratings when every rating is a whole number from 0 to 255
+    (star ratings) and falls back to float32 otherwise, e.g. for averaged cells.
+    """
+    if matrix is None or precision == "float64":
+        return matrix
+    dtype = np.float32
+    if precision == "int8" and matrix.dtype == np.uint8:
+        return matrix
+    if precision == "int8":
+        data = np.asarray(matrix.data)
+        if np.all((data >= 0) & (data <= np.iinfo(np.uint8).max) & (data == np.rint(data))):
+            dtype = np.uint8
+    return matrix if matrix.dtype == dtype else csr_matrix(matrix, dtype=dtype)
+
+
+def expanded(matrix):
+    """Quantized similarity as a float32 CSR that scipy can do arithmetic on; other matrices as they are"""
+    return matrix.tocsr() if isinstance(matrix, QuantizedCSR) else matrix
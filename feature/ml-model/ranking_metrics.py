@@ -0,0 +1,62 @@
+"""
+Vectorized top-N ranking metrics
+Branch: feature/ml-model
+
+Every function works on a whole batch of users at once: row ``u`` of
+``top_items`` holds the ranked recommendations of user ``u`` and row ``u`` of
+``relevant`` the items that user actually interacted with in the test set.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from typing import Dict
+
+
+def ranking_hits(top_items: np.ndarray, valid: np.ndarray, relevant: csr_matrix) -> np.ndarray:
+    """Boolean (users x k) matrix telling which recommended items are relevant
+
+    ``valid`` marks the ranked slots that hold a real recommendation; padded
+    slots never count as hits. Lookups are done on sorted (row, column) keys,
+    so no dense users x items block is allocated.
+    """
+    relevant = csr_matrix(relevant)
+    relevant.sort_indices()
+    n_items = relevant.shape[1]
+
+    relevant_rows = np.repeat(np.arange(relevant.shape[0], dtype=np.int64), np.diff(relevant.indptr))
+    relevant_keys = relevant_rows * n_items + relevant.indices
+
+    rows = np.arange(top_items.shape[0], dtype=np.int64)[:, np.newaxis]
+    candidate_keys = rows * n_items + np.maximum(top_items, 0)
+
+    if len(relevant_keys) == 0:
+        return np.zeros(top_items.shape, dtype=bool)
+
+    positions = np.minimum(np.searchsorted(relevant_keys, candidate_keys), len(relevant_keys) - 1)
+    return (relevant_keys[positions] == candidate_keys) & valid
+
+
+def ranking_metric_sums(hits: np.ndarray, n_relevant: np.ndarray, k: int) -> Dict[str, float]:
+    """Per-batch sums of precision@k, recall@k, NDCG@k and AP@k
+
+    Sums rather than means, so batches can be accumulated and divided by the
+    total number of users at the end.
+    """
+    hits = hits[:, :k].astype(np.float64)
+    n_relevant = np.asarray(n_relevant, dtype=np.float64)
+    n_hits = hits.sum(axis=1)
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = hits @ discounts[: hits.shape[1]]
+    ideal_lengths = np.minimum(n_relevant, k).astype(np.int64)
+    idcg = np.concatenate([[0.0], np.cumsum(discounts)])[ideal_lengths]
+
+    precision_at_rank = np.cumsum(hits, axis=1) / np.arange(1, hits.shape[1] + 1)
+    average_precision = (precision_at_rank * hits).sum(axis=1) / np.maximum(np.minimum(n_relevant, k), 1)
+
+    return {
+        "precision": float((n_hits / k).sum()),
+        "recall": float((n_hits / np.maximum(n_relevant, 1)).sum()),
+        "ndcg": float(np.divide(dcg, idcg, where=idcg > 0, out=np.zeros_like(dcg)).sum()),
+        "map": float(average_precision.sum()),
+    }
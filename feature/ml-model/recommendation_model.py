@@ -8,37 +8,392 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.metrics import mean_squared_error, mean_absolute_error
-from scipy.sparse import csr_matrix, issparse
-import mlflow
-import mlflow.sklearn
-from typing import List, Tuple, Dict
+from sklearn.preprocessing import normalize
+from scipy.sparse import coo_matrix, csr_matrix, diags, issparse, vstack
+from ranking_metrics import ranking_hits, ranking_metric_sums
+from topn_table import write_topn_table
+from model_store import is_model_directory, load_arrays, save_arrays
+from ann_index import CosineLSHIndex
+from quantization import PRECISIONS, QuantizedCSR, compact_ratings, compact_similarity, expanded
+from instrumentation import Instrumentation, instrumented_phase, timed
+from typing import List, Optional, Tuple, Dict
+from collections.abc import Mapping
 import pickle
 import json
 import logging
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _take_rows(matrix, rows: np.ndarray) -> csr_matrix:
+    """Select rows of a sparse, dense or quantized matrix as CSR"""
+    if isinstance(matrix, QuantizedCSR):
+        return matrix[rows]
+    if issparse(matrix):
+        return csr_matrix(matrix)[rows]
+    return csr_matrix(np.asarray(matrix)[rows])
+
+
+def _positive_part(matrix: csr_matrix) -> csr_matrix:
+    """Drop non-positive entries from a CSR matrix"""
+    matrix = matrix.copy()
+    matrix.data[matrix.data <= 0] = 0
+    matrix.eliminate_zeros()
+    return matrix
+
+
+# Entries of the padded dense block _top_k_mask partitions at once
+_TOP_K_BLOCK_ENTRIES = 2**22
+
+
+def _keep_entries(matrix: csr_matrix, keep: np.ndarray) -> csr_matrix:
+    """CSR copy of ``matrix`` with only the stored entries flagged in ``keep``"""
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    indptr = np.zeros(matrix.shape[0] + 1, dtype=matrix.indptr.dtype)
+    np.cumsum(np.bincount(rows[keep], minlength=matrix.shape[0]), out=indptr[1:])
+    return csr_matrix((matrix.data[keep], matrix.indices[keep], indptr), shape=matrix.shape)
+
+
+def _top_k_mask(matrix: csr_matrix, k: int) -> np.ndarray:
+    """Stored entries among the ``k`` largest of their row, ties going to the lower column index
+
+    Only rows holding more than ``k`` entries are ranked: they are copied into a
+    padded dense block, a bounded number of rows at a time, where an
+    ``np.partition`` per row finds the k-th largest value. Entries above it are
+    kept, and entries equal to it fill the remaining places by column index.
+    """
+    counts = np.diff(matrix.indptr)
+    keep = np.ones(matrix.nnz, dtype=bool)
+    long_rows = np.flatnonzero(counts > k)
+    if len(long_rows) == 0 or k <= 0:
+        return keep & (k > 0)
+
+    dtype = matrix.data.dtype if np.issubdtype(matrix.data.dtype, np.floating) else np.float64
+    cutoff = np.full(matrix.shape[0], -np.inf, dtype=dtype)
+    width = counts[long_rows].max()
+    for start in range(0, len(long_rows), max(_TOP_K_BLOCK_ENTRIES // width, 1)):
+        rows = long_rows[start : start + max(_TOP_K_BLOCK_ENTRIES // width, 1)]
+        lengths = counts[rows]
+        row_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.arange(lengths.sum()) - row_starts
+        padded = np.full((len(rows), width), -np.inf, dtype=dtype)
+        padded[np.repeat(np.arange(len(rows)), lengths), positions] = matrix.data[
+            np.repeat(matrix.indptr[rows], lengths) + positions
+        ]
+        cutoff[rows] = np.partition(padded, width - k, axis=1)[:, width - k]
+
+    row_ids = np.repeat(np.arange(matrix.shape[0]), counts)
+    threshold = cutoff[row_ids]
+    keep = matrix.data > threshold
+    tied = np.flatnonzero(matrix.data == threshold)
+    if len(tied):
+        missing = k - np.bincount(row_ids[keep], minlength=matrix.shape[0])
+        tied = tied[np.lexsort((matrix.indices[tied], row_ids[tied]))]
+        tied_rows = row_ids[tied]
+        rank = np.arange(len(tied)) - np.searchsorted(tied_rows, tied_rows)
+        keep[tied[rank < missing[tied_rows]]] = True
+    return keep
+
+
+def _top_k_per_row(matrix: csr_matrix, k: int) -> csr_matrix:
+    """Keep the ``k`` largest stored values of every row, ties going to the lower column index"""
+    if np.diff(matrix.indptr).max(initial=0) <= k:
+        return matrix
+    return _keep_entries(matrix, _top_k_mask(matrix, k))
+
+
+def _split_top_k(matrix: csr_matrix, k: int) -> Tuple[csr_matrix, csr_matrix]:
+    """The ``k`` largest stored values of every row, and the entries left over"""
+    keep = _top_k_mask(matrix, k)
+    return _keep_entries(matrix, keep), _keep_entries(matrix, ~keep)
+
+
+def _top_n_per_row(scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the ``n`` largest positive scores of every row, best first
+
+    Rows with fewer than ``n`` positive scores are padded with index -1 and score 0.
+    Ties go to the lower column index.
+    """
+    n_rows, n_cols = scores.shape
+    width = min(n, n_cols)
+    top_indices = np.full((n_rows, n), -1, dtype=np.int64)
+    top_scores = np.zeros((n_rows, n))
+    if width == 0 or n_rows == 0:
+        return top_indices, top_scores
+
+    candidates = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+    # argpartition picks arbitrarily among positive values tied at the cut-off:
+    # for those rows keep everything above it plus the lowest-indexed tied columns
+    cutoff = candidate_scores.min(axis=1)[:, np.newaxis]
+    tied = (cutoff[:, 0] > 0) & ((scores == cutoff).sum(axis=1) != (candidate_scores == cutoff).sum(axis=1))
+    if tied.any():
+        tied_scores = scores[tied]
+        at_cutoff = tied_scores == cutoff[tied]
+        above = tied_scores > cutoff[tied]
+        needed = width - above.sum(axis=1, keepdims=True)
+        selected = above | (at_cutoff & (np.cumsum(at_cutoff, axis=1) <= needed))
+        candidates[tied] = np.nonzero(selected)[1].reshape(-1, width)
+        candidate_scores[tied] = np.take_along_axis(tied_scores, candidates[tied], axis=1)
+
+    order = np.lexsort((candidates, -candidate_scores))
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+    positive = candidate_scores > 0
+    top_indices[:, :width] = np.where(positive, candidates, -1)
+    top_scores[:, :width] = np.where(positive, candidate_scores, 0)
+    return top_indices, top_scores
+
+
+def _sparse_ratio(numerator: csr_matrix, denominator: csr_matrix) -> csr_matrix:
+    """Element-wise ratio over the stored entries of a positive denominator, 0 elsewhere"""
+    numerator, denominator = csr_matrix(numerator), csr_matrix(denominator)
+    if np.array_equal(numerator.indptr, denominator.indptr) and np.array_equal(numerator.indices, denominator.indices):
+        # Same sparsity pattern (the usual case): divide the stored values directly
+        return csr_matrix((numerator.data / denominator.data, numerator.indices, numerator.indptr), shape=numerator.shape)
+
+    inverse = denominator.copy()
+    inverse.data = 1.0 / inverse.data
+    return csr_matrix(numerator.multiply(inverse))
+
+
+def _without_entries(matrix: csr_matrix, mask: csr_matrix) -> csr_matrix:
+    """Copy of ``matrix`` without the positions stored in the binary ``mask``"""
+    result = csr_matrix(matrix - matrix.multiply(mask))
+    result.eliminate_zeros()
+    return result
+
+
+def _row_min(matrix: csr_matrix) -> np.ndarray:
+    """Smallest stored value of every CSR row, inf for empty rows"""
+    counts = np.diff(matrix.indptr)
+    minima = np.full(matrix.shape[0], np.inf)
+    nonempty = counts > 0
+    if nonempty.any():
+        minima[nonempty] = np.minimum.reduceat(matrix.data, matrix.indptr[:-1][nonempty])
+    return minima
+
+
+def _resized(matrix, shape: Tuple[int, int]) -> csr_matrix:
+    """CSR copy of ``matrix`` grown to ``shape`` with empty rows and columns"""
+    matrix = csr_matrix(matrix)
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+
+def _replace_rows(matrix: csr_matrix, rows: np.ndarray, new_rows: csr_matrix) -> csr_matrix:
+    """Copy of ``matrix`` whose ``rows`` are replaced by the rows of ``new_rows``"""
+    keep = np.ones(matrix.shape[0])
+    keep[rows] = 0
+    placement = csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(matrix.shape[0], len(rows)))
+    return csr_matrix(diags(keep) @ matrix + placement @ new_rows)
+
+
+def _dense(scores) -> np.ndarray:
+    """Score block as a dense array, whether the model returned it sparse or dense"""
+    return scores.toarray() if issparse(scores) else scores
+
+
+def _nnz_blocks(indptr: np.ndarray, max_nnz: int) -> List[Tuple[int, int]]:
+    """Consecutive ``(start, stop)`` row ranges of a CSR matrix holding about ``max_nnz`` entries each"""
+    cuts = np.searchsorted(indptr, np.arange(max_nnz, indptr[-1], max_nnz))
+    bounds = np.unique(np.concatenate([[0], cuts, [len(indptr) - 1]]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _solve_rows(ratings: csr_matrix, fixed: np.ndarray, offset: float, regularization: float) -> np.ndarray:
+    """Ridge solutions ``x_r`` of ``fixed[cols] @ x_r ~ ratings[r, cols] - offset`` for every row
+
+    The penalty grows with the row's rating count (weighted-lambda ALS). Rows
+    whose counts fall in the same power of two are zero-padded to a common
+    length, so each group's normal equations are one batched matmul.
+    """
+    n_factors = fixed.shape[1]
+    solutions = np.zeros((ratings.shape[0], n_factors))
+    counts = np.diff(ratings.indptr)
+    groups = np.ceil(np.log2(np.maximum(counts, 1))).astype(int)
+
+    for group in np.unique(groups[counts > 0]):
+        rows = np.flatnonzero((groups == group) & (counts > 0))
+        lengths = counts[rows]
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entries = np.repeat(ratings.indptr[rows], lengths) + positions
+        members = np.repeat(np.arange(len(rows)), lengths)
+
+        padded = np.zeros((len(rows), lengths.max(), n_factors))
+        padded[members, positions] = fixed[ratings.indices[entries]]
+        targets = np.zeros((len(rows), lengths.max(), 1))
+        targets[members, positions, 0] = ratings.data[entries] - offset
+
+        padded_t = padded.transpose(0, 2, 1)
+        gram = padded_t @ padded + regularization * lengths[:, np.newaxis, np.newaxis] * np.eye(n_factors)
+        solutions[rows] = np.linalg.solve(gram, padded_t @ targets)[..., 0]
+
+    return solutions
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _score_held_out(model, alpha: float, operands: Dict, block_users, users, products) -> np.ndarray:
+    """Hybrid scores of held-out (user, product) rows whose users all belong to ``block_users``"""
+    scores = model._score_block(block_users, alpha, operands)
+    return np.asarray(scores[np.searchsorted(block_users, users), products]).ravel()
+
+
+def _rank_block(model, alpha: float, operands: Dict, block_users, block_relevant, k: int):
+    """Ranking metric sums and recommended product positions for one block of test users"""
+    scores = _dense(model._score_block(block_users, alpha, operands))
+
+    # Mask already rated items
+    rated = model.user_item_matrix[block_users].tocoo()
+    scores[rated.row, rated.col] = 0
+
+    top_items, _ = _top_n_per_row(scores, k)
+    valid = top_items >= 0
+    hits = ranking_hits(top_items, valid, block_relevant)
+    return ranking_metric_sums(hits, np.diff(block_relevant.indptr), k), np.unique(top_items[valid])
+
+
+_evaluation_worker_state = {}
+
+
+def _init_evaluation_worker(model, alpha: float):
+    """Process pool initializer: keep one model and its batch operands per worker"""
+    _evaluation_worker_state["model"] = model
+    _evaluation_worker_state["alpha"] = alpha
+    _evaluation_worker_state["operands"] = model._batch_operands()
+
+
+def _evaluation_worker(task) -> np.ndarray:
+    state = _evaluation_worker_state
+    return _score_held_out(state["model"], state["alpha"], state["operands"], *task)
+
+
+def _ranking_worker(task):
+    state = _evaluation_worker_state
+    return _rank_block(state["model"], state["alpha"], state["operands"], *task)
+
+
+class IndexLookup(Mapping):
+    """Read-only label -> position map backed by a label array
+
+    Behaves like the ``{label: idx}`` dicts it replaces, and additionally maps
+    whole arrays of labels at once with :meth:`get_indexer`.
+    """
+
+    def __init__(self, labels):
+        self._index = pd.Index(labels)
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self._index.to_numpy()
+
+    def __getitem__(self, label) -> int:
+        try:
+            return int(self._index.get_loc(label))
+        except (KeyError, TypeError):
+            raise KeyError(label)
+
+    def __contains__(self, label) -> bool:
+        try:
+            return label in self._index
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_indexer(self, labels) -> np.ndarray:
+        """Positions of ``labels``, -1 where a label is unknown"""
+        return self._index.get_indexer(pd.Index(labels))
+
+
 class CollaborativeFilteringModel:
     """
     Hybrid Collaborative Filtering Recommendation System
     Combines User-Based and Item-Based Collaborative Filtering
     """
 
-    def __init__(self, n_recommendations=10, min_interactions=2):
+    # Disabled fallback for models unpickled from before instrumentation existed
+    instrumentation = Instrumentation()
+
+    def __init__(
+        self,
+        n_recommendations=10,
+        min_interactions=2,
+        neighbor_k=50,
+        similarity_top_k=None,
+        similarity_threshold=0.0,
+        similarity_block_size=1024,
+        popularity_half_life_days=None,
+        ann_params=None,
+        precision="float64",
+        similarity_slack=10,
+    ):
+        if ann_params is not None and similarity_top_k is None:
+            raise ValueError("ann_params requires similarity_top_k")
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+
         self.n_recommendations = n_recommendations
         self.min_interactions = min_interactions
+        self.neighbor_k = neighbor_k
+        # kNN similarity mode: keep only the top similarity_top_k neighbors above the threshold
+        self.similarity_top_k = similarity_top_k
+        self.similarity_threshold = similarity_threshold
+        self.similarity_block_size = similarity_block_size
+        # Exact kNN mode also keeps the next similarity_slack neighbors of every row in a
+        # reserve graph, so partial_fit rarely has to rebuild a row that lost a neighbor
+        self.similarity_slack = similarity_slack
+        # Approximate kNN: CosineLSHIndex settings; candidate pairs come from LSH buckets
+        self.ann_params = ann_params
+        self.item_index = None
+        # Time-decayed popularity: a rating loses half its weight every popularity_half_life_days
+        self.popularity_half_life_days = popularity_half_life_days
+        # Storage precision of ratings and similarities: float64, float32 or int8 (see quantization)
+        self.precision = precision
         self.user_item_matrix = None
+        self.interaction_counts = None
         self.user_similarity = None
+        self.user_similarity_reserve = None
+        self.user_neighbors = None
         self.item_similarity = None
+        self.item_similarity_reserve = None
+        self._item_similarity_t = None
+        self._batch_operands_cache = None
+        self.similarity_stats = {}
         self.user_mean_ratings = None
         self.global_mean = None
-        self.product_lookup = {}
-        self.user_lookup = {}
+        self.popularity_scores = None
+        self.popularity_ranking = None
+        self.popularity_reference_date = None
+        self.product_categories = None
+        self.category_rankings = {}
+        self.product_lookup = IndexLookup([])
+        self.user_lookup = IndexLookup([])
+        # Phase timings and call latencies, off until instrumentation.enable()
+        self.instrumentation = Instrumentation()
 
     def create_interaction_matrix(self, df: pd.DataFrame) -> csr_matrix:
-        """Create user-item interaction matrix"""
+        """Create the sparse user-item interaction matrix
+
+        The CSR matrix is built straight from categorical codes, so memory scales
+        with the number of interactions. Repeated (user, product) pairs are
+        averaged, as pivot_table did.
+        """
         logger.info("Creating interaction matrix...")
 
         # Check if dataframe is empty
@@ -46,13 +401,14 @@ class CollaborativeFilteringModel:
             raise ValueError("Cannot create interaction matrix from empty dataframe")
 
         # Filter users and products with minimum interactions
-        user_counts = df["user_id"].value_counts()
-        product_counts = df["product_id"].value_counts()
+        with self.instrumentation.phase("filter"):
+            user_counts = df["user_id"].value_counts()
+            product_counts = df["product_id"].value_counts()
 
-        valid_users = user_counts[user_counts >= self.min_interactions].index
-        valid_products = product_counts[product_counts >= self.min_interactions].index
+            valid_users = user_counts[user_counts >= self.min_interactions].index
+            valid_products = product_counts[product_counts >= self.min_interactions].index
 
-        df_filtered = df[(df["user_id"].isin(valid_users)) & (df["product_id"].isin(valid_products))]
+            df_filtered = df[(df["user_id"].isin(valid_users)) & (df["product_id"].isin(valid_products))]
 
         # Check if filtered dataframe is empty
         if df_filtered.empty:
@@ -63,173 +419,905 @@ class CollaborativeFilteringModel:
         logger.info(f"Filtered to {len(df_filtered)} interactions")
         logger.info(f"Users: {len(valid_users)}, Products: {len(valid_products)}")
 
-        # Create pivot table
-        self.user_item_matrix = df_filtered.pivot_table(index="user_id", columns="product_id", values="rating", fill_value=0)
+        with self.instrumentation.phase("pivot") as phase:
+            df_filtered = df_filtered[df_filtered["rating"].notna()]
+            user_codes, user_labels = pd.factorize(df_filtered["user_id"], sort=True)
+            product_codes, product_labels = pd.factorize(df_filtered["product_id"], sort=True)
+            ratings = df_filtered["rating"].to_numpy(dtype=np.float64)
+
+            # Sum and count duplicates in one pass each, then average
+            shape = (len(user_labels), len(product_labels))
+            sums = coo_matrix((ratings, (user_codes, product_codes)), shape=shape).tocsr()
+            counts = coo_matrix((np.ones_like(ratings), (user_codes, product_codes)), shape=shape).tocsr()
+            sums.data /= counts.data
+            sums.eliminate_zeros()
+            self.user_item_matrix = sums
+            # Raw rating counts per cell, so partial_fit can keep averaging duplicates
+            self.interaction_counts = counts
+            phase.matrix("user_item_matrix", sums)
 
         # Store lookups
-        self.user_lookup = {user: idx for idx, user in enumerate(self.user_item_matrix.index)}
-        self.product_lookup = {prod: idx for idx, prod in enumerate(self.user_item_matrix.columns)}
+        self.user_lookup = IndexLookup(user_labels)
+        self.product_lookup = IndexLookup(product_labels)
 
         # Store metadata
-        self.user_mean_ratings = df_filtered.groupby("user_id")["rating"].mean().to_dict()
-        self.global_mean = df_filtered["rating"].mean()
-
-        return csr_matrix(self.user_item_matrix.values)
+        self.user_mean_ratings = np.bincount(user_codes, weights=ratings) / np.bincount(user_codes)
+        self.global_mean = ratings.mean()
+
+        with self.instrumentation.phase("popularity"):
+            self.compute_popularity(df_filtered)
+        self._apply_precision()
+
+        return self.user_item_matrix
+
+    def compute_popularity(self, df: pd.DataFrame = None):
+        """Score and rank products once for cold-start recommendations
+
+        The score is the mean rating of a product. With ``popularity_half_life_days``
+        set and a ``review_date`` column in ``df``, each rating is weighted by
+        ``0.5 ** (age / half_life)`` relative to the latest review, so products
+        whose ratings are old fade out; undated ratings get no weight. A
+        ``main_category`` column adds one ranking per category.
+        """
+        n_products = self.user_item_matrix.shape[1]
+        ratings = self.user_item_matrix.tocsc()
+        sums = np.asarray(ratings.sum(axis=0)).ravel()
+        counts = np.diff(ratings.indptr)
+
+        if df is not None:
+            self.product_categories = None
+            product_codes = self.product_lookup.get_indexer(df["product_id"])
+            known = product_codes >= 0
+
+            if self.popularity_half_life_days is not None and "review_date" in df.columns:
+                dates = pd.to_datetime(df["review_date"], errors="coerce")
+                self.popularity_reference_date = dates.max().timestamp() if dates.notna().any() else None
+                age_days = ((dates.max() - dates).dt.total_seconds() / 86400).to_numpy()
+                weights = np.nan_to_num(0.5 ** (age_days / self.popularity_half_life_days))
+                rating_values = df["rating"].to_numpy(dtype=np.float64)
+                weighted = (weights * rating_values)[known]
+                sums = np.bincount(product_codes[known], weights=weighted, minlength=n_products)
+                counts = np.bincount(product_codes[known], minlength=n_products)
+
+            if "main_category" in df.columns:
+                categories = df["main_category"].fillna("Unknown").to_numpy()[known]
+                first = np.unique(product_codes[known], return_index=True)[1]
+                self.product_categories = np.full(n_products, "Unknown", dtype=object)
+                self.product_categories[product_codes[known][first]] = categories[first]
+
+        self.popularity_scores = sums / np.maximum(counts, 1)
+        self._rank_popularity()
+        return self.popularity_scores
+
+    def _rank_popularity(self):
+        """Sort products by popularity_scores, overall and per category"""
+        self.popularity_ranking = np.argsort(-self.popularity_scores, kind="stable")
+
+        self.category_rankings = {}
+        if self.product_categories is not None:
+            ranked_categories = self.product_categories[self.popularity_ranking]
+            for category in np.unique(ranked_categories):
+                self.category_rankings[category] = self.popularity_ranking[ranked_categories == category]
 
     def compute_user_similarity(self):
         """Compute user-user similarity matrix"""
         logger.info("Computing user similarity...")
-        self.user_similarity = cosine_similarity(self.user_item_matrix, dense_output=False)
+        with self.instrumentation.phase("user_similarity") as phase:
+            if self.similarity_top_k is None:
+                self.user_similarity = cosine_similarity(self.user_item_matrix, dense_output=False)
+                self.user_similarity_reserve = None
+                self.build_user_neighbors()
+            else:
+                self.user_similarity, self.user_similarity_reserve = self._knn_similarity(
+                    self.user_item_matrix, "user_similarity"
+                )
+                if self.similarity_top_k <= self.neighbor_k:
+                    # The pruned graph already is the neighbor index
+                    self.user_neighbors = self.user_similarity
+                else:
+                    self.build_user_neighbors()
+            self._apply_precision()
+            phase.matrix("user_similarity", self.user_similarity)
+            phase.matrix("user_neighbors", self.user_neighbors)
         return self
 
     def compute_item_similarity(self):
         """Compute item-item similarity matrix"""
         logger.info("Computing item similarity...")
-        self.item_similarity = cosine_similarity(self.user_item_matrix.T, dense_output=False)
+        with self.instrumentation.phase("item_similarity") as phase:
+            if self.similarity_top_k is None:
+                self.item_similarity = cosine_similarity(self.user_item_matrix.T, dense_output=False)
+                self.item_similarity_reserve = None
+            else:
+                self.item_similarity, self.item_similarity_reserve = self._knn_similarity(
+                    self.user_item_matrix.T.tocsr(), "item_similarity"
+                )
+            self._apply_precision()
+            phase.matrix("item_similarity", self.item_similarity)
         return self
 
-    def predict_user_based(self, user_idx: int, top_k: int = 50) -> np.ndarray:
-        """Predict ratings using user-based collaborative filtering"""
-        if user_idx >= len(self.user_similarity):
-            return np.zeros(self.user_item_matrix.shape[1])
-
-        # Get similar users - handle both sparse and dense matrices
-        if issparse(self.user_similarity):
-            user_sim = self.user_similarity[user_idx].toarray().flatten()
+    def _apply_precision(self):
+        """Store the ratings and similarity graphs at ``precision``; a no-op for float64
+
+        Similarities are computed in float64 and only compacted once built, so
+        the neighbor index is ranked on exact values.
+        """
+        shared_neighbors = self.user_neighbors is self.user_similarity
+        self.user_item_matrix = compact_ratings(self.user_item_matrix, self.precision)
+        # Counts grow past 255 and are multiplied by ratings in partial_fit, so they never go to uint8
+        if self.interaction_counts is not None and self.precision != "float64":
+            self.interaction_counts = csr_matrix(self.interaction_counts, dtype=np.float32)
+        self.user_similarity = compact_similarity(self.user_similarity, self.precision)
+        self.user_neighbors = (
+            self.user_similarity if shared_neighbors else compact_similarity(self.user_neighbors, self.precision)
+        )
+        self.item_similarity = compact_similarity(self.item_similarity, self.precision)
+        # Reserve graphs only rank candidates during partial_fit: float32 is enough for them
+        for name in ("user_similarity_reserve", "item_similarity_reserve"):
+            reserve = getattr(self, name)
+            if reserve is not None and self.precision != "float64":
+                setattr(self, name, csr_matrix(reserve, dtype=np.float32))
+
+    def _expand_similarities(self):
+        """Replace int8 similarity graphs by float32 CSR so they can be updated in place"""
+        shared_neighbors = self.user_neighbors is self.user_similarity
+        self.user_similarity = expanded(self.user_similarity)
+        self.user_neighbors = self.user_similarity if shared_neighbors else expanded(self.user_neighbors)
+        self.item_similarity = expanded(self.item_similarity)
+
+    def _lsh_index(self, matrix) -> CosineLSHIndex:
+        """LSH index over the rows of ``matrix``, calibrated for recall at similarity_top_k unless ann_params say otherwise"""
+        return CosineLSHIndex(**{"recall_k": self.similarity_top_k, **self.ann_params}).fit(matrix)
+
+    def _knn_similarity(self, matrix: csr_matrix, name: str) -> Tuple[csr_matrix, Optional[csr_matrix]]:
+        """Cosine similarity between rows, pruned to the top similarity_top_k neighbors per row
+
+        Rows are processed similarity_block_size at a time, so memory is bounded by
+        one block of similarities plus the pruned result instead of a full N x N matrix.
+        With ann_params set, only pairs sharing an LSH bucket are compared (see ann_index).
+        Returns the graph and the reserve graph of the next similarity_slack
+        neighbors of every row (None in ANN mode or without slack).
+        """
+        n_rows = matrix.shape[0]
+        reserve = None
+        if self.ann_params is not None:
+            # Only pairs sharing an LSH bucket are scored
+            index = self._lsh_index(matrix)
+            similarity = _top_k_per_row(index.candidate_graph(self.similarity_threshold), self.similarity_top_k)
+            if name == "item_similarity":
+                self.item_index = index
         else:
-            # Already a dense array
-            user_sim = (
-                self.user_similarity[user_idx].flatten() if self.user_similarity.ndim > 1 else self.user_similarity[user_idx]
+            normalized = normalize(matrix, norm="l2", axis=1)
+            k = self.similarity_top_k + self.similarity_slack
+            similarity = self._knn_rows(normalized, normalized.T.tocsr(), np.arange(n_rows), k)
+            if self.similarity_slack:
+                similarity, reserve = _split_top_k(similarity, self.similarity_top_k)
+
+        self.similarity_stats[f"{name}_nnz"] = similarity.nnz
+        self.similarity_stats["peak_rss_mb"] = _peak_rss_mb()
+        logger.info(
+            f"{name}: {n_rows} rows, {similarity.nnz} neighbors kept "
+            f"(top_k={self.similarity_top_k}, threshold={self.similarity_threshold}), "
+            f"peak RSS {self.similarity_stats['peak_rss_mb']:.1f} MB"
+        )
+        return similarity, reserve
+
+    def _similarity_rows(self, normalized: csr_matrix, normalized_t: csr_matrix, rows: np.ndarray) -> csr_matrix:
+        """Cosine similarities of ``rows`` above similarity_threshold, self excluded
+
+        Filtered in CSR form without sorting the column indices: callers sort once pruned.
+        """
+        block = csr_matrix(normalized[rows] @ normalized_t)
+        block.data[np.repeat(rows, np.diff(block.indptr)) == block.indices] = 0
+        block.data[block.data <= self.similarity_threshold] = 0
+        block.eliminate_zeros()
+        return block
+
+    def _knn_rows(self, normalized: csr_matrix, normalized_t: csr_matrix, rows: np.ndarray, k: int) -> csr_matrix:
+        """Cosine similarity rows of ``rows`` pruned to ``k`` neighbors, similarity_block_size rows at a time"""
+        blocks = []
+        for start in range(0, len(rows), self.similarity_block_size):
+            block_rows = rows[start : start + self.similarity_block_size]
+            block = _top_k_per_row(self._similarity_rows(normalized, normalized_t, block_rows), k)
+            block.sort_indices()
+            blocks.append(block)
+
+        return vstack(blocks, format="csr") if blocks else csr_matrix((0, normalized.shape[0]))
+
+    def build_user_neighbors(self, block_size: int = 1024):
+        """Precompute the top ``neighbor_k`` positively similar users of every user as CSR
+
+        The similarity matrix is scanned in row blocks so a dense matrix is never
+        converted to sparse in one piece. A user is never its own neighbor.
+        """
+        self.user_neighbors = self._neighbor_rows(np.arange(self.user_similarity.shape[0]), block_size)
+        return self
+
+    def _neighbor_rows(self, rows: np.ndarray, block_size: int = 1024) -> csr_matrix:
+        """Top ``neighbor_k`` positive similarities of ``rows``, self excluded"""
+        blocks = []
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start : start + block_size]
+            block = _take_rows(self.user_similarity, block_rows).tocoo()
+            block.data[block_rows[block.row] == block.col] = 0
+            blocks.append(_top_k_per_row(_positive_part(block.tocsr()), self.neighbor_k))
+
+        return vstack(blocks, format="csr") if blocks else csr_matrix((0, self.user_similarity.shape[0]))
+
+    def fit(self, df: pd.DataFrame):
+        """Build the interaction matrix and both similarity graphs"""
+        self.create_interaction_matrix(df)
+        self.compute_user_similarity()
+        self.compute_item_similarity()
+        return self
+
+    def model_size_mb(self) -> float:
+        """Memory held by the model's arrays in MB, arrays shared between attributes counted once"""
+        arrays = {}
+        for value in vars(self).values():
+            if isinstance(value, IndexLookup):
+                value = value.labels
+            if isinstance(value, QuantizedCSR):
+                arrays[id(value.scales)] = value.scales.nbytes
+                value = value.codes
+            parts = (value.data, value.indices, value.indptr) if issparse(value) else (value,)
+            arrays.update((id(part), part.nbytes) for part in parts if isinstance(part, np.ndarray))
+        return sum(arrays.values()) / 2**20
+
+    @instrumented_phase("partial_fit")
+    def partial_fit(self, new_df: pd.DataFrame):
+        """Fold new interactions into a trained model without retraining from scratch
+
+        New users and products are appended to the lookups (they need
+        ``min_interactions`` rows within ``new_df``), repeated (user, product)
+        pairs keep being averaged, and only the similarity rows and columns of
+        the users and products in ``new_df`` are recomputed, plus the kNN rows
+        that listed one of them as a neighbor. Mean ratings and popularity are
+        updated from the new rows alone.
+        """
+        touched = self._merge_interactions(new_df)
+        if touched is None:
+            return self
+        touched_users, touched_products = touched
+        shape = self.user_item_matrix.shape
+
+        # Similarities of the touched users and products
+        if self.user_similarity is not None:
+            old_user_similarity = _resized(self.user_similarity, (shape[0], shape[0]))
+            self.user_similarity, self.user_similarity_reserve = self._update_similarity(
+                old_user_similarity,
+                self.user_similarity_reserve,
+                normalize(self.user_item_matrix, norm="l2", axis=1),
+                touched_users,
+                "user_similarity",
             )
-            if user_sim.ndim > 0:
-                user_sim = user_sim.flatten()
+            if self.similarity_top_k is not None and self.similarity_top_k <= self.neighbor_k:
+                self.user_neighbors = self.user_similarity
             else:
-                user_sim = np.array([user_sim])
+                # Users whose similarity row changed: the touched ones and their old or new neighbors
+                old_rows = old_user_similarity[:, touched_users].tocoo().row
+                new_rows = self.user_similarity[:, touched_users].tocoo().row
+                changed = np.unique(np.concatenate([touched_users, old_rows, new_rows]))
+                neighbors = _resized(self.user_neighbors, (shape[0], shape[0]))
+                self.user_neighbors = _replace_rows(neighbors, changed, self._neighbor_rows(changed))
+
+        if self.item_similarity is not None:
+            # Item vectors changed: the LSH index is rebuilt on the next similar_products query
+            self.item_index = None
+            self.item_similarity, self.item_similarity_reserve = self._update_similarity(
+                _resized(self.item_similarity, (shape[1], shape[1])),
+                self.item_similarity_reserve,
+                normalize(self.user_item_matrix.T.tocsr(), norm="l2", axis=1),
+                touched_products,
+                "item_similarity",
+            )
 
-        top_similar_users = np.argsort(user_sim)[::-1][1 : top_k + 1]
+        self._apply_precision()
+        return self
 
-        # Weighted average of similar users' ratings
-        numerator = np.zeros(self.user_item_matrix.shape[1])
-        denominator = np.zeros(self.user_item_matrix.shape[1])
+    def _merge_interactions(self, new_df: pd.DataFrame) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Add the rows of ``new_df`` that pass the filters to the ratings, means and popularity
+
+        Returns the positions of the users and products those rows touched, or
+        None when no row was kept and the model is unchanged.
+        """
+        new_df = new_df[new_df["rating"].notna()]
+        known_users = self.user_lookup.get_indexer(new_df["user_id"]) >= 0
+        known_products = self.product_lookup.get_indexer(new_df["product_id"]) >= 0
+        user_counts = new_df["user_id"].map(new_df["user_id"].value_counts()).to_numpy()
+        product_counts = new_df["product_id"].map(new_df["product_id"].value_counts()).to_numpy()
+        new_df = new_df[
+            (known_users | (user_counts >= self.min_interactions))
+            & (known_products | (product_counts >= self.min_interactions))
+        ]
+        if new_df.empty:
+            logger.info("No new interactions to fold in")
+            return None
+        self._expand_similarities()
+
+        # Append unseen users and products after the existing positions
+        old_shape = self.user_item_matrix.shape
+        for attribute, column in (("user_lookup", "user_id"), ("product_lookup", "product_id")):
+            lookup = getattr(self, attribute)
+            unseen = new_df[column][lookup.get_indexer(new_df[column]) < 0]
+            if len(unseen):
+                new_labels = pd.factorize(unseen, sort=True)[1]
+                setattr(self, attribute, IndexLookup(np.concatenate([lookup.labels, np.asarray(new_labels)])))
+
+        user_codes = self.user_lookup.get_indexer(new_df["user_id"])
+        product_codes = self.product_lookup.get_indexer(new_df["product_id"])
+        ratings = new_df["rating"].to_numpy(dtype=np.float64)
+        shape = (len(self.user_lookup), len(self.product_lookup))
+
+        # Cell averages: old sum + new sum over old count + new count
+        if self.interaction_counts is None:
+            # Models saved before counts were kept: one rating per cell
+            self.interaction_counts = csr_matrix(self.user_item_matrix, copy=True)
+            self.interaction_counts.data[:] = 1
+        # Compact models store uint8 ratings: do the arithmetic in float64 so sums cannot wrap
+        old_counts = _resized(self.interaction_counts, shape).astype(np.float64)
+        old_ratings = _resized(self.user_item_matrix, shape).astype(np.float64)
+        new_counts = coo_matrix((np.ones_like(ratings), (user_codes, product_codes)), shape=shape)
+        new_sums = coo_matrix((ratings, (user_codes, product_codes)), shape=shape)
+        counts = csr_matrix(old_counts + new_counts)
+        sums = csr_matrix(old_ratings.multiply(old_counts) + new_sums)
+        self.user_item_matrix = _sparse_ratio(sums, counts)
+        self.interaction_counts = counts
+
+        # Running means over raw rating rows
+        touched_users = np.unique(user_codes)
+        old_n = np.asarray(old_counts[touched_users].sum(axis=1)).ravel()
+        new_n = np.bincount(user_codes, minlength=shape[0])[touched_users]
+        new_sums = np.bincount(user_codes, weights=ratings, minlength=shape[0])[touched_users]
+        user_means = np.zeros(shape[0])
+        user_means[: old_shape[0]] = self.user_mean_ratings
+        user_means[touched_users] = (user_means[touched_users] * old_n + new_sums) / (old_n + new_n)
+        self.user_mean_ratings = user_means
+
+        n_old = old_counts.data.sum()
+        self.global_mean = (self.global_mean * n_old + ratings.sum()) / (n_old + len(ratings))
+
+        self._update_popularity(new_df, product_codes, old_counts)
+
+        touched_products = np.unique(product_codes)
+        logger.info(
+            f"Folded in {len(new_df)} interactions: {len(touched_users)} users "
+            f"({shape[0] - old_shape[0]} new), {len(touched_products)} products ({shape[1] - old_shape[1]} new)"
+        )
+        return touched_users, touched_products
+
+    def _update_similarity(
+        self, similarity: csr_matrix, reserve: Optional[csr_matrix], normalized: csr_matrix, touched: np.ndarray, name: str
+    ) -> Tuple[csr_matrix, Optional[csr_matrix]]:
+        """Refresh a similarity graph and its reserve after the vectors of the ``touched`` rows changed
+
+        Only pairs involving a touched row change. In full mode those rows and
+        columns are recomputed. In kNN mode the touched rows are recomputed and
+        every other row merges its stored candidates (top-k plus the reserve of
+        similarity_slack more) with its new similarities to the touched rows.
+        A row with fewer than k candidates holds all of its similarities; any
+        other row may have dropped some, but never above its smallest stored
+        one. Only a row left with fewer than k candidates above that floor is
+        recomputed from scratch, which the slack makes rare.
+        When most rows are touched, recomputing the whole graph is cheaper.
+        """
+        n = normalized.shape[0]
+        if 2 * len(touched) > n:
+            if self.similarity_top_k is None:
+                return cosine_similarity(normalized, dense_output=False), None
+            return self._knn_similarity(normalized, name)
+
+        normalized_t = normalized.T.tocsr()
+        is_touched = np.zeros(n, dtype=bool)
+        is_touched[touched] = True
+        untouched = diags((~is_touched).astype(np.float64))
+
+        if self.similarity_top_k is not None:
+            fresh = self._similarity_rows(normalized, normalized_t, touched)
+        else:
+            fresh = csr_matrix(normalized[touched] @ normalized_t)
+            fresh.eliminate_zeros()
+            fresh.sort_indices()
+
+        # Similarities of the untouched rows to the touched rows, placed in the touched columns
+        to_columns = csr_matrix((np.ones(len(touched)), (np.arange(len(touched)), touched)), shape=(len(touched), n))
+        fresh_columns = csr_matrix(untouched @ csr_matrix(fresh.T) @ to_columns)
+
+        if self.similarity_top_k is None:
+            kept = untouched @ similarity @ untouched
+            return _replace_rows(csr_matrix(kept + fresh_columns), touched, fresh), None
+
+        # Models saved without a reserve are updated with no slack and keep none
+        k, block_size = self.similarity_top_k, self.similarity_block_size
+        slack = self.similarity_slack if reserve is not None else 0
+        candidates = similarity if reserve is None else csr_matrix(similarity + _resized(reserve, similarity.shape))
+
+        had_touched = csr_matrix(candidates @ diags(is_touched.astype(np.float64)))
+        affected = np.flatnonzero(((np.diff(had_touched.indptr) > 0) | (np.diff(fresh_columns.indptr) > 0)) & ~is_touched)
+        old_rows = candidates[affected]
+        merged = csr_matrix(old_rows @ untouched + fresh_columns[affected])
+
+        # Below the smallest candidate of a full row, unstored similarities could outrank the merged ones
+        full = np.diff(old_rows.indptr) >= k
+        floor = np.where(full, _row_min(old_rows), -np.inf)
+        merged = _keep_entries(merged, merged.data >= np.repeat(floor, np.diff(merged.indptr)))
+        merged = _top_k_per_row(merged, k + slack)
+        stale = full & (np.diff(merged.indptr) < k)
+
+        rows = np.concatenate([touched, affected[~stale], affected[stale]])
+        new_rows = vstack(
+            [
+                *(
+                    _top_k_per_row(fresh[start : start + block_size], k + slack)
+                    for start in range(0, len(touched), block_size)
+                ),
+                merged[~stale],
+                self._knn_rows(normalized, normalized_t, affected[stale], k + slack),
+            ],
+            format="csr",
+        )
+        logger.info(f"{len(touched)} rows recomputed, {len(affected)} merged, {stale.sum()} rebuilt after losing a neighbor")
+        candidates = _replace_rows(candidates, rows, new_rows)
+        candidates.sort_indices()
+        if reserve is None:
+            return candidates, None
+        return _split_top_k(candidates, k)
+
+    def _update_popularity(self, new_df: pd.DataFrame, product_codes: np.ndarray, old_counts: csr_matrix):
+        """Fold new ratings into the popularity scores and rankings"""
+        n_products = self.user_item_matrix.shape[1]
+
+        if self.product_categories is not None and len(self.product_categories) < n_products:
+            categories = np.full(n_products, "Unknown", dtype=object)
+            categories[: len(self.product_categories)] = self.product_categories
+            if "main_category" in new_df.columns:
+                # First category seen for each new product, as in compute_popularity
+                new_codes, first = np.unique(product_codes, return_index=True)
+                is_new = new_codes >= len(self.product_categories)
+                new_categories = new_df["main_category"].fillna("Unknown").to_numpy()[first[is_new]]
+                categories[new_codes[is_new]] = new_categories
+            self.product_categories = categories
+
+        if self.popularity_reference_date is None or "review_date" not in new_df.columns:
+            self.compute_popularity()
+            return
+
+        # Time-decayed sums shift by one factor when the reference date moves forward
+        dates = pd.to_datetime(new_df["review_date"], errors="coerce")
+        reference = max(self.popularity_reference_date, dates.max().timestamp() if dates.notna().any() else 0)
+        half_life_seconds = self.popularity_half_life_days * 86400
+        old_n = np.zeros(n_products)
+        old_n[: old_counts.shape[1]] = np.asarray(old_counts.sum(axis=0)).ravel()
+        sums = np.zeros(n_products)
+        sums[: len(self.popularity_scores)] = self.popularity_scores
+        sums *= old_n * 0.5 ** ((reference - self.popularity_reference_date) / half_life_seconds)
+
+        age_seconds = (pd.Timestamp(reference, unit="s") - dates).dt.total_seconds().to_numpy()
+        weights = np.nan_to_num(0.5 ** (age_seconds / half_life_seconds)) * new_df["rating"].to_numpy(dtype=np.float64)
+        sums += np.bincount(product_codes, weights=weights, minlength=n_products)
+        n = old_n + np.bincount(product_codes, minlength=n_products)
+
+        self.popularity_scores = sums / np.maximum(n, 1)
+        self.popularity_reference_date = reference
+        self._rank_popularity()
+
+    def _user_neighbor_weights(self, user_indices: np.ndarray, top_k: int) -> csr_matrix:
+        """Similarity weights of the top_k neighbors of each user, one CSR row per user
+
+        Served from ``user_neighbors`` up to ``neighbor_k`` neighbors, from the
+        similarity rows beyond that.
+        """
+        user_indices = np.asarray(user_indices)
+        if self.user_neighbors is not None and top_k <= self.neighbor_k:
+            weights = self.user_neighbors[user_indices]
+        else:
+            weights = _take_rows(self.user_similarity, user_indices).tocoo()
+            weights.data[weights.col == user_indices[weights.row]] = 0
+            weights = _positive_part(weights.tocsr())
 
-        for similar_user in top_similar_users:
-            sim_score = user_sim[similar_user]
-            if sim_score > 0:
-                ratings = self.user_item_matrix.iloc[similar_user].values
-                numerator += sim_score * ratings
-                denominator += sim_score * (ratings > 0)
+        return _top_k_per_row(weights, top_k)
 
-        predictions = np.divide(numerator, denominator, where=denominator != 0, out=np.zeros_like(numerator))
+    def predict_user_based(self, user_idx: int, top_k: int = 50) -> np.ndarray:
+        """Predict ratings using user-based collaborative filtering
 
-        return predictions
+        Gathers the neighbors' rating rows from the CSR interaction matrix and
+        takes their similarity-weighted average in one sparse product.
+        """
+        n_items = self.user_item_matrix.shape[1]
+        if user_idx >= self.user_similarity.shape[0]:
+            return np.zeros(n_items)
+
+        weights = self._user_neighbor_weights([user_idx], top_k)
+        neighbor_ratings = self.user_item_matrix[weights.indices]
+        rated = neighbor_ratings.copy()
+        rated.data[:] = 1
+
+        numerator = neighbor_ratings.T @ weights.data
+        denominator = rated.T @ weights.data
+
+        return np.divide(numerator, denominator, where=denominator != 0, out=np.zeros(n_items))
 
     def predict_item_based(self, user_idx: int, top_k: int = 50) -> np.ndarray:
-        """Predict ratings using item-based collaborative filtering"""
+        """Predict ratings using item-based collaborative filtering
+
+        Every unrated item is scored in one sparse pass over the similarity rows
+        of the items the user has rated, keeping at most ``top_k`` positive
+        neighbors per scored item.
+        """
+        n_items = self.user_item_matrix.shape[1]
         if user_idx >= self.user_item_matrix.shape[0]:
-            return np.zeros(self.user_item_matrix.shape[1])
+            return np.zeros(n_items)
 
-        user_ratings = self.user_item_matrix.iloc[user_idx].values
-        predictions = np.zeros(len(user_ratings))
+        user_row = self.user_item_matrix[user_idx]
+        rated_items = user_row.indices
+        if len(rated_items) == 0:
+            return np.zeros(n_items)
 
-        for item_idx in range(len(user_ratings)):
-            if user_ratings[item_idx] == 0:  # Only predict for unrated items
-                # Handle both sparse and dense matrices
-                if issparse(self.item_similarity):
-                    item_sim = self.item_similarity[item_idx].toarray().flatten()
-                else:
-                    # Already a dense array
-                    item_sim = (
-                        self.item_similarity[item_idx].flatten()
-                        if self.item_similarity.ndim > 1
-                        else self.item_similarity[item_idx]
-                    )
-                    if item_sim.ndim > 0:
-                        item_sim = item_sim.flatten()
-                    else:
-                        item_sim = np.array([item_sim])
-
-                rated_items = np.where(user_ratings > 0)[0]
-
-                if len(rated_items) > 0:
-                    # Get top similar items that user has rated
-                    similar_rated = [(i, item_sim[i]) for i in rated_items if item_sim[i] > 0]
-                    similar_rated.sort(key=lambda x: x[1], reverse=True)
-                    similar_rated = similar_rated[:top_k]
-
-                    if similar_rated:
-                        numerator = sum(user_ratings[i] * sim for i, sim in similar_rated)
-                        denominator = sum(sim for _, sim in similar_rated)
-                        predictions[item_idx] = numerator / denominator if denominator > 0 else 0
+        # Weight of every rated item in the neighborhood of every item
+        neighbors = _positive_part(_take_rows(self._item_neighbor_matrix(), rated_items))
+
+        # Keep only the top_k rated neighbors of each scored item
+        if len(rated_items) > top_k:
+            neighbors = _top_k_per_row(neighbors.T.tocsr(), top_k).T.tocsr()
+
+        numerator = neighbors.T @ user_row.data
+        denominator = np.asarray(neighbors.sum(axis=0)).ravel()
+
+        predictions = np.divide(numerator, denominator, where=denominator > 0, out=np.zeros(n_items))
+        predictions[rated_items] = 0
 
         return predictions
 
+    def _item_neighbor_matrix(self):
+        """Item similarity laid out as [rated item, scored item]
+
+        Full cosine similarity is symmetric and used as is. A pruned kNN graph holds
+        each item's neighbors in its row, so its transpose is cached instead.
+        """
+        if self.similarity_top_k is None:
+            return self.item_similarity
+
+        if self._item_similarity_t is None or self._item_similarity_t[0] is not self.item_similarity:
+            transposed = compact_similarity(csr_matrix(expanded(self.item_similarity)).T.tocsr(), self.precision)
+            self._item_similarity_t = (self.item_similarity, transposed)
+        return self._item_similarity_t[1]
+
+    @timed("predict_hybrid")
     def predict_hybrid(self, user_idx: int, alpha: float = 0.5) -> np.ndarray:
-        """Hybrid prediction combining user-based and item-based"""
-        user_pred = self.predict_user_based(user_idx)
-        item_pred = self.predict_item_based(user_idx)
+        """Hybrid prediction combining user-based and item-based, over ``neighbor_k`` neighbors"""
+        user_pred = self.predict_user_based(user_idx, top_k=self.neighbor_k)
+        item_pred = self.predict_item_based(user_idx, top_k=self.neighbor_k)
 
         # Combine predictions
         hybrid_pred = alpha * user_pred + (1 - alpha) * item_pred
 
         return hybrid_pred
 
-    def recommend_products(self, user_id: int, n: int = None) -> List[Tuple[str, float]]:
-        """Generate top-N product recommendations for a user"""
+    @timed("recommend_products")
+    def recommend_products(
+        self, user_id: int, n: int = None, category: str = None, viewed_products=None
+    ) -> List[Tuple[str, float]]:
+        """Generate top-N product recommendations for a user
+
+        Users unknown to the model are scored from ``viewed_products`` when given
+        (see recommend_for_session). ``category`` only applies to cold-start users
+        left without a session score, who get the most popular products of that category.
+        """
         if n is None:
             n = self.n_recommendations
 
         if user_id not in self.user_lookup:
+            if viewed_products:
+                return self.recommend_for_session(viewed_products, n, category)
             # Cold start: recommend popular products
-            return self._recommend_popular(n)
+            return self._recommend_popular(n, category)
 
         user_idx = self.user_lookup[user_id]
 
         # Get predictions
         predictions = self.predict_hybrid(user_idx)
 
-        # Get items user hasn't rated
-        user_ratings = self.user_item_matrix.iloc[user_idx].values
-        unrated_mask = user_ratings == 0
-
         # Mask already rated items
-        predictions[~unrated_mask] = -np.inf
-
-        # Get top N
-        top_indices = np.argsort(predictions)[::-1][:n]
-
-        product_ids = self.user_item_matrix.columns
-        recommendations = [(product_ids[idx], predictions[idx]) for idx in top_indices if predictions[idx] > 0]
+        predictions[self.user_item_matrix[user_idx].indices] = 0
+
+        top_indices, top_scores = _top_n_per_row(predictions[np.newaxis, :], n)
+
+        product_ids = self.product_lookup.labels
+        return [(product_ids[idx], score) for idx, score in zip(top_indices[0], top_scores[0]) if idx >= 0]
+
+    def similar_products(self, product_id, n: int = 10) -> List[Tuple[str, float]]:
+        """Products most similar to ``product_id`` by cosine similarity of their ratings
+
+        With ann_params the LSH index answers the query from its buckets, so
+        products beyond the stored top-k neighbors can be returned; otherwise
+        the item similarity row is used. Unknown products get an empty list.
+        """
+        if product_id not in self.product_lookup:
+            return []
+        product_idx = self.product_lookup[product_id]
+        product_ids = self.product_lookup.labels
+
+        if self.ann_params is not None:
+            if self.item_index is None:
+                self.item_index = self._lsh_index(self.user_item_matrix.T.tocsr())
+            indices, scores = self.item_index.query_rows([product_idx], n)
+            return [(product_ids[idx], score) for idx, score in zip(indices[0], scores[0]) if idx >= 0 and score > 0]
+
+        row = _take_rows(self.item_similarity, np.array([product_idx])).toarray()
+        row[0, product_idx] = 0
+        top_indices, top_scores = _top_n_per_row(row, n)
+        return [(product_ids[idx], score) for idx, score in zip(top_indices[0], top_scores[0]) if idx >= 0]
+
+    def _session_neighbors(self, product_indices: np.ndarray) -> csr_matrix:
+        """Positive similarities of ``product_indices`` to every product, self excluded, as CSR rows"""
+        neighbors = _take_rows(self._item_neighbor_matrix(), product_indices).tocoo()
+        neighbors.data[product_indices[neighbors.row] == neighbors.col] = 0
+        return _positive_part(neighbors.tocsr())
+
+    def score_session(self, product_ids) -> np.ndarray:
+        """Score every product for a session of viewed products, without a known user
+
+        The viewed products form a sparse indicator row that is multiplied with the
+        item neighbor matrix, so each product scores its summed positive similarity
+        to the session. Unknown product ids are ignored and viewed products score 0.
+        """
+        positions = self.product_lookup.get_indexer(list(product_ids))
+        positions = np.unique(positions[positions >= 0])
+
+        # Indicator row of the session times its neighbor rows, i.e. their column sums
+        scores = np.asarray(self._session_neighbors(positions).sum(axis=0)).ravel()
+        scores[positions] = 0
+        return scores
+
+    def recommend_for_session(self, product_ids, n: int = None, category: str = None) -> List[Tuple[str, float]]:
+        """Top-N products for an anonymous or brand-new user from the products viewed in the session
+
+        Falls back to the popularity ranking when none of the viewed products is known.
+        """
+        if n is None:
+            n = self.n_recommendations
 
-        return recommendations
+        top_indices, top_scores = _top_n_per_row(self.score_session(product_ids)[np.newaxis, :], n)
+        product_ids = self.product_lookup.labels
+        recommendations = [(product_ids[idx], score) for idx, score in zip(top_indices[0], top_scores[0]) if idx >= 0]
+        return recommendations or self._recommend_popular(n, category)
+
+    def item_neighbor_graph(self, k: int = 50, block_size: int = 1024) -> csr_matrix:
+        """Top ``k`` positive session neighbors of every product as CSR, self excluded
+
+        Row ``i`` holds the products that a view of ``i`` adds score to, so a
+        session is scored by summing its rows (used by the top-N table).
+        """
+        n_items = self.user_item_matrix.shape[1]
+        blocks = [
+            _top_k_per_row(self._session_neighbors(np.arange(start, min(start + block_size, n_items))), k)
+            for start in range(0, n_items, block_size)
+        ]
+        return vstack(blocks, format="csr") if blocks else csr_matrix((0, n_items))
+
+    def score_sessions(self, sessions) -> csr_matrix:
+        """score_session for many sessions at once, one CSR row per session
+
+        The sessions form a sparse indicator matrix over the distinct products
+        they viewed, which is multiplied with those products' neighbor rows, so
+        all sessions are scored in one sparse product.
+        """
+        n_items = self.user_item_matrix.shape[1]
+        lengths = [len(session) for session in sessions]
+        rows = np.repeat(np.arange(len(sessions)), lengths)
+        positions = self.product_lookup.get_indexer([product for session in sessions for product in session])
+        rows, positions = rows[positions >= 0], positions[positions >= 0]
+        if len(positions) == 0:
+            return csr_matrix((len(sessions), n_items))
+
+        distinct, columns = np.unique(positions, return_inverse=True)
+        indicator = csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(sessions), len(distinct)))
+        # A product viewed twice in a session counts once, as in score_session
+        indicator.sum_duplicates()
+        indicator.data[:] = 1
+
+        viewed = csr_matrix((np.ones(len(rows)), (rows, positions)), shape=(len(sessions), n_items))
+        viewed.sum_duplicates()
+        viewed.data[:] = 1
+        return _without_entries(csr_matrix(indicator @ self._session_neighbors(distinct)), viewed)
+
+    def recommend_for_sessions(
+        self, sessions, n: int = None, category: str = None, block_size: int = 1024
+    ) -> List[List[Tuple[str, float]]]:
+        """recommend_for_session for many sessions, ``block_size`` sessions per sparse product"""
+        if n is None:
+            n = self.n_recommendations
 
-    def _recommend_popular(self, n: int) -> List[Tuple[str, float]]:
-        """Recommend popular products for cold start"""
-        product_scores = self.user_item_matrix.sum(axis=0) / (self.user_item_matrix > 0).sum(axis=0)
-        top_products = product_scores.nlargest(n)
-        return [(prod, score) for prod, score in top_products.items()]
+        product_ids = self.product_lookup.labels
+        results = []
+        for start in range(0, len(sessions), block_size):
+            scores = self.score_sessions(sessions[start : start + block_size]).toarray()
+            for indices, row_scores in zip(*_top_n_per_row(scores, n)):
+                recommendations = [(product_ids[idx], score) for idx, score in zip(indices, row_scores) if idx >= 0]
+                results.append(recommendations or self._recommend_popular(n, category))
+        return results
+
+    def recommend_products_batch(
+        self, user_ids, n: int = None, alpha: float = 0.5, block_size: int = 1024, viewed_products=None
+    ) -> List[List[Tuple[str, float]]]:
+        """Generate top-N recommendations for many users at once
+
+        Known users are scored ``block_size`` at a time with sparse matrix products.
+        Unknown users are scored from their entry of ``viewed_products`` (one list
+        per user, see recommend_for_sessions) when it is not empty, and otherwise
+        get the popularity ranking, as in recommend_products. Results are returned
+        in the order of ``user_ids``.
+        """
+        if n is None:
+            n = self.n_recommendations
 
-    def evaluate(self, test_df: pd.DataFrame) -> Dict[str, float]:
-        """Evaluate model performance"""
+        user_indices = self.user_lookup.get_indexer(user_ids)
+        known = np.flatnonzero(user_indices >= 0)
+        results = [None] * len(user_indices)
+
+        unknown = np.flatnonzero(user_indices < 0)
+        with_session = [position for position in unknown if viewed_products is not None and viewed_products[position]]
+        if with_session:
+            sessions = [viewed_products[position] for position in with_session]
+            for position, recommendations in zip(with_session, self.recommend_for_sessions(sessions, n, None, block_size)):
+                results[position] = recommendations
+        if len(with_session) < len(unknown):
+            popular = self._recommend_popular(n)
+            for position in unknown:
+                if results[position] is None:
+                    results[position] = list(popular)
+
+        product_ids = self.product_lookup.labels
+        for start, top_indices, top_scores in self._top_n_blocks(user_indices[known], n, alpha, block_size):
+            positions = known[start : start + len(top_indices)]
+            for position, indices, row_scores in zip(positions, top_indices, top_scores):
+                results[position] = [(product_ids[idx], score) for idx, score in zip(indices, row_scores) if idx >= 0]
+
+        return results
+
+    def _top_n_blocks(self, user_indices: np.ndarray, n: int, alpha: float = 0.5, block_size: int = 1024):
+        """Yield ``(start, top_indices, top_scores)`` for each block of known user indices
+
+        Product positions are padded with -1 past the last positive score, as in
+        ``_top_n_per_row``; already rated products are never returned.
+        """
+        if len(user_indices) == 0:
+            return
+        operands = self._batch_operands()
+
+        for start in range(0, len(user_indices), block_size):
+            block_users = user_indices[start : start + block_size]
+            scores = _dense(self._score_block(block_users, alpha, operands))
+
+            # Mask already rated items
+            rated = self.user_item_matrix[block_users].tocoo()
+            scores[rated.row, rated.col] = 0
+
+            top_indices, top_scores = _top_n_per_row(scores, n)
+            yield start, top_indices, top_scores
+
+    def _batch_operands(self) -> Dict[str, csr_matrix]:
+        """Sparse operands shared by every block of a batch scoring call
+
+        Cached until the interaction matrix or the item similarity is replaced
+        (fit, partial_fit), so a server answering many small batches builds them once.
+        """
+        key = (self.user_item_matrix, self.item_similarity)
+        cached = self._batch_operands_cache
+        if cached is None or cached[0][0] is not key[0] or cached[0][1] is not key[1]:
+            rated = self.user_item_matrix.copy()
+            rated.data[:] = 1
+            operands = {
+                "rated": rated,
+                "item_similarity": _positive_part(csr_matrix(expanded(self._item_neighbor_matrix()))),
+            }
+            self._batch_operands_cache = cached = (key, operands)
+        return cached[1]
+
+    def _score_block(self, user_indices: np.ndarray, alpha: float, operands: Dict, top_k: int = None) -> csr_matrix:
+        """Sparse hybrid scores for a block of known users, equal to predict_hybrid row by row
+
+        Only items reachable through a neighbor are stored, so the cost follows the
+        number of candidate items rather than users x catalog size. ``top_k``
+        defaults to ``neighbor_k``, as in predict_hybrid.
+        """
+        return self._blend(self._score_components(user_indices, operands, top_k), alpha)
+
+    def _blend(self, components: Tuple, alpha: float) -> csr_matrix:
+        """Hybrid scores from the (user-based, item-based) pair of _score_components"""
+        user_scores, item_scores = components
+        return csr_matrix(alpha * user_scores + (1 - alpha) * item_scores)
+
+    def _score_components(self, user_indices: np.ndarray, operands: Dict, top_k: int = None) -> Tuple:
+        """User-based and item-based sparse scores for a block of known users, before blending"""
+        if top_k is None:
+            top_k = self.neighbor_k
+        ratings = self.user_item_matrix[user_indices]
+        rated = operands["rated"][user_indices]
+
+        # User-based: neighbor-weighted average of the neighbors' ratings
+        weights = self._user_neighbor_weights(user_indices, top_k)
+        user_scores = _sparse_ratio(weights @ self.user_item_matrix, weights @ operands["rated"])
+
+        # Item-based: one product for users whose rated items all fit in the top_k neighborhood
+        item_similarity = operands["item_similarity"]
+        item_scores = _without_entries(_sparse_ratio(ratings @ item_similarity, rated @ item_similarity), rated)
+
+        # Heavier users need per-item top_k neighbor masking
+        heavy = np.flatnonzero(np.diff(ratings.indptr) > top_k)
+        if len(heavy):
+            light = np.ones(len(user_indices))
+            light[heavy] = 0
+            exact = vstack([csr_matrix(self.predict_item_based(user_indices[row], top_k=top_k)) for row in heavy])
+            placement = csr_matrix(
+                (np.ones(len(heavy)), (heavy, np.arange(len(heavy)))), shape=(len(user_indices), len(heavy))
+            )
+            item_scores = diags(light) @ item_scores + placement @ exact
+
+        return user_scores, item_scores
+
+    def _recommend_popular(self, n: int, category: str = None) -> List[Tuple[str, float]]:
+        """Recommend popular products for cold start, served from the precomputed ranking
+
+        A category's ranking comes first; unknown categories and categories with
+        fewer than ``n`` products are filled up from the overall ranking.
+        """
+        if self.popularity_ranking is None:
+            self.compute_popularity()
+
+        top_products = self.popularity_ranking[:n]
+        if category is not None:
+            top_products = self.category_rankings.get(category, top_products[:0])[:n]
+            if len(top_products) < n:
+                others = self.popularity_ranking[~np.isin(self.popularity_ranking, top_products)]
+                top_products = np.concatenate([top_products, others[: n - len(top_products)]])
+        product_ids = self.product_lookup.labels
+        return [(product_ids[idx], self.popularity_scores[idx]) for idx in top_products]
+
+    @instrumented_phase("evaluate")
+    def evaluate(
+        self, test_df: pd.DataFrame, alpha: float = 0.5, block_size: int = 1024, n_jobs: int = 1
+    ) -> Dict[str, float]:
+        """Evaluate model performance
+
+        Held-out rows are grouped by user so every user's score vector is computed
+        once, ``block_size`` users at a time, and all of that user's held-out items
+        are gathered from it in one step. With ``n_jobs > 1`` the user blocks are
+        spread over a process pool.
+        """
         logger.info("Evaluating model...")
 
-        y_true = []
-        y_pred = []
-
-        for _, row in test_df.iterrows():
-            user_id = row["user_id"]
-            product_id = row["product_id"]
-            true_rating = row["rating"]
-
-            if user_id in self.user_lookup and product_id in self.product_lookup:
-                user_idx = self.user_lookup[user_id]
-                prod_idx = self.product_lookup[product_id]
-
-                predictions = self.predict_hybrid(user_idx)
-                pred_rating = predictions[prod_idx]
+        user_indices = self.user_lookup.get_indexer(test_df["user_id"])
+        product_indices = self.product_lookup.get_indexer(test_df["product_id"])
+        known = (user_indices >= 0) & (product_indices >= 0)
+
+        order = np.argsort(user_indices[known], kind="stable")
+        users = user_indices[known][order]
+        products = product_indices[known][order]
+        true_ratings = test_df["rating"].to_numpy(dtype=np.float64)[known][order]
+
+        # One task per block of distinct users, with all of their held-out rows
+        unique_users, starts = np.unique(users, return_index=True)
+        bounds = np.append(starts, len(users))
+        tasks = []
+        for start in range(0, len(unique_users), block_size):
+            stop = min(start + block_size, len(unique_users))
+            rows = slice(bounds[start], bounds[stop])
+            tasks.append((unique_users[start:stop], users[rows], products[rows]))
+
+        if n_jobs > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_evaluation_worker, initargs=(self, alpha)
+            ) as executor:
+                predicted = list(executor.map(_evaluation_worker, tasks))
+        else:
+            operands = self._batch_operands() if tasks else None
+            predicted = [_score_held_out(self, alpha, operands, *task) for task in tasks]
 
-                if pred_rating > 0:
-                    y_true.append(true_rating)
-                    y_pred.append(pred_rating)
+        y_pred = np.concatenate(predicted) if predicted else np.empty(0)
+        covered = y_pred > 0
+        y_true = true_ratings[covered]
+        y_pred = y_pred[covered]
 
         if len(y_true) == 0:
             return {"rmse": 0, "mae": 0, "coverage": 0}
@@ -244,18 +1332,194 @@ class CollaborativeFilteringModel:
 
         return metrics
 
+    @instrumented_phase("evaluate_ranking")
+    def evaluate_ranking(
+        self,
+        test_df: pd.DataFrame,
+        k: int = 10,
+        alpha: float = 0.5,
+        relevance_threshold: float = None,
+        block_size: int = 1024,
+        n_jobs: int = 1,
+    ) -> Dict[str, float]:
+        """Evaluate top-k recommendation quality on held-out interactions
+
+        Top-k lists are generated for all known test users ``block_size`` users at
+        a time, and precision@k, recall@k, NDCG@k and MAP@k are computed with array
+        operations over each block. Held-out rows count as relevant when their
+        rating is at least ``relevance_threshold`` (all of them by default).
+        Catalog coverage is the share of products recommended to at least one user.
+        With ``n_jobs > 1`` the user blocks are spread over a process pool.
+        """
+        logger.info(f"Evaluating top-{k} ranking...")
+
+        if relevance_threshold is not None:
+            test_df = test_df[test_df["rating"] >= relevance_threshold]
+
+        user_indices = self.user_lookup.get_indexer(test_df["user_id"])
+        product_indices = self.product_lookup.get_indexer(test_df["product_id"])
+        known = (user_indices >= 0) & (product_indices >= 0)
+
+        relevant = coo_matrix(
+            (np.ones(known.sum()), (user_indices[known], product_indices[known])), shape=self.user_item_matrix.shape
+        ).tocsr()
+        relevant.data[:] = 1
+        test_users = np.flatnonzero(np.diff(relevant.indptr))
+
+        tasks = [
+            (test_users[start : start + block_size], relevant[test_users[start : start + block_size]], k)
+            for start in range(0, len(test_users), block_size)
+        ]
+        if n_jobs > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_evaluation_worker, initargs=(self, alpha)
+            ) as executor:
+                ranked = list(executor.map(_ranking_worker, tasks))
+        else:
+            operands = self._batch_operands() if tasks else None
+            ranked = [_rank_block(self, alpha, operands, *task) for task in tasks]
+
+        totals = {"precision": 0.0, "recall": 0.0, "ndcg": 0.0, "map": 0.0}
+        recommended = np.zeros(self.user_item_matrix.shape[1], dtype=bool)
+        for sums, recommended_items in ranked:
+            recommended[recommended_items] = True
+            for name, value in sums.items():
+                totals[name] += value
+
+        n_users = max(len(test_users), 1)
+        metrics = {f"{name}_at_{k}": value / n_users for name, value in totals.items()}
+        metrics["catalog_coverage"] = float(recommended.mean()) if len(recommended) else 0.0
+        metrics["n_ranking_users"] = len(test_users)
+
+        logger.info(
+            f"Precision@{k}: {metrics[f'precision_at_{k}']:.4f}, Recall@{k}: {metrics[f'recall_at_{k}']:.4f}, "
+            f"NDCG@{k}: {metrics[f'ndcg_at_{k}']:.4f}, MAP@{k}: {metrics[f'map_at_{k}']:.4f}, "
+            f"Catalog coverage: {metrics['catalog_coverage']:.4f}"
+        )
+
+        return metrics
+
+    @instrumented_phase("evaluate_sweep")
+    def evaluate_sweep(
+        self, test_df: pd.DataFrame, alphas, ks, block_size: int = 1024
+    ) -> Dict[float, Dict[int, Dict[str, float]]]:
+        """Rating and ranking metrics for every (alpha, k) pair from one scoring pass
+
+        The user-based and item-based scores of each block of test users are
+        computed once and kept while every alpha is blended from them, and the
+        top-k lists for all cutoffs come from one top-max(k) selection. Returns
+        ``metrics[alpha][k]``, equal to ``evaluate(test_df, alpha)`` merged with
+        ``evaluate_ranking(test_df, k, alpha)``.
+        """
+        logger.info(f"Evaluating {len(alphas)} alphas x {len(ks)} cutoffs...")
+        max_k = max(ks)
+
+        user_indices = self.user_lookup.get_indexer(test_df["user_id"])
+        product_indices = self.product_lookup.get_indexer(test_df["product_id"])
+        known = (user_indices >= 0) & (product_indices >= 0)
+
+        order = np.argsort(user_indices[known], kind="stable")
+        users = user_indices[known][order]
+        products = product_indices[known][order]
+        true_ratings = test_df["rating"].to_numpy(dtype=np.float64)[known][order]
+
+        relevant = coo_matrix(
+            (np.ones(known.sum()), (user_indices[known], product_indices[known])), shape=self.user_item_matrix.shape
+        ).tocsr()
+        relevant.data[:] = 1
+        test_users = np.flatnonzero(np.diff(relevant.indptr))
+
+        predicted = {alpha: [] for alpha in alphas}
+        totals = {(alpha, k): {"precision": 0.0, "recall": 0.0, "ndcg": 0.0, "map": 0.0} for alpha in alphas for k in ks}
+        recommended = {(alpha, k): np.zeros(self.user_item_matrix.shape[1], dtype=bool) for alpha in alphas for k in ks}
+        operands = self._batch_operands() if len(test_users) else None
+
+        for start in range(0, len(test_users), block_size):
+            block_users = test_users[start : start + block_size]
+            rows = slice(*np.searchsorted(users, [block_users[0], block_users[-1] + 1]))
+            block_relevant = relevant[block_users]
+            rated = self.user_item_matrix[block_users].tocoo()
+            held_out = np.searchsorted(block_users, users[rows]), products[rows]
+            components = self._score_components(block_users, operands)
+
+            for alpha in alphas:
+                scores = _dense(self._blend(components, alpha))
+                predicted[alpha].append(np.asarray(scores[held_out]).ravel())
+
+                # Mask already rated items (on a copy: ALS blocks are shared by every alpha)
+                scores = np.array(scores)
+                scores[rated.row, rated.col] = 0
+                top_items, _ = _top_n_per_row(scores, max_k)
+                valid = top_items >= 0
+                hits = ranking_hits(top_items, valid, block_relevant)
+                for k in ks:
+                    for name, value in ranking_metric_sums(hits, np.diff(block_relevant.indptr), k).items():
+                        totals[alpha, k][name] += value
+                    recommended[alpha, k][top_items[:, :k][valid[:, :k]]] = True
+
+        results = {}
+        for alpha in alphas:
+            y_pred = np.concatenate(predicted[alpha]) if predicted[alpha] else np.empty(0)
+            covered = y_pred > 0
+            y_true, y_pred = true_ratings[covered], y_pred[covered]
+            if len(y_true):
+                rating_metrics = {
+                    "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+                    "mae": float(mean_absolute_error(y_true, y_pred)),
+                    "coverage": float(len(y_pred) / len(test_df)),
+                    "n_predictions": len(y_pred),
+                }
+            else:
+                rating_metrics = {"rmse": 0, "mae": 0, "coverage": 0}
+
+            n_users = max(len(test_users), 1)
+            results[alpha] = {}
+            for k in ks:
+                metrics = dict(rating_metrics)
+                metrics.update({f"{name}_at_{k}": value / n_users for name, value in totals[alpha, k].items()})
+                metrics["catalog_coverage"] = float(recommended[alpha, k].mean()) if self.user_item_matrix.shape[1] else 0.0
+                metrics["n_ranking_users"] = len(test_users)
+                results[alpha][k] = metrics
+
+        return results
+
     def save_model(self, path: str):
-        """Save model to disk"""
+        """Save model to disk
+
+        ``path`` is written as a directory of memory-mappable arrays (see
+        model_store). Paths ending in ``.pkl`` keep the single-file pickle format.
+        """
+        if not path.endswith(".pkl"):
+            self._save_directory(path)
+            logger.info(f"Model saved to {path}")
+            return
+
         model_data = {
             "user_item_matrix": self.user_item_matrix,
+            "interaction_counts": self.interaction_counts,
             "user_similarity": self.user_similarity,
+            "user_similarity_reserve": self.user_similarity_reserve,
+            "user_neighbors": self.user_neighbors,
             "item_similarity": self.item_similarity,
+            "item_similarity_reserve": self.item_similarity_reserve,
             "user_lookup": self.user_lookup,
             "product_lookup": self.product_lookup,
             "user_mean_ratings": self.user_mean_ratings,
             "global_mean": self.global_mean,
             "n_recommendations": self.n_recommendations,
             "min_interactions": self.min_interactions,
+            "neighbor_k": self.neighbor_k,
+            "similarity_top_k": self.similarity_top_k,
+            "similarity_threshold": self.similarity_threshold,
+            "similarity_slack": self.similarity_slack,
+            "popularity_half_life_days": self.popularity_half_life_days,
+            "ann_params": self.ann_params,
+            "precision": self.precision,
+            "popularity_scores": self.popularity_scores,
+            "popularity_ranking": self.popularity_ranking,
+            "popularity_reference_date": self.popularity_reference_date,
+            "product_categories": self.product_categories,
+            "category_rankings": self.category_rankings,
         }
 
         with open(path, "wb") as f:
@@ -263,32 +1527,421 @@ class CollaborativeFilteringModel:
 
         logger.info(f"Model saved to {path}")
 
+    def _save_directory(self, path: str):
+        """Write the model as raw .npy arrays plus a JSON manifest"""
+        arrays, attributes = self._directory_state()
+        save_arrays(path, arrays, attributes)
+
+    def _directory_state(self) -> Tuple[Dict, Dict]:
+        """Arrays and manifest attributes of the directory format"""
+        arrays, attributes = self._interaction_state()
+        shared_neighbors = self.user_neighbors is self.user_similarity
+
+        similarities = {
+            "user_similarity": self.user_similarity,
+            "user_neighbors": None if shared_neighbors else self.user_neighbors,
+            "item_similarity": self.item_similarity,
+        }
+        for name, matrix in similarities.items():
+            if isinstance(matrix, QuantizedCSR):
+                # int8 codes as a regular CSR entry plus the per-row scales
+                arrays[name], arrays[f"{name}_scales"] = matrix.codes, matrix.scales
+            else:
+                arrays[name] = matrix
+        arrays["user_similarity_reserve"] = self.user_similarity_reserve
+        arrays["item_similarity_reserve"] = self.item_similarity_reserve
+        attributes.update(
+            {
+                "model_type": "neighborhood",
+                "neighbor_k": self.neighbor_k,
+                "similarity_top_k": self.similarity_top_k,
+                "similarity_threshold": self.similarity_threshold,
+                "similarity_slack": self.similarity_slack,
+                "ann_params": self.ann_params,
+                "shared_neighbors": shared_neighbors,
+            }
+        )
+        return arrays, attributes
+
+    def _interaction_state(self) -> Tuple[Dict, Dict]:
+        """Ratings, lookups and popularity, saved by every model type"""
+        categories = list(self.category_rankings)
+        category_items = [np.asarray(self.category_rankings[category]) for category in categories]
+
+        arrays = {
+            "user_item_matrix": self.user_item_matrix,
+            "interaction_counts": self.interaction_counts,
+            "user_ids": self.user_lookup.labels,
+            "product_ids": self.product_lookup.labels,
+            "user_mean_ratings": self.user_mean_ratings,
+            "popularity_scores": self.popularity_scores,
+            "popularity_ranking": self.popularity_ranking,
+            "product_categories": self.product_categories,
+            "category_ranking_items": np.concatenate(category_items) if categories else None,
+            "category_ranking_offsets": np.cumsum([0] + [len(items) for items in category_items]),
+        }
+        attributes = {
+            "n_recommendations": self.n_recommendations,
+            "min_interactions": self.min_interactions,
+            "popularity_half_life_days": self.popularity_half_life_days,
+            "precision": self.precision,
+            "global_mean": float(self.global_mean),
+            "popularity_reference_date": self.popularity_reference_date,
+            "categories": [str(category) for category in categories],
+        }
+        return arrays, attributes
+
+    @classmethod
+    def _load_directory(cls, path: str, mmap_mode: str = "r"):
+        """Rebuild a model from a directory written by _save_directory
+
+        The manifest's ``model_type`` picks the class, so any model class can
+        load any saved model.
+        """
+        arrays, attributes = load_arrays(path, mmap_mode)
+        model_class = MODEL_TYPES[attributes.get("model_type", "neighborhood")]
+        return model_class._from_directory(arrays, attributes)
+
+    @classmethod
+    def _from_directory(cls, arrays: Dict, attributes: Dict):
+        model = cls(
+            n_recommendations=attributes["n_recommendations"],
+            min_interactions=attributes["min_interactions"],
+            neighbor_k=attributes["neighbor_k"],
+            similarity_top_k=attributes["similarity_top_k"],
+            similarity_threshold=attributes["similarity_threshold"],
+            popularity_half_life_days=attributes["popularity_half_life_days"],
+            ann_params=attributes.get("ann_params"),
+            precision=attributes.get("precision", "float64"),
+            similarity_slack=attributes.get("similarity_slack", 0),
+        )
+        model._restore_interactions(arrays, attributes)
+
+        def similarity(name):
+            if f"{name}_scales" in arrays:
+                return QuantizedCSR(arrays[name], arrays[f"{name}_scales"])
+            return arrays.get(name)
+
+        model.user_similarity = similarity("user_similarity")
+        model.item_similarity = similarity("item_similarity")
+        model.user_similarity_reserve = arrays.get("user_similarity_reserve")
+        model.item_similarity_reserve = arrays.get("item_similarity_reserve")
+        model.user_neighbors = model.user_similarity if attributes["shared_neighbors"] else similarity("user_neighbors")
+        return model
+
+    def _restore_interactions(self, arrays: Dict, attributes: Dict):
+        """Set the state written by _interaction_state"""
+        self.user_item_matrix = arrays["user_item_matrix"]
+        self.interaction_counts = arrays.get("interaction_counts")
+        self.user_lookup = IndexLookup(arrays["user_ids"])
+        self.product_lookup = IndexLookup(arrays["product_ids"])
+        self.user_mean_ratings = arrays["user_mean_ratings"]
+        self.global_mean = attributes["global_mean"]
+
+        self.popularity_scores = arrays["popularity_scores"]
+        self.popularity_ranking = arrays["popularity_ranking"]
+        self.popularity_reference_date = attributes["popularity_reference_date"]
+        self.product_categories = arrays.get("product_categories")
+        offsets = arrays["category_ranking_offsets"]
+        self.category_rankings = {
+            category: arrays["category_ranking_items"][offsets[i] : offsets[i + 1]]
+            for i, category in enumerate(attributes["categories"])
+        }
+
     @classmethod
-    def load_model(cls, path: str):
-        """Load model from disk"""
+    def load_model(cls, path: str, mmap_mode: str = "r"):
+        """Load model from disk
+
+        Model directories are memory-mapped (``mmap_mode=None`` reads them into
+        memory instead); single-file pickles from earlier versions still load.
+        """
+        if is_model_directory(path):
+            model = cls._load_directory(path, mmap_mode)
+            logger.info(f"Model loaded from {path}")
+            return model
+
         with open(path, "rb") as f:
             model_data = pickle.load(f)
 
-        model = cls(n_recommendations=model_data["n_recommendations"], min_interactions=model_data["min_interactions"])
+        model = cls(
+            n_recommendations=model_data["n_recommendations"],
+            min_interactions=model_data["min_interactions"],
+            neighbor_k=model_data.get("neighbor_k", 50),
+            similarity_top_k=model_data.get("similarity_top_k"),
+            similarity_threshold=model_data.get("similarity_threshold", 0.0),
+            popularity_half_life_days=model_data.get("popularity_half_life_days"),
+            ann_params=model_data.get("ann_params"),
+            precision=model_data.get("precision", "float64"),
+            similarity_slack=model_data.get("similarity_slack", 0),
+        )
 
         model.user_item_matrix = model_data["user_item_matrix"]
+        model.interaction_counts = model_data.get("interaction_counts")
         model.user_similarity = model_data["user_similarity"]
         model.item_similarity = model_data["item_similarity"]
+        model.user_similarity_reserve = model_data.get("user_similarity_reserve")
+        model.item_similarity_reserve = model_data.get("item_similarity_reserve")
         model.user_lookup = model_data["user_lookup"]
         model.product_lookup = model_data["product_lookup"]
         model.user_mean_ratings = model_data["user_mean_ratings"]
         model.global_mean = model_data["global_mean"]
 
+        if isinstance(model.user_item_matrix, pd.DataFrame):
+            # Artifacts saved with the dense pivot table and dict lookups
+            pivot = model.user_item_matrix
+            model.user_item_matrix = csr_matrix(pivot.values)
+            model.user_lookup = IndexLookup(pivot.index)
+            model.product_lookup = IndexLookup(pivot.columns)
+            model.user_mean_ratings = np.array([model_data["user_mean_ratings"][user] for user in pivot.index])
+
+        model.user_neighbors = model_data.get("user_neighbors")
+        if model.user_neighbors is None and model.user_similarity is not None:
+            # Artifacts saved before the neighbor index existed
+            model.build_user_neighbors()
+
+        model.popularity_scores = model_data.get("popularity_scores")
+        model.popularity_ranking = model_data.get("popularity_ranking")
+        model.popularity_reference_date = model_data.get("popularity_reference_date")
+        model.product_categories = model_data.get("product_categories")
+        model.category_rankings = model_data.get("category_rankings", {})
+        if model.popularity_ranking is None:
+            # Artifacts saved before popularity was precomputed
+            model.compute_popularity()
+
         logger.info(f"Model loaded from {path}")
         return model
 
 
+class ALSRecommendationModel(CollaborativeFilteringModel):
+    """
+    Matrix Factorization Recommendation System
+    Explicit-feedback ALS with the same contract as CollaborativeFilteringModel
+
+    Ratings are approximated by ``global_mean + user_factors @ item_factors.T``,
+    so the model stores (users + items) x n_factors floats instead of
+    similarity graphs, and scoring a user is one dense product. Each half
+    sweep solves the regularized least squares of every row with the other
+    side fixed (weighted-lambda regularization), in blocks of about
+    ``solve_block_nnz`` ratings spread over ``n_jobs`` threads.
+    """
+
+    def __init__(
+        self,
+        n_recommendations=10,
+        min_interactions=2,
+        n_factors=32,
+        regularization=0.1,
+        n_iterations=15,
+        n_jobs=None,
+        solve_block_nnz=4096,
+        seed=42,
+        popularity_half_life_days=None,
+        precision="float64",
+    ):
+        super().__init__(
+            n_recommendations=n_recommendations,
+            min_interactions=min_interactions,
+            popularity_half_life_days=popularity_half_life_days,
+            precision=precision,
+        )
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.n_iterations = n_iterations
+        self.n_jobs = n_jobs
+        self.solve_block_nnz = solve_block_nnz
+        self.seed = seed
+        self.user_factors = None
+        self.item_factors = None
+        self.rating_range = None
+        self.train_rmse = None
+
+    def fit(self, df: pd.DataFrame):
+        """Build the interaction matrix and the latent factors"""
+        self.create_interaction_matrix(df)
+        self.compute_factors()
+        return self
+
+    def compute_factors(self):
+        """Alternate user and item least-squares solves for n_iterations sweeps"""
+        logger.info(f"Computing {self.n_factors} latent factors with ALS...")
+        with self.instrumentation.phase("factors") as phase:
+            ratings = csr_matrix(self.user_item_matrix)
+            ratings_t = ratings.T.tocsr()
+            self.rating_range = (float(ratings.data.min()), float(ratings.data.max())) if ratings.nnz else (0.0, 0.0)
+
+            rng = np.random.default_rng(self.seed)
+            self.item_factors = rng.normal(0, 0.1, (ratings.shape[1], self.n_factors))
+            for _ in range(self.n_iterations):
+                self.user_factors = self._solve_factors(ratings, self.item_factors)
+                self.item_factors = self._solve_factors(ratings_t, self.user_factors)
+            phase.matrix("user_factors", self.user_factors)
+            phase.matrix("item_factors", self.item_factors)
+
+        rows = np.repeat(np.arange(ratings.shape[0]), np.diff(ratings.indptr))
+        fitted = self.global_mean + np.einsum("ij,ij->i", self.user_factors[rows], self.item_factors[ratings.indices])
+        self.train_rmse = float(np.sqrt(np.mean((fitted - ratings.data) ** 2))) if ratings.nnz else 0.0
+        logger.info(f"ALS: {self.n_iterations} sweeps, train RMSE {self.train_rmse:.4f}, peak RSS {_peak_rss_mb():.1f} MB")
+        self._apply_precision()
+        return self
+
+    def _apply_precision(self):
+        """Ratings at ``precision``; factors are float32 in both compact modes (int8 factors lose too much)"""
+        super()._apply_precision()
+        if self.precision != "float64" and self.user_factors is not None:
+            self.user_factors = self.user_factors.astype(np.float32, copy=False)
+            self.item_factors = self.item_factors.astype(np.float32, copy=False)
+
+    def _solve_factors(self, ratings: csr_matrix, fixed: np.ndarray) -> np.ndarray:
+        """Least-squares factors of every row of ``ratings`` given the factors of its columns
+
+        Rows without ratings get zero factors. Blocks are independent, and the
+        batched numpy kernels release the GIL, so threads run them on separate cores.
+        """
+        factors = np.zeros((ratings.shape[0], self.n_factors))
+
+        def solve(bounds):
+            start, stop = bounds
+            factors[start:stop] = _solve_rows(ratings[start:stop], fixed, self.global_mean, self.regularization)
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs or os.cpu_count()) as executor:
+            list(executor.map(solve, _nnz_blocks(ratings.indptr, self.solve_block_nnz)))
+        return factors
+
+    @instrumented_phase("partial_fit")
+    def partial_fit(self, new_df: pd.DataFrame):
+        """Fold new interactions in by re-solving the factors of the users and products they touch
+
+        The interaction matrix, means and popularity are updated as in the
+        neighborhood model; then the users and products of the rows actually
+        merged are solved, users against the current item factors and products
+        against the updated user factors, one half sweep each. Rows dropped by
+        the ``min_interactions`` filter touch no factor.
+        """
+        touched = self._merge_interactions(new_df)
+        if touched is None:
+            return self
+        users, products = touched
+
+        n_users, n_items = self.user_item_matrix.shape
+        user_factors = np.zeros((n_users, self.n_factors))
+        user_factors[: len(self.user_factors)] = self.user_factors
+        item_factors = np.zeros((n_items, self.n_factors))
+        item_factors[: len(self.item_factors)] = self.item_factors
+
+        ratings = csr_matrix(self.user_item_matrix)
+        with self.instrumentation.phase("partial_fit_factors"):
+            user_factors[users] = self._solve_factors(ratings[users], item_factors)
+            item_factors[products] = self._solve_factors(ratings.T.tocsr()[products], user_factors)
+        self.user_factors, self.item_factors = user_factors, item_factors
+        if ratings.nnz:
+            self.rating_range = (min(self.rating_range[0], ratings.data.min()), max(self.rating_range[1], ratings.data.max()))
+        self._apply_precision()
+        return self
+
+    @timed("predict_hybrid")
+    def predict_hybrid(self, user_idx: int, alpha: float = 0.5) -> np.ndarray:
+        """Predicted ratings of one user for every product (``alpha`` only applies to the neighborhood model)"""
+        return self._score_block(np.array([user_idx]), alpha, {})[0]
+
+    def _batch_operands(self) -> Dict:
+        return {}
+
+    def _score_block(self, user_indices: np.ndarray, alpha: float, operands: Dict, top_k: int = None) -> np.ndarray:
+        """Dense predicted ratings for a block of known users, clipped to the training rating range"""
+        scores = self.global_mean + self.user_factors[user_indices] @ self.item_factors.T
+        return np.clip(scores, *self.rating_range)
+
+    def _score_components(self, user_indices: np.ndarray, operands: Dict, top_k: int = None) -> Tuple:
+        return (self._score_block(user_indices, 0.5, operands, top_k),)
+
+    def _blend(self, components: Tuple, alpha: float) -> np.ndarray:
+        """Factor scores do not depend on ``alpha``"""
+        return components[0]
+
+    def similar_products(self, product_id, n: int = 10) -> List[Tuple[str, float]]:
+        """Products whose latent factors have the highest cosine similarity to ``product_id``'s"""
+        if product_id not in self.product_lookup:
+            return []
+        product_idx = self.product_lookup[product_id]
+
+        factors = normalize(self.item_factors)
+        similarity = factors @ factors[product_idx]
+        similarity[product_idx] = 0
+        top_indices, top_scores = _top_n_per_row(similarity[np.newaxis, :], n)
+
+        product_ids = self.product_lookup.labels
+        return [(product_ids[idx], score) for idx, score in zip(top_indices[0], top_scores[0]) if idx >= 0]
+
+    def _session_neighbors(self, product_indices: np.ndarray) -> csr_matrix:
+        """Positive cosine similarities of the item factors of ``product_indices``, self excluded"""
+        factors = normalize(self.item_factors)
+        similarity = factors[product_indices] @ factors.T
+        similarity[np.arange(len(product_indices)), product_indices] = 0
+        return _positive_part(csr_matrix(similarity))
+
+    def save_model(self, path: str):
+        """Save model to disk as a directory of memory-mappable arrays (see model_store)"""
+        if path.endswith(".pkl"):
+            raise ValueError("ALS models are only saved in the directory format")
+        self._save_directory(path)
+        logger.info(f"Model saved to {path}")
+
+    def _directory_state(self) -> Tuple[Dict, Dict]:
+        arrays, attributes = self._interaction_state()
+        arrays.update({"user_factors": self.user_factors, "item_factors": self.item_factors})
+        attributes.update(
+            {
+                "model_type": "als",
+                "n_factors": self.n_factors,
+                "regularization": self.regularization,
+                "n_iterations": self.n_iterations,
+                "seed": self.seed,
+                "rating_range": [float(value) for value in self.rating_range],
+            }
+        )
+        return arrays, attributes
+
+    @classmethod
+    def _from_directory(cls, arrays: Dict, attributes: Dict):
+        model = cls(
+            n_recommendations=attributes["n_recommendations"],
+            min_interactions=attributes["min_interactions"],
+            n_factors=attributes["n_factors"],
+            regularization=attributes["regularization"],
+            n_iterations=attributes["n_iterations"],
+            seed=attributes["seed"],
+            popularity_half_life_days=attributes["popularity_half_life_days"],
+            precision=attributes.get("precision", "float64"),
+        )
+        model._restore_interactions(arrays, attributes)
+        model.user_factors = arrays["user_factors"]
+        model.item_factors = arrays["item_factors"]
+        model.rating_range = tuple(attributes["rating_range"])
+        return model
+
+
+MODEL_TYPES = {"neighborhood": CollaborativeFilteringModel, "als": ALSRecommendationModel}
+
+
 def train_with_mlflow(data_path: str, experiment_name: str = "recommendation_model", 
-                      tracking_uri: str = None, alpha: float = 0.5):
-    """Train model with MLflow tracking"""
+                      tracking_uri: str = None, alpha: float = 0.5,
+                      similarity_top_k: int = None, similarity_threshold: float = 0.0,
+                      topn_path: str = "models/topn_table", popularity_half_life_days: float = None,
+                      ann_params: dict = None, model_type: str = "neighborhood", als_params: dict = None,
+                      precision: str = "float64"):
+    """Train model with MLflow tracking and write the precomputed top-N table to ``topn_path``
+
+    ``model_type`` is a key of MODEL_TYPES; ``als_params`` are passed to
+    ALSRecommendationModel when it is "als". ``precision`` sets how ratings
+    and similarities are stored (float64, float32 or int8).
+    """
     
     import os
-    
+
+    # Imported here so serving (the API image) does not need MLflow
+    import mlflow
+    import mlflow.sklearn
+
     # Set MLflow tracking URI
     if tracking_uri:
         mlflow.set_tracking_uri(tracking_uri)
@@ -313,6 +1966,13 @@ def train_with_mlflow(data_path: str, experiment_name: str = "recommendation_mod
     params = {
         "n_recommendations": 10,
         "min_interactions": 2,
+        "similarity_top_k": similarity_top_k,
+        "similarity_threshold": similarity_threshold,
+        "popularity_half_life_days": popularity_half_life_days,
+        "ann_params": json.dumps(ann_params),
+        "model_type": model_type,
+        "als_params": json.dumps(als_params),
+        "precision": precision,
         "train_size": len(train_df),
         "test_size": len(test_df),
         "n_users": df["user_id"].nunique(),
@@ -324,29 +1984,57 @@ def train_with_mlflow(data_path: str, experiment_name: str = "recommendation_mod
         mlflow.log_params(params)
 
         # Train model
-        logger.info("Training model...")
-        model = CollaborativeFilteringModel(
-            n_recommendations=params["n_recommendations"], min_interactions=params["min_interactions"]
-        )
+        logger.info(f"Training {model_type} model...")
+        if model_type == "als":
+            model = ALSRecommendationModel(
+                n_recommendations=params["n_recommendations"],
+                min_interactions=params["min_interactions"],
+                popularity_half_life_days=popularity_half_life_days,
+                precision=precision,
+                **(als_params or {}),
+            )
+        else:
+            model = CollaborativeFilteringModel(
+                n_recommendations=params["n_recommendations"],
+                min_interactions=params["min_interactions"],
+                similarity_top_k=similarity_top_k,
+                similarity_threshold=similarity_threshold,
+                popularity_half_life_days=popularity_half_life_days,
+                ann_params=ann_params,
+                precision=precision,
+            )
+
+        # Per-phase duration, peak memory delta and matrix sizes, logged with the metrics
+        model.instrumentation.enable()
 
-        model.create_interaction_matrix(train_df)
-        model.compute_user_similarity()
-        model.compute_item_similarity()
+        start = time.perf_counter()
+        model.fit(train_df)
+        mlflow.log_metric("train_seconds", time.perf_counter() - start)
+        mlflow.log_metric("peak_rss_mb", _peak_rss_mb())
+        mlflow.log_metric("model_size_mb", model.model_size_mb())
         
         # Store alpha for hybrid prediction
         model.alpha = alpha
 
         # Evaluate
-        metrics = model.evaluate(test_df)
+        metrics = model.evaluate(test_df, alpha=alpha)
+        metrics.update(model.evaluate_ranking(test_df, k=params["n_recommendations"], alpha=alpha))
         mlflow.log_metrics(metrics)
         mlflow.log_param("alpha", alpha)
+        model.instrumentation.log_to_mlflow()
+        model.instrumentation.disable()
 
-        # Save model
-        model_path = "models/recommendation_model.pkl"
+        # Save model as a memory-mappable directory
+        model_path = "models/recommendation_model"
         model.save_model(model_path)
 
         # Log model to MLflow
-        mlflow.log_artifact(model_path)
+        mlflow.log_artifacts(model_path, artifact_path="recommendation_model")
+
+        # Precompute every known user's top-N for serving
+        topn_manifest = write_topn_table(model, topn_path, n=params["n_recommendations"], alpha=alpha)
+        mlflow.log_metric("topn_table_entries", topn_manifest["n_entries"])
+        mlflow.log_artifacts(topn_path, artifact_path="topn_table")
 
         # Register model
         mlflow.sklearn.log_model(sk_model=model, artifact_path="model", registered_model_name="recommendation_model")
@@ -357,9 +2045,59 @@ def train_with_mlflow(data_path: str, experiment_name: str = "recommendation_mod
         return model, metrics
 
 
+def update_model(new_data_path: str, model_path: str = "models/recommendation_model",
+                 topn_path: str = "models/topn_table", alpha: float = 0.5):
+    """Fold a file of new interactions into a saved model and refresh its top-N table
+
+    The model is read memory-mapped from ``model_path`` and written back as a
+    new version directory that the ``model_path`` link is switched to (see
+    model_store), so servers mapping the current version keep reading intact
+    files. The table is published the same way, before the model; the
+    retraining pipeline's ``.version`` file then tells the servers to load both.
+    """
+    logger.info(f"Loading new interactions from {new_data_path}")
+    new_df = pd.read_csv(new_data_path)
+
+    model = CollaborativeFilteringModel.load_model(model_path)
+    model.partial_fit(new_df)
+    # Table first: servers without a .version file reload when the model changes
+    write_topn_table(model, topn_path, alpha=alpha)
+    model.save_model(model_path)
+
+    logger.info("Incremental model update complete!")
+    return model
+
+
 if __name__ == "__main__":
-    # Train model
-    model, metrics = train_with_mlflow("data/cleaned_data.csv")
+    import os
+
+    # Optional kNN similarity mode for large catalogs
+    similarity_top_k = os.getenv("SIMILARITY_TOP_K")
+    popularity_half_life_days = os.getenv("POPULARITY_HALF_LIFE_DAYS")
+    # Approximate kNN similarity: number of LSH tables (and optionally bits per table)
+    ann_tables = os.getenv("ANN_TABLES")
+    ann_bits = os.getenv("ANN_BITS")
+    # Model family: "neighborhood" (default) or "als" with ALS_FACTORS latent factors
+    model_type = os.getenv("MODEL_TYPE", "neighborhood")
+    als_factors = os.getenv("ALS_FACTORS")
+    # Storage precision of ratings and similarities: float64 (default), float32 or int8
+    precision = os.getenv("MODEL_PRECISION", "float64")
+
+    if os.getenv("NEW_DATA_PATH"):
+        # Incremental update: only the new interactions are processed
+        model = update_model(os.getenv("NEW_DATA_PATH"))
+    else:
+        # Train model
+        model, metrics = train_with_mlflow(
+            "data/cleaned_data.csv",
+            similarity_top_k=int(similarity_top_k) if similarity_top_k else None,
+            similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.0")),
+            popularity_half_life_days=float(popularity_half_life_days) if popularity_half_life_days else None,
+            ann_params={"n_tables": int(ann_tables), "n_bits": int(ann_bits) if ann_bits else None} if ann_tables else None,
+            model_type=model_type,
+            als_params={"n_factors": int(als_factors)} if als_factors else None,
+            precision=precision,
+        )
 
     # Test recommendations
     sample_user = list(model.user_lookup.keys())[0]
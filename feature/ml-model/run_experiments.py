@@ -5,8 +5,11 @@ Branch: feature/ml-model
 
 import os
 import sys
+import time
 import argparse
-from recommendation_model import train_with_mlflow, CollaborativeFilteringModel
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from recommendation_model import train_with_mlflow, CollaborativeFilteringModel, ALSRecommendationModel, _peak_rss_mb
 import pandas as pd
 from sklearn.model_selection import train_test_split
 import mlflow
@@ -17,8 +20,112 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def run_hyperparameter_experiments(data_path: str, experiment_name: str = "hyperparameter_tuning"):
-    """Run multiple experiments with different hyperparameters"""
+def build_model(params: dict):
+    """Untrained model for one hyperparameter set"""
+    if params["model_type"] == "als":
+        return ALSRecommendationModel(
+            n_recommendations=params["n_recommendations"],
+            min_interactions=params["min_interactions"],
+            n_factors=params["n_factors"],
+            regularization=params["regularization"],
+            precision=params.get("precision", "float64"),
+        )
+    return CollaborativeFilteringModel(
+        n_recommendations=params["n_recommendations"],
+        min_interactions=params["min_interactions"],
+        precision=params.get("precision", "float64"),
+    )
+
+
+def recommend_latency_ms(model, user_ids, n: int) -> float:
+    """Mean wall time of recommend_products per user in milliseconds"""
+    start = time.perf_counter()
+    for user_id in user_ids:
+        model.recommend_products(user_id, n=n)
+    return (time.perf_counter() - start) / max(len(user_ids), 1) * 1000
+
+
+# Hyperparameters that only change how a trained model is scored, not the model itself
+SCORING_PARAMS = ("n_recommendations", "alpha")
+
+
+def group_configs(hyperparameters):
+    """Split the grid into groups of configs that train the same model, in grid order"""
+    groups = {}
+    for params in hyperparameters:
+        key = tuple(sorted((name, value) for name, value in params.items() if name not in SCORING_PARAMS))
+        groups.setdefault(key, []).append(params)
+    return list(groups.values())
+
+
+def run_group(group_index: int, configs, train_df, test_df, run_params: dict, tracking_uri: str, experiment_name: str):
+    """Train one model for a group of configs, evaluate every config from shared scores and log them
+
+    The similarities (or factors) are computed once, and evaluate_sweep scores
+    each test user once for all of the group's alphas and cutoffs. Each config
+    is logged to its own MLflow run from here, so only ``(params, metrics, run_id)``
+    tuples go back to the caller and the model is released when the group is done.
+    """
+    # Worker processes do not inherit the parent's MLflow settings
+    mlflow.set_tracking_uri(tracking_uri)
+    mlflow.set_experiment(experiment_name)
+    logger.info(f"\n=== Training group {group_index + 1}: {len(configs)} configs ===")
+
+    model = build_model(configs[0])
+    model.instrumentation.enable()
+    start = time.perf_counter()
+    model.fit(train_df)
+    train_seconds = time.perf_counter() - start
+
+    alphas = sorted({params["alpha"] for params in configs})
+    ks = sorted({params["n_recommendations"] for params in configs})
+    sweep = model.evaluate_sweep(test_df, alphas, ks)
+
+    test_users = test_df["user_id"].drop_duplicates().head(200)
+    latency = {k: recommend_latency_ms(model, test_users, k) for k in ks}
+    # Phase timings, matrix sizes and call latencies are shared by the group
+    phase_metrics = model.instrumentation.mlflow_metrics()
+    model.instrumentation.disable()
+    results = []
+    for params in configs:
+        logger.info(f"Parameters: {params}")
+        metrics = dict(sweep[params["alpha"]][params["n_recommendations"]])
+        metrics.update({
+            "train_seconds": train_seconds,
+            "recommend_ms_per_user": latency[params["n_recommendations"]],
+            "model_size_mb": model.model_size_mb(),
+            "peak_rss_mb": _peak_rss_mb(),
+            **phase_metrics,
+        })
+
+        with mlflow.start_run() as run:
+            mlflow.log_params({**params, "training_group": group_index, **run_params})
+            mlflow.log_metrics(metrics)
+
+            # Log model with this config's serving parameters
+            model.n_recommendations = params["n_recommendations"]
+            model.alpha = params["alpha"]
+            mlflow.sklearn.log_model(
+                sk_model=model,
+                artifact_path="model",
+                registered_model_name="recommendation_model"
+            )
+
+        logger.info(f"Metrics: {metrics}")
+        results.append((params, metrics, run.info.run_id))
+    return results
+
+
+def run_hyperparameter_experiments(data_path: str, experiment_name: str = "hyperparameter_tuning", n_jobs: int = 1,
+                                   model_types=("neighborhood", "als")):
+    """Run multiple experiments with different hyperparameters
+
+    Configs that only differ in ``n_recommendations`` and ``alpha`` share one
+    trained model and one scoring pass (see run_group); independent groups
+    run in ``n_jobs`` processes, which log their own runs. Every config still gets its own MLflow run
+    with RMSE and ranking metrics next to training time, per-user
+    recommendation latency and model memory, so model types compare head-to-head.
+    """
     
     # Set up MLflow
     mlflow.set_experiment(experiment_name)
@@ -32,62 +139,51 @@ def run_hyperparameter_experiments(data_path: str, experiment_name: str = "hyper
     
     # Define hyperparameter grid
     hyperparameters = [
-        {"n_recommendations": 5, "min_interactions": 1, "alpha": 0.3},
-        {"n_recommendations": 10, "min_interactions": 2, "alpha": 0.5},
-        {"n_recommendations": 15, "min_interactions": 2, "alpha": 0.7},
-        {"n_recommendations": 10, "min_interactions": 3, "alpha": 0.5},
-        {"n_recommendations": 20, "min_interactions": 1, "alpha": 0.5},
+        {"model_type": "neighborhood", "n_recommendations": 5, "min_interactions": 1, "alpha": 0.3},
+        {"model_type": "neighborhood", "n_recommendations": 10, "min_interactions": 2, "alpha": 0.5},
+        {"model_type": "neighborhood", "n_recommendations": 15, "min_interactions": 2, "alpha": 0.7},
+        {"model_type": "neighborhood", "n_recommendations": 10, "min_interactions": 3, "alpha": 0.5},
+        {"model_type": "neighborhood", "n_recommendations": 20, "min_interactions": 1, "alpha": 0.5},
+        # Compact storage of the 10 / 2 / 0.5 run: compare model_size_mb, rmse and ndcg_at_10 against it
+        {"model_type": "neighborhood", "n_recommendations": 10, "min_interactions": 2, "alpha": 0.5, "precision": "float32"},
+        {"model_type": "neighborhood", "n_recommendations": 10, "min_interactions": 2, "alpha": 0.5, "precision": "int8"},
+        {"model_type": "als", "n_recommendations": 10, "min_interactions": 2, "alpha": 0.5,
+         "n_factors": 32, "regularization": 0.1},
+        {"model_type": "als", "n_recommendations": 10, "min_interactions": 2, "alpha": 0.5,
+         "n_factors": 64, "regularization": 0.05},
     ]
+    hyperparameters = [params for params in hyperparameters if params["model_type"] in model_types]
     
+    groups = group_configs(hyperparameters)
+    logger.info(f"{len(hyperparameters)} configs in {len(groups)} training groups")
+    run_params = {
+        "train_size": len(train_df),
+        "test_size": len(test_df),
+        "n_users": df["user_id"].nunique(),
+        "n_products": df["product_id"].nunique(),
+    }
+    # Groups are trained, logged and released one at a time (one per process with n_jobs > 1),
+    # so at most n_jobs models are alive at once and none is sent back to this process
+    group_args = (range(len(groups)), groups, repeat(train_df), repeat(test_df), repeat(run_params),
+                  repeat(mlflow.get_tracking_uri()), repeat(experiment_name))
+    if n_jobs > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            outcomes = list(executor.map(run_group, *group_args))
+    else:
+        outcomes = map(run_group, *group_args)
+
     best_metrics = None
     best_run_id = None
     best_params = None
-    
-    for i, params in enumerate(hyperparameters):
-        logger.info(f"\n=== Experiment {i+1}/{len(hyperparameters)} ===")
-        logger.info(f"Parameters: {params}")
-        
-        with mlflow.start_run():
-            # Log hyperparameters
-            mlflow.log_params({
-                "n_recommendations": params["n_recommendations"],
-                "min_interactions": params["min_interactions"],
-                "alpha": params["alpha"],
-                "train_size": len(train_df),
-                "test_size": len(test_df),
-                "n_users": df["user_id"].nunique(),
-                "n_products": df["product_id"].nunique(),
-            })
-            
-            # Train model
-            model = CollaborativeFilteringModel(
-                n_recommendations=params["n_recommendations"],
-                min_interactions=params["min_interactions"]
-            )
-            
-            model.create_interaction_matrix(train_df)
-            model.compute_user_similarity()
-            model.compute_item_similarity()
-            
-            # Evaluate
-            metrics = model.evaluate(test_df)
-            mlflow.log_metrics(metrics)
-            
-            # Log model
-            mlflow.sklearn.log_model(
-                sk_model=model,
-                artifact_path="model",
-                registered_model_name="recommendation_model"
-            )
-            
+
+    for results in outcomes:
+        for params, metrics, run_id in results:
             # Track best model
             if best_metrics is None or metrics.get("rmse", float('inf')) < best_metrics.get("rmse", float('inf')):
                 best_metrics = metrics
-                best_run_id = mlflow.active_run().info.run_id
+                best_run_id = run_id
                 best_params = params
-            
-            logger.info(f"Metrics: {metrics}")
-    
+
     logger.info(f"\n=== Best Model ===")
     logger.info(f"Run ID: {best_run_id}")
     logger.info(f"Parameters: {best_params}")
@@ -134,6 +230,10 @@ if __name__ == "__main__":
                         help="MLflow experiment name")
     parser.add_argument("--register-best", action="store_true",
                         help="Register best model to Model Registry")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Processes running independent training groups")
+    parser.add_argument("--model-types", nargs="+", default=["neighborhood", "als"],
+                        choices=["neighborhood", "als"], help="Model families to include in the sweep")
     
     args = parser.parse_args()
     
@@ -145,7 +245,9 @@ if __name__ == "__main__":
     # Run experiments
     best_run_id, best_params, best_metrics = run_hyperparameter_experiments(
         args.data_path,
-        args.experiment_name
+        args.experiment_name,
+        n_jobs=args.jobs,
+        model_types=args.model_types
     )
     
     # Register best model if requested
@@ -0,0 +1,113 @@
+"""
+Unit tests for the LSH approximate nearest-neighbor index
+Branch: feature/ml-model
+"""
+
+import pytest
+import numpy as np
+from scipy.sparse import random as sparse_random
+from sklearn.metrics.pairwise import cosine_similarity
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ann_index import CosineLSHIndex
+
+
+@pytest.fixture
+def vectors():
+    """Sparse non-negative vectors, like item columns of a rating matrix"""
+    return sparse_random(200, 80, density=0.1, format="csr", random_state=3)
+
+
+def top_k_sets(similarity, k):
+    """Top-k positive neighbor sets of every row of a dense similarity matrix, self excluded"""
+    similarity = similarity.copy()
+    np.fill_diagonal(similarity, 0)
+    top = np.argsort(-similarity, axis=1, kind="stable")[:, :k]
+    return [set(row[similarity[i, row] > 0]) for i, row in enumerate(top)]
+
+
+class TestCosineLSHIndex:
+    """Test hashing, candidate graphs and queries"""
+
+    def test_candidate_graph_holds_exact_similarities(self, vectors):
+        """Test every stored pair carries its exact cosine and respects the threshold"""
+        index = CosineLSHIndex(n_tables=4, n_bits=4, seed=0).fit(vectors)
+        graph = index.candidate_graph(threshold=0.05).toarray()
+        exact = cosine_similarity(vectors)
+
+        assert np.count_nonzero(graph) > 0
+        assert np.all(np.diag(graph) == 0)
+        assert np.all(graph[graph != 0] > 0.05)
+        np.testing.assert_allclose(graph[graph != 0], exact[graph != 0])
+
+    def test_more_tables_raise_recall(self, vectors):
+        """Test recall@k against exact cosine grows with the number of tables"""
+        truth = top_k_sets(cosine_similarity(vectors), 10)
+
+        def recall(n_tables):
+            graph = CosineLSHIndex(n_tables=n_tables, n_bits=4, seed=0).fit(vectors).candidate_graph()
+            found = top_k_sets(graph.toarray(), 10)
+            return sum(len(t & f) for t, f in zip(truth, found)) / sum(len(t) for t in truth)
+
+        assert recall(1) < recall(16)
+        assert recall(16) > 0.9
+
+    def test_query_rows_excludes_self(self, vectors):
+        """Test row queries never return the row itself and rank by exact cosine"""
+        index = CosineLSHIndex(n_tables=8, n_bits=3, seed=0).fit(vectors)
+        indices, scores = index.query_rows([0, 7], k=5)
+        exact = cosine_similarity(vectors)
+
+        for row, (found, found_scores) in enumerate(zip(indices, scores)):
+            query = [0, 7][row]
+            assert query not in found
+            kept = found >= 0
+            np.testing.assert_allclose(found_scores[kept], exact[query, found[kept]])
+            assert np.all(np.diff(found_scores[kept]) <= 0)
+
+    def test_query_new_vectors(self, vectors):
+        """Test an unindexed query finds an indexed copy of itself first"""
+        index = CosineLSHIndex(n_tables=4, seed=0).fit(vectors.toarray())
+        indices, scores = index.query(vectors[[12]].toarray(), k=3)
+
+        assert indices[0, 0] == 12
+        assert scores[0, 0] == pytest.approx(1.0)
+
+    def test_calibrated_bits_reach_target_recall(self, vectors):
+        """Test the default bit count is the longest code whose graph reaches the target recall@k"""
+        truth = top_k_sets(cosine_similarity(vectors), 10)
+
+        def recall(index):
+            found = top_k_sets(index.candidate_graph().toarray(), 10)
+            return sum(len(t & f) for t, f in zip(truth, found)) / sum(len(t) for t in truth)
+
+        index = CosineLSHIndex(n_tables=4, target_recall=0.9, recall_k=10, calibration_sample=200).fit(vectors)
+        assert index.codes.shape == (200, 4)
+        assert index.calibrated_recall >= 0.9
+        assert recall(index) >= 0.9
+        assert recall(CosineLSHIndex(n_tables=4, n_bits=index.n_bits + 1).fit(vectors)) < 0.9
+
+    def test_probes_raise_recall(self, vectors):
+        """Test visiting the buckets of the least certain bits finds more neighbors at the same bit count"""
+        truth = top_k_sets(cosine_similarity(vectors), 10)
+
+        def recall(n_probes):
+            graph = CosineLSHIndex(n_tables=2, n_bits=6, n_probes=n_probes, seed=0).fit(vectors).candidate_graph()
+            found = top_k_sets(graph.toarray(), 10)
+            return sum(len(t & f) for t, f in zip(truth, found)) / sum(len(t) for t in truth)
+
+        assert recall(0) < recall(3) < recall(6)
+
+    def test_batch_query_matches_single_queries(self, vectors):
+        """Test one query over many rows answers each row as it would alone"""
+        index = CosineLSHIndex(n_tables=4, n_bits=3, n_probes=1, seed=0).fit(vectors)
+        indices, scores = index.query_rows(np.arange(30), k=5)
+
+        for row in range(30):
+            single_indices, single_scores = index.query_rows([row], k=5)
+            np.testing.assert_array_equal(indices[row], single_indices[0])
+            np.testing.assert_allclose(scores[row], single_scores[0])
@@ -0,0 +1,148 @@
+"""
+Unit tests for phase and latency instrumentation
+Branch: feature/ml-model
+"""
+
+import pytest
+import numpy as np
+import pickle
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scipy.sparse import random as sparse_random
+
+from instrumentation import Instrumentation, LatencyHistogram, instrumented_phase, timed
+
+
+class Timed:
+    """Minimal owner of an instrumentation, like the models"""
+
+    def __init__(self, enabled):
+        self.instrumentation = Instrumentation(enabled=enabled)
+
+    @timed("square")
+    def square(self, x):
+        return x * x
+
+    @instrumented_phase("fail")
+    def fail(self):
+        raise RuntimeError("boom")
+
+
+class TestLatencyHistogram:
+    def test_buckets_are_cumulative(self):
+        """Test observations land in the first bucket whose bound is at least their value"""
+        histogram = LatencyHistogram(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(seconds)
+
+        assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+        assert histogram.count == 4
+        assert histogram.total == pytest.approx(2.65)
+
+    def test_quantile_interpolates_inside_bucket(self):
+        """Test quantiles are interpolated linearly within their bucket, like histogram_quantile"""
+        histogram = LatencyHistogram(buckets=(1.0, 2.0))
+        for seconds in (0.5, 0.5, 1.5, 1.5):
+            histogram.observe(seconds)
+
+        assert histogram.quantile(0.5) == pytest.approx(1.0)
+        assert histogram.quantile(0.75) == pytest.approx(1.5)
+        assert LatencyHistogram().quantile(0.5) == 0.0
+
+
+class TestInstrumentation:
+    def test_disabled_records_nothing(self):
+        """Test a disabled instance hands out the shared no-op phase and skips timing"""
+        owner = Timed(enabled=False)
+        with owner.instrumentation.phase("build") as phase:
+            phase.matrix("matrix", np.ones((2, 3)))
+        assert owner.square(3) == 9
+
+        assert owner.instrumentation.phase("build") is owner.instrumentation.phase("other")
+        assert owner.instrumentation.phases == {}
+        assert owner.instrumentation.latencies == {}
+        assert owner.instrumentation.mlflow_metrics() == {}
+        assert owner.instrumentation.prometheus_text() == ""
+
+    def test_phase_records_duration_and_matrices(self):
+        """Test a phase records its duration, peak memory delta and matrix sizes, and counts reruns"""
+        instrumentation = Instrumentation(enabled=True)
+        sparse = sparse_random(20, 30, density=0.1, format="csr", random_state=0)
+        for _ in range(2):
+            with instrumentation.phase("build") as phase:
+                phase.matrix("sparse", sparse)
+                phase.matrix("dense", np.ones((4, 5)))
+                phase.matrix("missing", None)
+
+        record = instrumentation.phases["build"]
+        assert record.seconds > 0
+        assert record.peak_memory_delta_bytes >= 0
+        assert record.matrices == {
+            "sparse": {"rows": 20, "cols": 30, "nnz": sparse.nnz},
+            "dense": {"rows": 4, "cols": 5, "nnz": 20},
+        }
+        assert instrumentation.phase_calls == {"build": 2}
+
+        metrics = instrumentation.mlflow_metrics()
+        assert metrics["phase_build_seconds"] == record.seconds
+        assert metrics["sparse_nnz"] == sparse.nnz
+        assert "phase_build_peak_memory_delta_mb" in metrics
+
+    def test_failed_phase_is_recorded(self):
+        """Test a phase that raises is still recorded and the error propagates"""
+        owner = Timed(enabled=True)
+        with pytest.raises(RuntimeError):
+            owner.fail()
+        assert "fail" in owner.instrumentation.phases
+
+    def test_timed_methods_fill_histogram(self):
+        """Test every call of a timed method is observed once"""
+        owner = Timed(enabled=True)
+        for x in range(5):
+            owner.square(x)
+
+        histogram = owner.instrumentation.latencies["square"]
+        assert histogram.count == 5
+        metrics = owner.instrumentation.mlflow_metrics()
+        assert metrics["latency_square_count"] == 5
+        assert metrics["latency_square_p50_ms"] <= metrics["latency_square_p99_ms"]
+
+    def test_prometheus_text(self):
+        """Test the text exposition lists phase gauges, matrix sizes and a cumulative histogram"""
+        instrumentation = Instrumentation(enabled=True, latency_buckets=(0.1, 1.0))
+        with instrumentation.phase("pivot") as phase:
+            phase.matrix("user_item_matrix", np.ones((3, 4)))
+        for seconds in (0.05, 0.5):
+            instrumentation.observe("recommend_products", seconds)
+
+        text = instrumentation.prometheus_text(prefix="test")
+        lines = text.splitlines()
+        assert "# TYPE test_phase_duration_seconds gauge" in lines
+        assert 'test_phase_runs_total{phase="pivot"} 1' in lines
+        assert 'test_matrix_nnz{phase="pivot",matrix="user_item_matrix"} 12' in lines
+        assert "# TYPE test_call_latency_seconds histogram" in lines
+        assert 'test_call_latency_seconds_bucket{method="recommend_products",le="0.1"} 1' in lines
+        assert 'test_call_latency_seconds_bucket{method="recommend_products",le="+Inf"} 2' in lines
+        assert 'test_call_latency_seconds_count{method="recommend_products"} 2' in lines
+
+    def test_pickle_round_trip(self):
+        """Test records survive pickling (worker processes, MLflow) and the copy keeps working"""
+        instrumentation = Instrumentation(enabled=True)
+        instrumentation.observe("predict_hybrid", 0.01)
+        copy = pickle.loads(pickle.dumps(instrumentation))
+
+        copy.observe("predict_hybrid", 0.02)
+        assert copy.latencies["predict_hybrid"].count == 2
+        assert instrumentation.latencies["predict_hybrid"].count == 1
+
+    def test_reset(self):
+        instrumentation = Instrumentation(enabled=True)
+        with instrumentation.phase("build"):
+            pass
+        instrumentation.observe("call", 0.01)
+        instrumentation.reset()
+        assert instrumentation.mlflow_metrics() == {}
@@ -7,13 +7,26 @@ import pytest
 import pandas as pd
 import numpy as np
 import tempfile
+import pickle
 import sys
 import os
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from recommendation_model import CollaborativeFilteringModel
+from scipy.sparse import csr_matrix
+from sklearn.metrics.pairwise import cosine_similarity
+
+from recommendation_model import (
+    ALSRecommendationModel,
+    CollaborativeFilteringModel,
+    _split_top_k,
+    _top_k_per_row,
+    _top_n_per_row,
+    update_model,
+)
+from model_store import is_model_directory
+from topn_table import TopNTable, write_topn_table
 
 
 @pytest.fixture
@@ -27,6 +40,62 @@ def sample_interaction_data():
     return pd.DataFrame(data)
 
 
+@pytest.fixture
+def random_interaction_data():
+    """Create a larger random interaction dataset"""
+    rng = np.random.default_rng(7)
+    n = 600
+    df = pd.DataFrame(
+        {
+            "user_id": rng.integers(0, 40, n),
+            "product_id": [f"P{i}" for i in rng.integers(0, 80, n)],
+            "rating": rng.integers(1, 6, n).astype(float),
+        }
+    )
+    return df.drop_duplicates(subset=["user_id", "product_id"])
+
+
+def reference_predict_item_based(model, user_idx, top_k=50):
+    """Original per-item loop, kept as the reference for the vectorized engine"""
+    user_ratings = model.user_item_matrix[user_idx].toarray().ravel()
+    item_similarity = model.item_similarity
+    if hasattr(item_similarity, "toarray"):
+        item_similarity = item_similarity.toarray()
+    predictions = np.zeros(len(user_ratings))
+    rated_items = np.where(user_ratings > 0)[0]
+
+    for item_idx in range(len(user_ratings)):
+        if user_ratings[item_idx] == 0:
+            item_sim = item_similarity[item_idx]
+            similar_rated = [(i, item_sim[i]) for i in rated_items if item_sim[i] > 0]
+            similar_rated.sort(key=lambda x: x[1], reverse=True)
+            similar_rated = similar_rated[:top_k]
+            if similar_rated:
+                numerator = sum(user_ratings[i] * sim for i, sim in similar_rated)
+                denominator = sum(sim for _, sim in similar_rated)
+                predictions[item_idx] = numerator / denominator if denominator > 0 else 0
+
+    return predictions
+
+
+def reference_predict_user_based(model, user_idx, top_k=50):
+    """Original DataFrame-row loop, kept as the reference for the neighbor index"""
+    user_sim = model.user_similarity
+    user_sim = (user_sim.toarray() if hasattr(user_sim, "toarray") else np.asarray(user_sim))[user_idx]
+    top_similar_users = np.argsort(user_sim)[::-1][1 : top_k + 1]
+
+    numerator = np.zeros(model.user_item_matrix.shape[1])
+    denominator = np.zeros(model.user_item_matrix.shape[1])
+    for similar_user in top_similar_users:
+        sim_score = user_sim[similar_user]
+        if sim_score > 0:
+            ratings = model.user_item_matrix[similar_user].toarray().ravel()
+            numerator += sim_score * ratings
+            denominator += sim_score * (ratings > 0)
+
+    return np.divide(numerator, denominator, where=denominator != 0, out=np.zeros_like(numerator))
+
+
 @pytest.fixture
 def model():
     """Create a model instance"""
@@ -42,6 +111,19 @@ class TestCollaborativeFilteringModel:
         assert model.min_interactions == 1
         assert model.user_item_matrix is None
 
+    def test_interaction_matrix_matches_pivot(self, model, random_interaction_data):
+        """Test the sparse matrix equals the dense pivot table it replaces"""
+        data = pd.concat([random_interaction_data, random_interaction_data.iloc[:50].assign(rating=1.0)])
+        matrix = model.create_interaction_matrix(data)
+
+        pivot = data.pivot_table(index="user_id", columns="product_id", values="rating", fill_value=0)
+        np.testing.assert_allclose(matrix.toarray(), pivot.values)
+        assert list(model.user_lookup.labels) == list(pivot.index)
+        assert list(model.product_lookup.labels) == list(pivot.columns)
+        assert model.product_lookup[pivot.columns[3]] == 3
+        np.testing.assert_array_equal(model.user_lookup.get_indexer([pivot.index[2], -5]), [2, -1])
+        np.testing.assert_allclose(model.user_mean_ratings, data.groupby("user_id")["rating"].mean().values)
+
     def test_create_interaction_matrix(self, model, sample_interaction_data):
         """Test interaction matrix creation"""
         matrix = model.create_interaction_matrix(sample_interaction_data)
@@ -166,6 +248,1002 @@ class TestCollaborativeFilteringModel:
             assert len(loaded_model.user_lookup) == len(model.user_lookup)
             assert len(loaded_model.product_lookup) == len(model.product_lookup)
 
+    def test_load_legacy_pickle(self, model, sample_interaction_data):
+        """Test artifacts with the dense pivot table and dict lookups still load"""
+        pivot = sample_interaction_data.pivot_table(index="user_id", columns="product_id", values="rating", fill_value=0)
+        legacy = {
+            "user_item_matrix": pivot,
+            "user_similarity": cosine_similarity(pivot, dense_output=False),
+            "item_similarity": cosine_similarity(pivot.T, dense_output=False),
+            "user_lookup": {user: idx for idx, user in enumerate(pivot.index)},
+            "product_lookup": {prod: idx for idx, prod in enumerate(pivot.columns)},
+            "user_mean_ratings": sample_interaction_data.groupby("user_id")["rating"].mean().to_dict(),
+            "global_mean": sample_interaction_data["rating"].mean(),
+            "n_recommendations": 5,
+            "min_interactions": 1,
+        }
+        with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as f:
+            pickle.dump(legacy, f)
+
+        loaded_model = CollaborativeFilteringModel.load_model(f.name)
+
+        model.create_interaction_matrix(sample_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+        assert loaded_model.recommend_products(0, n=3) == model.recommend_products(0, n=3)
+
+
+class TestVectorizedScoring:
+    """Test that the sparse scoring engine matches the reference loops"""
+
+    @pytest.mark.parametrize("top_k", [3, 50])
+    def test_item_based_matches_reference(self, model, random_interaction_data, top_k):
+        """Test vectorized item-based scores against the per-item loop"""
+        model.create_interaction_matrix(random_interaction_data)
+        model.compute_item_similarity()
+
+        for user_idx in range(len(model.user_lookup)):
+            expected = reference_predict_item_based(model, user_idx, top_k=top_k)
+            np.testing.assert_allclose(model.predict_item_based(user_idx, top_k=top_k), expected, atol=1e-10)
+
+
+    @pytest.mark.parametrize("top_k", [5, 50])
+    def test_user_based_matches_reference(self, model, random_interaction_data, top_k):
+        """Test neighbor-indexed user-based scores against the DataFrame loop"""
+        model.create_interaction_matrix(random_interaction_data)
+        model.compute_user_similarity()
+
+        for user_idx in range(len(model.user_lookup)):
+            expected = reference_predict_user_based(model, user_idx, top_k=top_k)
+            np.testing.assert_allclose(model.predict_user_based(user_idx, top_k=top_k), expected, atol=1e-10)
+
+    def test_user_neighbor_index(self, sample_interaction_data):
+        """Test the neighbor index excludes self and keeps at most neighbor_k users"""
+        model = CollaborativeFilteringModel(min_interactions=1, neighbor_k=2)
+        model.create_interaction_matrix(sample_interaction_data)
+        model.compute_user_similarity()
+
+        assert model.user_neighbors.shape == (4, 4)
+        assert model.user_neighbors.diagonal().sum() == 0
+        assert np.diff(model.user_neighbors.indptr).max() <= 2
+
+
+    @pytest.mark.parametrize("top_k", [3, 50])
+    def test_score_block_matches_predict_hybrid(self, model, random_interaction_data, top_k):
+        """Test blocked hybrid scores against per-user predict_hybrid"""
+        model.create_interaction_matrix(random_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        user_indices = np.arange(len(model.user_lookup))
+        scores = model._score_block(user_indices, 0.3, model._batch_operands(), top_k=top_k).toarray()
+
+        for user_idx in user_indices:
+            expected = 0.3 * model.predict_user_based(user_idx, top_k=top_k) + 0.7 * model.predict_item_based(
+                user_idx, top_k=top_k
+            )
+            np.testing.assert_allclose(scores[user_idx], expected, atol=1e-10)
+
+    def test_score_block_follows_neighbor_k(self, random_interaction_data):
+        """Test blocked scores default to neighbor_k neighbors and look past the neighbor index when asked"""
+        model = CollaborativeFilteringModel(n_recommendations=5, min_interactions=1, neighbor_k=3)
+        model.create_interaction_matrix(random_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        user_indices = np.arange(len(model.user_lookup))
+        operands = model._batch_operands()
+        scores = model._score_block(user_indices, 0.5, operands).toarray()
+        wider = model._score_block(user_indices, 0.5, operands, top_k=10).toarray()
+        for user_idx in user_indices:
+            np.testing.assert_allclose(scores[user_idx], model.predict_hybrid(user_idx), atol=1e-10)
+            expected = 0.5 * model.predict_user_based(user_idx, top_k=10) + 0.5 * model.predict_item_based(
+                user_idx, top_k=10
+            )
+            np.testing.assert_allclose(wider[user_idx], expected, atol=1e-10)
+
+    def test_recommend_products_batch(self, model, random_interaction_data):
+        """Test batch recommendations match single-user recommendations in order"""
+        model.create_interaction_matrix(random_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        user_ids = list(model.user_lookup.keys()) + [999]
+        batch = model.recommend_products_batch(user_ids, n=5, block_size=7)
+
+        assert len(batch) == len(user_ids)
+        for user_id, recommendations in zip(user_ids, batch):
+            expected = model.recommend_products(user_id, n=5)
+            assert [prod for prod, _ in recommendations] == [prod for prod, _ in expected]
+            np.testing.assert_allclose([score for _, score in recommendations], [score for _, score in expected])
+
+    @pytest.mark.parametrize("n_jobs", [1, 2])
+    def test_grouped_evaluate_matches_row_loop(self, model, random_interaction_data, n_jobs):
+        """Test per-user grouped evaluation against predict_hybrid row by row"""
+        train_data = random_interaction_data.sample(frac=0.8, random_state=1)
+        test_data = random_interaction_data.drop(train_data.index)
+        model.create_interaction_matrix(train_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        y_true, y_pred = [], []
+        for _, row in test_data.iterrows():
+            if row["user_id"] in model.user_lookup and row["product_id"] in model.product_lookup:
+                pred = model.predict_hybrid(model.user_lookup[row["user_id"]])[model.product_lookup[row["product_id"]]]
+                if pred > 0:
+                    y_true.append(row["rating"])
+                    y_pred.append(pred)
+
+        metrics = model.evaluate(test_data, block_size=5, n_jobs=n_jobs)
+
+        assert metrics["n_predictions"] == len(y_pred)
+        assert metrics["rmse"] == pytest.approx(np.sqrt(np.mean((np.array(y_true) - np.array(y_pred)) ** 2)))
+        assert metrics["mae"] == pytest.approx(np.mean(np.abs(np.array(y_true) - np.array(y_pred))))
+        assert metrics["coverage"] == pytest.approx(len(y_pred) / len(test_data))
+
+    @pytest.mark.parametrize("n_jobs", [1, 2])
+    def test_evaluate_ranking_matches_recommendations(self, model, random_interaction_data, n_jobs):
+        """Test batched ranking metrics against per-user recommend_products lists"""
+        train_data = random_interaction_data.sample(frac=0.7, random_state=3)
+        test_data = random_interaction_data.drop(train_data.index)
+        model.create_interaction_matrix(train_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        k = 5
+        precisions, recalls, recommended = [], [], set()
+        for user_id, group in test_data.groupby("user_id"):
+            relevant = set(group["product_id"]) & set(model.product_lookup.keys())
+            if user_id not in model.user_lookup or not relevant:
+                continue
+            ranked = [prod for prod, _ in model.recommend_products(user_id, n=k)]
+            recommended.update(ranked)
+            n_hits = len(relevant.intersection(ranked))
+            precisions.append(n_hits / k)
+            recalls.append(n_hits / len(relevant))
+
+        metrics = model.evaluate_ranking(test_data, k=k, block_size=4, n_jobs=n_jobs)
+
+        assert metrics["n_ranking_users"] == len(precisions)
+        assert metrics["precision_at_5"] == pytest.approx(np.mean(precisions))
+        assert metrics["recall_at_5"] == pytest.approx(np.mean(recalls))
+        assert metrics["catalog_coverage"] == pytest.approx(len(recommended) / len(model.product_lookup))
+        assert 0 <= metrics["ndcg_at_5"] <= 1
+        assert 0 <= metrics["map_at_5"] <= 1
+
+    @pytest.mark.parametrize("model_class", [CollaborativeFilteringModel, ALSRecommendationModel])
+    def test_evaluate_sweep_matches_single_runs(self, random_interaction_data, model_class):
+        """Test one sweep gives exactly the metrics of evaluate and evaluate_ranking per (alpha, k)"""
+        train = random_interaction_data.sample(frac=0.8, random_state=0)
+        test = random_interaction_data.drop(train.index)
+        model = model_class(min_interactions=1).fit(train)
+
+        sweep = model.evaluate_sweep(test, alphas=[0.3, 0.7], ks=[5, 10])
+        for alpha in (0.3, 0.7):
+            for k in (5, 10):
+                expected = model.evaluate(test, alpha=alpha)
+                expected.update(model.evaluate_ranking(test, k=k, alpha=alpha))
+                assert sweep[alpha][k] == expected
+
+    def test_top_n_ties_go_to_lower_index(self):
+        """Test top-N selection is deterministic when scores tie at the cut-off"""
+        rng = np.random.default_rng(5)
+        scores = rng.integers(0, 4, size=(200, 30)).astype(float)
+
+        top_indices, top_scores = _top_n_per_row(scores, 6)
+
+        for row in range(len(scores)):
+            expected = [idx for idx in np.argsort(-scores[row], kind="stable")[:6] if scores[row, idx] > 0]
+            assert list(top_indices[row][top_indices[row] >= 0]) == expected
+            np.testing.assert_array_equal(top_scores[row][: len(expected)], scores[row, expected])
+
+
+class TestPopularity:
+    """Test the precomputed cold-start popularity rankings"""
+
+    @pytest.fixture
+    def dated_data(self):
+        """Interactions with review dates and categories"""
+        return pd.DataFrame(
+            {
+                "user_id": [1, 2, 3, 1, 2, 3, 1, 2],
+                "product_id": ["A", "A", "A", "B", "B", "C", "C", "D"],
+                "rating": [5.0, 5.0, 4.0, 4.0, 4.0, 3.0, 3.0, 2.0],
+                "review_date": pd.to_datetime(
+                    ["2020-01-01", "2020-01-01", "2020-01-01", "2024-01-01", "2024-01-01", "2024-01-01", "2024-01-01", None]
+                ),
+                "main_category": ["Books", "Books", "Books", "Toys", "Toys", "Books", None, "Toys"],
+            }
+        )
+
+    def test_matches_mean_rating(self, model, random_interaction_data):
+        """Test the cached ranking equals the mean-rating ranking"""
+        model.create_interaction_matrix(random_interaction_data)
+        dense = model.user_item_matrix.toarray()
+        expected_scores = dense.sum(axis=0) / np.maximum((dense > 0).sum(axis=0), 1)
+
+        np.testing.assert_allclose(model.popularity_scores, expected_scores)
+        recommendations = model.recommend_products(-1, n=5)
+        expected = np.argsort(-expected_scores, kind="stable")[:5]
+        assert [product for product, _ in recommendations] == list(model.product_lookup.labels[expected])
+
+    def test_time_decay_favors_recent_ratings(self, dated_data):
+        """Test old ratings fade out with a half-life"""
+        plain = CollaborativeFilteringModel(min_interactions=1)
+        plain.create_interaction_matrix(dated_data)
+        decayed = CollaborativeFilteringModel(min_interactions=1, popularity_half_life_days=30)
+        decayed.create_interaction_matrix(dated_data)
+
+        assert plain.recommend_products(-1, n=1)[0][0] == "A"
+        assert decayed.recommend_products(-1, n=1)[0][0] == "B"
+        # D only has an undated rating
+        assert decayed.popularity_scores[decayed.product_lookup["D"]] == 0
+
+    def test_per_category_ranking(self, model, dated_data):
+        """Test cold-start recommendations restricted to one category"""
+        model.min_interactions = 1
+        model.create_interaction_matrix(dated_data)
+
+        assert [product for product, _ in model.recommend_products(-1, n=2, category="Books")] == ["A", "C"]
+        assert [product for product, _ in model.recommend_products(-1, n=2, category="Toys")] == ["B", "D"]
+
+    def test_category_falls_back_to_overall_ranking(self, model, dated_data):
+        """Test short and unknown categories are filled from the overall ranking"""
+        model.min_interactions = 1
+        model.create_interaction_matrix(dated_data)
+        overall = [product for product, _ in model.recommend_products(-1, n=4)]
+
+        assert [product for product, _ in model.recommend_products(-1, n=3, category="Books")] == ["A", "C", "B"]
+        assert [product for product, _ in model.recommend_products(-1, n=4, category="Toys")] == ["B", "D", "A", "C"]
+        assert [product for product, _ in model.recommend_products(-1, n=4, category="Garden")] == overall
+        # Every product is already in the category and overall rankings: no duplicates
+        assert len(model.recommend_products(-1, n=10, category="Books")) == 4
+
+    def test_save_load_keeps_rankings(self, model, dated_data, tmp_path):
+        """Test popularity is persisted rather than recomputed"""
+        model.min_interactions = 1
+        model.create_interaction_matrix(dated_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        path = str(tmp_path / "model.pkl")
+        model.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+
+        np.testing.assert_array_equal(loaded.popularity_ranking, model.popularity_ranking)
+        assert loaded.recommend_products(-1, category="Toys") == model.recommend_products(-1, category="Toys")
+
+
+class TestKnnSimilarity:
+    """Test the top-k pruned similarity mode"""
+
+    def test_top_k_per_row_ties_and_split(self):
+        """Test ties at the cut-off go to the lower column index and the split keeps every entry"""
+        matrix = csr_matrix(
+            (
+                np.array([0.5, 0.9, 0.5, 0.5, 0.2, -0.1, 0.3], dtype=np.float32),
+                np.array([4, 0, 1, 3, 0, 2, 1]),
+                np.array([0, 4, 4, 7]),
+            ),
+            shape=(3, 5),
+        )
+        top = _top_k_per_row(matrix, 2)
+        np.testing.assert_array_equal(np.diff(top.indptr), [2, 0, 2])
+        np.testing.assert_array_equal(top.indices[:2], [0, 1])
+        np.testing.assert_allclose(top.data[2:], [0.2, 0.3])
+
+        top, rest = _split_top_k(matrix, 2)
+        np.testing.assert_array_equal(rest.indices, [4, 3, 2])
+        assert abs(top + rest - matrix).max() == 0
+
+    def test_pruned_similarity_structure(self, random_interaction_data):
+        """Test pruned rows keep the k most similar entries above the threshold"""
+        full = CollaborativeFilteringModel(min_interactions=1)
+        full.create_interaction_matrix(random_interaction_data)
+        full.compute_item_similarity()
+
+        knn = CollaborativeFilteringModel(
+            min_interactions=1, similarity_top_k=5, similarity_threshold=0.05, similarity_block_size=16
+        )
+        knn.create_interaction_matrix(random_interaction_data)
+        knn.compute_item_similarity()
+
+        pruned = knn.item_similarity.toarray()
+        dense = full.item_similarity.toarray()
+        assert (np.count_nonzero(pruned, axis=1) <= 5).all()
+        assert np.all(np.diag(pruned) == 0)
+        assert np.all(pruned[pruned != 0] > 0.05)
+        np.testing.assert_allclose(pruned[pruned != 0], dense[pruned != 0])
+        assert knn.similarity_stats["item_similarity_nnz"] == knn.item_similarity.nnz
+        assert knn.similarity_stats["peak_rss_mb"] > 0
+
+    def test_unpruned_knn_matches_full(self, random_interaction_data):
+        """Test kNN mode with k above the catalog size reproduces full-matrix predictions"""
+        full = CollaborativeFilteringModel(min_interactions=1)
+        knn = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=1000, similarity_block_size=16)
+        for model in (full, knn):
+            model.create_interaction_matrix(random_interaction_data)
+            model.compute_user_similarity()
+            model.compute_item_similarity()
+
+        for user_idx in range(len(full.user_lookup)):
+            np.testing.assert_allclose(knn.predict_hybrid(user_idx), full.predict_hybrid(user_idx), atol=1e-10)
+
+    def test_knn_save_and_load(self, random_interaction_data):
+        """Test the pruned graph survives save/load and keeps serving recommendations"""
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=10)
+        model.create_interaction_matrix(random_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as f:
+            model.save_model(f.name)
+            loaded_model = CollaborativeFilteringModel.load_model(f.name)
+
+        assert loaded_model.similarity_top_k == 10
+        user_id = list(model.user_lookup.keys())[0]
+        assert loaded_model.recommend_products(user_id) == model.recommend_products(user_id)
+        assert loaded_model.recommend_products_batch([user_id]) == [model.recommend_products(user_id)]
+
+    def test_ann_similarity(self, random_interaction_data, tmp_path):
+        """Test LSH neighbor lists hold exact similarities and never beat the exact kNN graph"""
+        with pytest.raises(ValueError):
+            CollaborativeFilteringModel(ann_params={"n_tables": 4})
+
+        exact = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=5)
+        ann = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=5, ann_params={"n_tables": 4, "n_bits": 2})
+        for model in (exact, ann):
+            model.create_interaction_matrix(random_interaction_data)
+            model.compute_user_similarity()
+            model.compute_item_similarity()
+
+        full = exact.item_similarity.toarray()
+        pruned = ann.item_similarity.toarray()
+        assert (np.count_nonzero(pruned, axis=1) <= 5).all()
+        assert np.all(np.diag(pruned) == 0)
+        found = pruned != 0
+        np.testing.assert_allclose(pruned[found], cosine_similarity(ann.user_item_matrix.T)[found])
+        assert np.all(pruned.sum(axis=1) <= full.sum(axis=1) + 1e-10)
+        assert (found & (full != 0)).sum() > 0.5 * (full != 0).sum()
+
+        product_id = ann.product_lookup.labels[0]
+        similar = ann.similar_products(product_id, n=3)
+        assert 0 < len(similar) <= 3
+        assert product_id not in [product for product, _ in similar]
+        assert exact.similar_products(product_id, n=3)[0][1] >= similar[0][1]
+        assert ann.similar_products("missing") == []
+
+        path = str(tmp_path / "model")
+        ann.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+        assert loaded.ann_params == {"n_tables": 4, "n_bits": 2}
+        assert loaded.similar_products(product_id, n=3) == similar
+
+
+class TestPartialFit:
+    """Test folding new interactions into a trained model"""
+
+    @pytest.fixture
+    def history_and_delta(self):
+        """Continuous ratings (no similarity ties) split into history and a delta
+        with new users, new products and repeated (user, product) pairs"""
+        rng = np.random.default_rng(3)
+        n = 700
+        df = pd.DataFrame(
+            {
+                "user_id": rng.integers(0, 50, n),
+                "product_id": [f"P{i}" for i in rng.integers(0, 70, n)],
+                "rating": rng.uniform(1, 5, n),
+                "review_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+                "main_category": rng.choice(["Books", "Toys", "Garden"], n),
+            }
+        ).sort_values("review_date")
+        history = df[(df["user_id"] < 45) & (df["product_id"] != "P3")].iloc[:500]
+        return history, df.drop(history.index)
+
+    @staticmethod
+    def by_label(model, matrix, row_lookup, col_lookup, rows, cols):
+        """Dense sub-matrix ordered by labels, independent of internal positions"""
+        dense = matrix.toarray() if hasattr(matrix, "toarray") else np.asarray(matrix)
+        return dense[np.ix_(row_lookup.get_indexer(rows), col_lookup.get_indexer(cols))]
+
+    def assert_same_model(self, incremental, retrained):
+        users = np.sort(retrained.user_lookup.labels)
+        products = np.sort(retrained.product_lookup.labels)
+        assert set(incremental.user_lookup.labels) == set(users)
+        assert set(incremental.product_lookup.labels) == set(products)
+
+        pairs = [
+            ("user_item_matrix", incremental.user_lookup, incremental.product_lookup, users, products),
+            ("user_similarity", incremental.user_lookup, incremental.user_lookup, users, users),
+            ("user_neighbors", incremental.user_lookup, incremental.user_lookup, users, users),
+            ("item_similarity", incremental.product_lookup, incremental.product_lookup, products, products),
+        ]
+        for name, row_lookup, col_lookup, rows, cols in pairs:
+            expected_rows = retrained.user_lookup if row_lookup is incremental.user_lookup else retrained.product_lookup
+            expected_cols = retrained.user_lookup if col_lookup is incremental.user_lookup else retrained.product_lookup
+            np.testing.assert_allclose(
+                self.by_label(incremental, getattr(incremental, name), row_lookup, col_lookup, rows, cols),
+                self.by_label(retrained, getattr(retrained, name), expected_rows, expected_cols, rows, cols),
+                atol=1e-10,
+                err_msg=name,
+            )
+
+        np.testing.assert_allclose(
+            incremental.user_mean_ratings[incremental.user_lookup.get_indexer(users)],
+            retrained.user_mean_ratings[retrained.user_lookup.get_indexer(users)],
+        )
+        assert incremental.global_mean == pytest.approx(retrained.global_mean)
+        np.testing.assert_allclose(
+            incremental.popularity_scores[incremental.product_lookup.get_indexer(products)],
+            retrained.popularity_scores[retrained.product_lookup.get_indexer(products)],
+        )
+
+    @pytest.mark.parametrize("similarity_top_k", [None, 5, 80])
+    def test_matches_full_retrain(self, history_and_delta, similarity_top_k):
+        """Test partial_fit ends up with the same model as training on history + delta"""
+        history, delta = history_and_delta
+        params = {"min_interactions": 1, "similarity_top_k": similarity_top_k, "neighbor_k": 10}
+
+        def retrain(df):
+            model = CollaborativeFilteringModel(**params)
+            model.create_interaction_matrix(df)
+            model.compute_user_similarity()
+            model.compute_item_similarity()
+            return model
+
+        incremental = retrain(history)
+        # Cache the batch operands so the updates below must invalidate them
+        incremental.recommend_products_batch(history["user_id"].unique()[:3])
+
+        # A small delta takes the row-by-row update path
+        incremental.partial_fit(delta.iloc[:15])
+        self.assert_same_model(incremental, retrain(pd.concat([history, delta.iloc[:15]])))
+
+        # A delta touching most users recomputes the graphs
+        incremental.partial_fit(delta.iloc[15:])
+        retrained = retrain(pd.concat([history, delta]))
+        self.assert_same_model(incremental, retrained)
+
+        user_id = delta["user_id"].iloc[0]
+        recommendations = dict(incremental.recommend_products(user_id, n=5))
+        for product, score in retrained.recommend_products(user_id, n=5):
+            assert recommendations[product] == pytest.approx(score)
+        batch = dict(incremental.recommend_products_batch([user_id], n=5)[0])
+        for product, score in retrained.recommend_products_batch([user_id], n=5)[0]:
+            assert batch[product] == pytest.approx(score)
+
+    @pytest.mark.parametrize("similarity_slack", [0, 2])
+    def test_chained_small_deltas_match_full_retrain(self, history_and_delta, similarity_slack, tmp_path):
+        """Test rows merged with their reserve stay exact over several updates and a save/load"""
+        history, delta = history_and_delta
+        params = {"min_interactions": 1, "similarity_top_k": 3, "similarity_slack": similarity_slack, "neighbor_k": 10}
+        incremental = CollaborativeFilteringModel(**params).fit(history)
+        assert (incremental.item_similarity_reserve is None) == (similarity_slack == 0)
+
+        for start in range(0, 40, 5):
+            incremental.save_model(str(tmp_path / "model"))
+            incremental = CollaborativeFilteringModel.load_model(str(tmp_path / "model"), mmap_mode=None)
+            incremental.partial_fit(delta.iloc[start : start + 5])
+            retrained = CollaborativeFilteringModel(**params).fit(pd.concat([history, delta.iloc[: start + 5]]))
+            self.assert_same_model(incremental, retrained)
+        assert np.diff(incremental.item_similarity.indptr).max() <= 3
+
+    def test_time_decayed_popularity(self, history_and_delta):
+        """Test decayed popularity is shifted to the new reference date instead of recomputed"""
+        history, delta = history_and_delta
+        params = {"min_interactions": 1, "popularity_half_life_days": 30}
+
+        incremental = CollaborativeFilteringModel(**params)
+        incremental.create_interaction_matrix(history)
+        incremental.partial_fit(delta)
+
+        retrained = CollaborativeFilteringModel(**params)
+        retrained.create_interaction_matrix(pd.concat([history, delta]))
+
+        products = np.sort(retrained.product_lookup.labels)
+        np.testing.assert_allclose(
+            incremental.popularity_scores[incremental.product_lookup.get_indexer(products)],
+            retrained.popularity_scores[retrained.product_lookup.get_indexer(products)],
+        )
+        expected = retrained.recommend_products(-1, n=5)
+        recommendations = incremental.recommend_products(-1, n=5)
+        assert [product for product, _ in recommendations] == [product for product, _ in expected]
+        np.testing.assert_allclose([score for _, score in recommendations], [score for _, score in expected])
+        category = delta.loc[delta["product_id"] == "P3", "main_category"].iloc[0]
+        assert incremental.product_lookup["P3"] in incremental.category_rankings[category]
+
+    def test_after_loading_mmap_model(self, history_and_delta, tmp_path):
+        """Test a memory-mapped model can be updated and saved again"""
+        history, delta = history_and_delta
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=5)
+        model.create_interaction_matrix(history)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+        model.save_model(str(tmp_path / "model"))
+
+        loaded = CollaborativeFilteringModel.load_model(str(tmp_path / "model"))
+        loaded.partial_fit(delta)
+        loaded.save_model(str(tmp_path / "model"))
+
+        model.partial_fit(delta)
+        reloaded = CollaborativeFilteringModel.load_model(str(tmp_path / "model"))
+        assert (reloaded.user_item_matrix != model.user_item_matrix).nnz == 0
+        assert reloaded.recommend_products(delta["user_id"].iloc[0]) == model.recommend_products(delta["user_id"].iloc[0])
+
+    def test_update_model_publishes_new_version(self, history_and_delta, tmp_path):
+        """Test update_model writes a new model version and leaves the one a server has mapped untouched"""
+        history, delta = history_and_delta
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=5)
+        model.create_interaction_matrix(history)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+        model_path, topn_path = str(tmp_path / "model"), str(tmp_path / "topn")
+        model.save_model(model_path)
+        write_topn_table(model, topn_path)
+
+        serving = CollaborativeFilteringModel.load_model(model_path)
+        served_version = os.path.realpath(model_path)
+        user_id = history["user_id"].iloc[0]
+        expected = serving.recommend_products(user_id)
+        delta[["user_id", "product_id", "rating"]].to_csv(tmp_path / "delta.csv", index=False)
+
+        updated = update_model(str(tmp_path / "delta.csv"), model_path, topn_path)
+
+        assert os.path.realpath(model_path) != served_version and os.path.isdir(served_version)
+        assert serving.recommend_products(user_id) == expected
+        reloaded = CollaborativeFilteringModel.load_model(model_path)
+        assert set(reloaded.user_lookup.labels) == set(updated.user_lookup.labels)
+        assert len(TopNTable(topn_path)) == len(updated.user_lookup)
+
+    def test_min_interactions_for_new_entities(self, sample_interaction_data):
+        """Test new users and products need min_interactions rows in the delta, known ones do not"""
+        model = CollaborativeFilteringModel(min_interactions=2)
+        model.create_interaction_matrix(sample_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        delta = pd.DataFrame({"user_id": [3, 99, 0], "product_id": ["P2", "P1", "P9"], "rating": [5.0, 3.0, 4.0]})
+        model.partial_fit(delta)
+
+        assert 99 not in model.user_lookup
+        assert "P9" not in model.product_lookup
+        assert model.user_item_matrix[model.user_lookup[3], model.product_lookup["P2"]] == 5.0
+
+
+class TestModelDirectoryFormat:
+    """Test the memory-mapped directory model format"""
+
+    @pytest.mark.parametrize("similarity_top_k", [None, 10])
+    def test_mmap_model_matches_trained_model(self, random_interaction_data, tmp_path, similarity_top_k):
+        """Test a memory-mapped model scores exactly like the model that was saved"""
+        train = random_interaction_data.sample(frac=0.8, random_state=0)
+        test = random_interaction_data.drop(train.index)
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=similarity_top_k)
+        model.create_interaction_matrix(train)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        path = str(tmp_path / "model")
+        model.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+
+        # Read-only views of the mapped files, not private copies
+        assert not loaded.user_item_matrix.data.flags.writeable
+        user_ids = list(model.user_lookup.labels) + [-1]
+        assert loaded.recommend_products_batch(user_ids) == model.recommend_products_batch(user_ids)
+        assert loaded.recommend_products(user_ids[0]) == model.recommend_products(user_ids[0])
+        assert loaded.evaluate(test) == model.evaluate(test)
+        assert loaded.evaluate_ranking(test, k=5) == model.evaluate_ranking(test, k=5)
+
+    def test_save_over_mapped_model_swaps_versions(self, model, sample_interaction_data, tmp_path):
+        """Test a save publishes a new version through the link and leaves the mapped one readable"""
+        model.create_interaction_matrix(sample_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+        expected = model.recommend_products(1)
+
+        # A plain directory saved before versioning is moved aside as the oldest version
+        path = str(tmp_path / "model")
+        os.makedirs(path)
+        model.save_model(path)
+        assert os.path.isdir(f"{path}.v0")
+
+        mapped = CollaborativeFilteringModel.load_model(path)
+        model.save_model(path)
+
+        # Only the published version and the one the mapped model still reads are kept
+        assert os.path.islink(path) and is_model_directory(path)
+        versions = [entry for entry in os.listdir(tmp_path) if entry.startswith("model.v")]
+        assert len(versions) == 2 and "model.v0" not in versions
+        assert mapped.recommend_products(1) == expected
+        assert CollaborativeFilteringModel.load_model(path).recommend_products(1) == expected
+
+    def test_categories_survive_round_trip(self, tmp_path):
+        """Test per-category popularity rankings are stored in the directory"""
+        df = pd.DataFrame(
+            {
+                "user_id": [1, 2, 1, 2],
+                "product_id": ["A", "B", "C", "C"],
+                "rating": [5.0, 4.0, 3.0, 2.0],
+                "main_category": ["Books", "Toys", "Books", "Books"],
+            }
+        )
+        model = CollaborativeFilteringModel(min_interactions=1)
+        model.create_interaction_matrix(df)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        path = str(tmp_path / "model")
+        model.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path, mmap_mode=None)
+
+        assert loaded.user_item_matrix.data.flags.writeable
+        assert loaded.recommend_products(-1, category="Books") == model.recommend_products(-1, category="Books")
+        assert loaded.recommend_products(-1, category="Toys") == model.recommend_products(-1, category="Toys")
+
+    def test_pickle_fallback(self, model, sample_interaction_data, tmp_path):
+        """Test .pkl paths keep writing and loading single-file pickles"""
+        model.create_interaction_matrix(sample_interaction_data)
+        model.compute_user_similarity()
+        model.compute_item_similarity()
+
+        path = str(tmp_path / "model.pkl")
+        model.save_model(path)
+
+        assert os.path.isfile(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+        assert loaded.recommend_products(1) == model.recommend_products(1)
+
+
+class TestPrecision:
+    """Test float32 and int8 storage of ratings and similarities"""
+
+    @pytest.fixture
+    def split(self, random_interaction_data):
+        train = random_interaction_data.sample(frac=0.8, random_state=0)
+        return train, random_interaction_data.drop(train.index)
+
+    @pytest.mark.parametrize("similarity_top_k", [None, 10])
+    def test_compact_models_stay_close(self, split, similarity_top_k):
+        """Test smaller models score within a small RMSE and ranking delta of float64"""
+        train, test = split
+        models = {
+            precision: CollaborativeFilteringModel(
+                min_interactions=1, similarity_top_k=similarity_top_k, precision=precision
+            ).fit(train)
+            for precision in ("float64", "float32", "int8")
+        }
+
+        assert models["float32"].item_similarity.dtype == np.float32
+        assert models["int8"].user_item_matrix.dtype == np.uint8
+        assert models["float64"].model_size_mb() > models["float32"].model_size_mb() > models["int8"].model_size_mb()
+
+        reference = models["float64"].evaluate(test)
+        ranking = models["float64"].evaluate_ranking(test, k=5)
+        for precision in ("float32", "int8"):
+            assert models[precision].evaluate(test)["rmse"] == pytest.approx(reference["rmse"], abs=0.02)
+            assert models[precision].evaluate_ranking(test, k=5)["ndcg_at_5"] == pytest.approx(ranking["ndcg_at_5"], abs=0.05)
+
+    @pytest.mark.parametrize("path_name", ["model", "model.pkl"])
+    def test_int8_round_trip(self, split, tmp_path, path_name):
+        """Test quantized graphs and their precision survive save_model / load_model"""
+        train, _ = split
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=10, precision="int8").fit(train)
+
+        path = str(tmp_path / path_name)
+        model.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+
+        assert loaded.precision == "int8"
+        assert loaded.item_similarity.codes.dtype == np.int8
+        assert loaded.user_neighbors is loaded.user_similarity
+        user_ids = list(model.user_lookup.labels)
+        assert loaded.recommend_products_batch(user_ids) == model.recommend_products_batch(user_ids)
+
+    def test_partial_fit_keeps_precision(self, split, tmp_path):
+        """Test new interactions fold into a memory-mapped int8 model and stay quantized"""
+        train, test = split
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=10, precision="int8").fit(train)
+        model.save_model(str(tmp_path / "model"))
+        loaded = CollaborativeFilteringModel.load_model(str(tmp_path / "model"))
+
+        loaded.partial_fit(test)
+        assert loaded.item_similarity.codes.dtype == np.int8
+        assert loaded.user_item_matrix.dtype == np.uint8
+        assert len(loaded.recommend_products(test["user_id"].iloc[0], n=5)) > 0
+
+    def test_partial_fit_int8_large_counts(self):
+        """Test rating x count sums above 255 do not wrap in uint8 storage"""
+        rows = [(user, product, 5.0) for user in range(3) for product in range(1, 4)]
+        df = pd.DataFrame(rows * 100, columns=["user_id", "product_id", "rating"])
+        model = CollaborativeFilteringModel(min_interactions=1, precision="int8").fit(df)
+        assert model.interaction_counts.max() == 100
+
+        model.partial_fit(pd.DataFrame({"user_id": [0, 1], "product_id": [1, 2], "rating": [5.0, 5.0]}))
+        np.testing.assert_allclose(model.user_item_matrix.toarray(), 5.0)
+        assert model.interaction_counts[model.user_lookup[0], model.product_lookup[1]] == 101
+        assert model.user_mean_ratings[0] == pytest.approx(5.0)
+
+    def test_als_factors(self, random_interaction_data):
+        """Test compact ALS models keep float32 factors"""
+        model = ALSRecommendationModel(min_interactions=1, n_factors=4, n_iterations=3, precision="int8")
+        model.fit(random_interaction_data)
+        assert model.user_factors.dtype == np.float32
+        assert model.user_item_matrix.dtype == np.uint8
+        assert len(model.recommend_products(model.user_lookup.labels[0], n=5)) == 5
+
+    def test_unknown_precision_rejected(self):
+        with pytest.raises(ValueError):
+            CollaborativeFilteringModel(precision="float16")
+
+
+class TestALSModel:
+    """Test the matrix factorization model behind the shared model contract"""
+
+    @pytest.fixture
+    def als_model(self, random_interaction_data):
+        return ALSRecommendationModel(min_interactions=1, n_factors=8, n_iterations=10, solve_block_nnz=64).fit(
+            random_interaction_data
+        )
+
+    def test_rows_solve_the_ridge_problem(self, als_model):
+        """Test each row's factors are the weighted-lambda least-squares solution"""
+        ratings = als_model.user_item_matrix
+        solved = als_model._solve_factors(ratings, als_model.item_factors)
+
+        for user_idx in (0, 7, 21):
+            row = ratings[user_idx]
+            design = als_model.item_factors[row.indices]
+            gram = design.T @ design + als_model.regularization * row.nnz * np.eye(8)
+            expected = np.linalg.solve(gram, design.T @ (row.data - als_model.global_mean))
+            np.testing.assert_allclose(solved[user_idx], expected)
+
+    def test_threads_match_single_thread(self, random_interaction_data):
+        """Test spreading the row blocks over threads does not change the factors"""
+        models = [
+            ALSRecommendationModel(min_interactions=1, n_factors=4, n_iterations=3, n_jobs=n_jobs, solve_block_nnz=32)
+            for n_jobs in (1, 4)
+        ]
+        for model in models:
+            model.fit(random_interaction_data)
+        np.testing.assert_allclose(models[0].user_factors, models[1].user_factors)
+
+    def test_fits_and_recommends(self, als_model, random_interaction_data):
+        """Test training error drops and recommendations follow the neighborhood contract"""
+        assert als_model.train_rmse < random_interaction_data["rating"].std()
+        assert als_model.user_factors.shape == (len(als_model.user_lookup), 8)
+
+        user_id = als_model.user_lookup.labels[0]
+        recommendations = als_model.recommend_products(user_id, n=5)
+        rated = set(als_model.product_lookup.labels[als_model.user_item_matrix[0].indices])
+        assert len(recommendations) == 5
+        assert not rated & {product for product, _ in recommendations}
+        expected = [recommendations, als_model.recommend_products(-1, n=5)]
+        assert als_model.recommend_products_batch([user_id, -1], n=5) == expected
+
+        product_id = als_model.product_lookup.labels[0]
+        assert product_id not in [product for product, _ in als_model.similar_products(product_id, n=3)]
+
+    def test_evaluate(self, random_interaction_data):
+        """Test rating and ranking evaluation run on the factor scores"""
+        train = random_interaction_data.sample(frac=0.8, random_state=0)
+        test = random_interaction_data.drop(train.index)
+        model = ALSRecommendationModel(min_interactions=1, n_factors=4).fit(train)
+
+        metrics = model.evaluate(test)
+        assert metrics["rmse"] > 0
+        assert metrics["coverage"] > 0.9
+        assert model.evaluate_ranking(test, k=5, n_jobs=2) == model.evaluate_ranking(test, k=5)
+
+    def test_save_and_load(self, als_model, tmp_path):
+        """Test the factors round-trip through the directory format and the base loader"""
+        path = str(tmp_path / "model")
+        als_model.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+
+        assert isinstance(loaded, ALSRecommendationModel)
+        assert not loaded.user_factors.flags.writeable
+        user_ids = list(als_model.user_lookup.labels)
+        assert loaded.recommend_products_batch(user_ids) == als_model.recommend_products_batch(user_ids)
+        factor_mb = (loaded.user_factors.nbytes + loaded.item_factors.nbytes) / 2**20
+        assert loaded.model_size_mb() > factor_mb
+
+        with pytest.raises(ValueError):
+            als_model.save_model(str(tmp_path / "model.pkl"))
+
+    def test_topn_table(self, als_model, tmp_path):
+        """Test the serving table is written from the factor scores"""
+        write_topn_table(als_model, str(tmp_path / "topn"), n=5)
+        user_id = als_model.user_lookup.labels[3]
+        product_ids, _ = TopNTable(str(tmp_path / "topn")).lookup(user_id)
+        assert list(product_ids) == [product for product, _ in als_model.recommend_products(user_id, n=5)]
+
+    def test_partial_fit(self, als_model, tmp_path):
+        """Test new users are folded in after loading a memory-mapped model"""
+        path = str(tmp_path / "model")
+        als_model.save_model(path)
+        loaded = CollaborativeFilteringModel.load_model(path)
+
+        products = list(als_model.product_lookup.labels[:3])
+        loaded.partial_fit(pd.DataFrame({"user_id": [999] * 3, "product_id": products, "rating": [5.0, 4.0, 5.0]}))
+
+        assert loaded.user_factors.shape[0] == len(als_model.user_lookup) + 1
+        assert np.abs(loaded.user_factors[loaded.user_lookup[999]]).sum() > 0
+        recommendations = loaded.recommend_products(999, n=5)
+        assert len(recommendations) == 5
+        assert not set(products) & {product for product, _ in recommendations}
+
+    def test_partial_fit_solves_only_merged_rows(self, als_model):
+        """Test rows dropped by min_interactions re-solve no factor and leave the model as it was"""
+        als_model.min_interactions = 2
+        user_factors, item_factors = als_model.user_factors.copy(), als_model.item_factors.copy()
+        known_user, known_product = als_model.user_lookup.labels[0], als_model.product_lookup.labels[0]
+
+        # A known user with a product seen once, and a new user with a single row: both rows are dropped
+        als_model.partial_fit(
+            pd.DataFrame({"user_id": [known_user, 999], "product_id": ["P_new", known_product], "rating": [5.0, 4.0]})
+        )
+        np.testing.assert_array_equal(als_model.user_factors, user_factors)
+        np.testing.assert_array_equal(als_model.item_factors, item_factors)
+
+        # Only the merged row's user and product are solved again
+        product = als_model.product_lookup.labels[1]
+        als_model.partial_fit(
+            pd.DataFrame({"user_id": [known_user, 999], "product_id": [product, "P_new"], "rating": [5.0, 4.0]})
+        )
+        changed_users = np.flatnonzero(np.any(als_model.user_factors != user_factors, axis=1))
+        changed_items = np.flatnonzero(np.any(als_model.item_factors != item_factors, axis=1))
+        assert list(changed_users) == [als_model.user_lookup[known_user]]
+        assert list(changed_items) == [als_model.product_lookup[product]]
+
+
+class TestSessionScoring:
+    """Test scoring anonymous sessions of viewed products"""
+
+    @pytest.fixture(params=["full", "knn", "als"])
+    def trained_model(self, request, random_interaction_data):
+        if request.param == "als":
+            return ALSRecommendationModel(min_interactions=1, n_factors=8, n_iterations=5).fit(random_interaction_data)
+        similarity_top_k = 5 if request.param == "knn" else None
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=similarity_top_k)
+        return model.fit(random_interaction_data)
+
+    def test_scores_sum_viewed_similarities(self, trained_model):
+        """Test each product scores its summed positive similarity to the viewed products"""
+        viewed = list(trained_model.product_lookup.labels[[3, 10, 42]])
+        scores = trained_model.score_session(viewed + ["unknown"])
+
+        if isinstance(trained_model, ALSRecommendationModel):
+            factors = trained_model.item_factors / np.linalg.norm(trained_model.item_factors, axis=1, keepdims=True)
+            similarity = factors @ factors.T
+        else:
+            similarity = csr_matrix(trained_model._item_neighbor_matrix()).toarray()
+        np.fill_diagonal(similarity, 0)
+        expected = np.clip(similarity[[3, 10, 42]], 0, None).sum(axis=0)
+        expected[[3, 10, 42]] = 0
+        np.testing.assert_allclose(scores, expected, atol=1e-12)
+
+    def test_unknown_user_uses_viewed_products(self, trained_model):
+        """Test unknown users are scored from their session, falling back to popularity"""
+        viewed = list(trained_model.product_lookup.labels[:4])
+        recommendations = trained_model.recommend_products(-1, n=5, viewed_products=viewed)
+
+        assert recommendations == trained_model.recommend_for_session(viewed, n=5)
+        assert recommendations != trained_model.recommend_products(-1, n=5)
+        assert not set(viewed) & {product for product, _ in recommendations}
+        popular = trained_model.recommend_products(-1, n=5)
+        assert trained_model.recommend_products(-1, n=5, viewed_products=["unknown"]) == popular
+
+    def test_batch_sessions_match_single_sessions(self, trained_model):
+        """Test sessions scored together match score_session and recommend_for_session one by one"""
+        labels = list(trained_model.product_lookup.labels)
+        sessions = [labels[3:6], [labels[10], labels[10], "unknown"], [], ["unknown"], labels[40:41]]
+        scores = trained_model.score_sessions(sessions).toarray()
+        for session, row in zip(sessions, scores):
+            np.testing.assert_allclose(row, trained_model.score_session(session), atol=1e-12)
+
+        batch = trained_model.recommend_for_sessions(sessions, n=5, block_size=2)
+        for session, recommendations in zip(sessions, batch):
+            expected = trained_model.recommend_for_session(session, n=5)
+            assert [product for product, _ in recommendations] == [product for product, _ in expected]
+
+    def test_batch_sessions_repeating_a_product(self, trained_model):
+        """Test a product viewed twice is still excluded once, never scored negative"""
+        labels = list(trained_model.product_lookup.labels)
+        sessions = [[labels[3], labels[3], labels[7]], [labels[7], labels[3], labels[7]]]
+        scores = trained_model.score_sessions(sessions).toarray()
+        for session, row in zip(sessions, scores):
+            np.testing.assert_allclose(row, trained_model.score_session(session), atol=1e-12)
+            assert row.min() >= 0
+            assert row[[3, 7]].tolist() == [0, 0]
+
+    def test_batch_uses_viewed_products_of_unknown_users(self, trained_model):
+        """Test recommend_products_batch scores unknown users like recommend_products, in order"""
+        labels = list(trained_model.product_lookup.labels)
+        user_ids = [trained_model.user_lookup.labels[0], -1, -2, trained_model.user_lookup.labels[1]]
+        viewed = [labels[:2], labels[5:8], [], []]
+
+        batch = trained_model.recommend_products_batch(user_ids, n=5, viewed_products=viewed)
+        for user_id, session, recommendations in zip(user_ids, viewed, batch):
+            expected = trained_model.recommend_products(user_id, n=5, viewed_products=session)
+            assert [product for product, _ in recommendations] == [product for product, _ in expected]
+
+    def test_topn_table_matches_model(self, trained_model, tmp_path):
+        """Test the table's neighbor graph scores sessions like the model when no neighbor is pruned"""
+        n_items = trained_model.user_item_matrix.shape[1]
+        write_topn_table(trained_model, str(tmp_path / "topn"), n=5, block_size=16, neighbor_k=n_items)
+        table = TopNTable(str(tmp_path / "topn"))
+
+        viewed = list(trained_model.product_lookup.labels[[1, 5, 9]])
+        product_ids, scores = table.score_session(viewed + ["unknown"], n=5)
+        expected = trained_model.recommend_for_session(viewed, n=5)
+        assert list(product_ids) == [product for product, _ in expected]
+        np.testing.assert_allclose(scores, [score for _, score in expected], rtol=1e-5)
+        assert table.score_session(["unknown"], n=5) is None
+
+
+class TestInstrumentation:
+    """Test phase timings and call latencies recorded by the models"""
+
+    def test_disabled_by_default(self, random_interaction_data):
+        """Test a model records nothing until instrumentation is enabled"""
+        model = CollaborativeFilteringModel(min_interactions=1).fit(random_interaction_data)
+        model.recommend_products(model.user_lookup.labels[0])
+
+        assert not model.instrumentation.enabled
+        assert model.instrumentation.mlflow_metrics() == {}
+        assert CollaborativeFilteringModel.instrumentation is not model.instrumentation
+
+    def test_training_phases(self, random_interaction_data):
+        """Test each training phase is recorded with the sizes of the matrices it built"""
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=5)
+        model.instrumentation.enable()
+        model.fit(random_interaction_data)
+        model.evaluate(random_interaction_data)
+
+        phases = model.instrumentation.phases
+        assert list(phases) == ["filter", "pivot", "popularity", "user_similarity", "item_similarity", "evaluate"]
+        assert phases["pivot"].matrices["user_item_matrix"] == {
+            "rows": model.user_item_matrix.shape[0],
+            "cols": model.user_item_matrix.shape[1],
+            "nnz": model.user_item_matrix.nnz,
+        }
+        assert phases["user_similarity"].matrices["user_similarity"]["nnz"] == model.user_similarity.nnz
+        assert phases["item_similarity"].matrices["item_similarity"]["nnz"] == model.item_similarity.nnz
+        assert all(record.seconds > 0 for record in phases.values())
+
+    def test_serving_latencies(self, random_interaction_data):
+        """Test recommend_products and the predict_hybrid call it makes are both timed"""
+        model = CollaborativeFilteringModel(min_interactions=1).fit(random_interaction_data)
+        model.instrumentation.enable()
+        for user_id in model.user_lookup.labels[:5]:
+            model.recommend_products(user_id)
+        model.recommend_products(-1)
+
+        latencies = model.instrumentation.latencies
+        assert latencies["recommend_products"].count == 6
+        assert latencies["predict_hybrid"].count == 5
+
+    def test_als_phases(self, random_interaction_data):
+        """Test the ALS model records its factor solves and latent factor shapes"""
+        model = ALSRecommendationModel(min_interactions=1, n_factors=4, n_iterations=2)
+        model.instrumentation.enable()
+        model.fit(random_interaction_data)
+        model.predict_hybrid(0)
+
+        factors = model.instrumentation.phases["factors"].matrices
+        assert factors["item_factors"] == {"rows": model.item_factors.shape[0], "cols": 4, "nnz": model.item_factors.size}
+        assert model.instrumentation.latencies["predict_hybrid"].count == 1
+
+    def test_partial_fit_phase(self, random_interaction_data):
+        """Test partial_fit is recorded as one phase"""
+        model = CollaborativeFilteringModel(min_interactions=1, similarity_top_k=5).fit(random_interaction_data)
+        model.instrumentation.enable()
+        model.partial_fit(pd.DataFrame({"user_id": [0, 1], "product_id": ["P1", "P2"], "rating": [5.0, 1.0]}))
+
+        assert model.instrumentation.phase_calls["partial_fit"] == 1
+
 
 class TestModelPerformance:
     """Test model performance characteristics"""
@@ -181,8 +1259,8 @@ class TestModelPerformance:
 
         # Get user's rated items
         user_idx = model.user_lookup[user_id]
-        rated_items = model.user_item_matrix.iloc[user_idx]
-        rated_products = set(rated_items[rated_items > 0].index)
+        rated_items = model.user_item_matrix[user_idx].indices
+        rated_products = set(model.product_lookup.labels[rated_items])
 
         # Check recommendations don't include rated items
         recommended_products = set(rec[0] for rec in recommendations)
@@ -0,0 +1,73 @@
+"""
+Unit tests for compact matrix storage
+Branch: feature/ml-model
+"""
+
+import pytest
+import numpy as np
+from scipy.sparse import csr_matrix, random as sparse_random
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from quantization import QuantizedCSR, compact_ratings, compact_similarity, expanded
+
+
+@pytest.fixture
+def similarity():
+    """Sparse similarity-like matrix with rows of very different magnitudes and one empty row"""
+    matrix = sparse_random(50, 50, density=0.2, format="csr", random_state=5)
+    matrix.data = matrix.data * 2 - 1
+    scales = np.logspace(-3, 0, 50)
+    scales[7] = 0
+    matrix = csr_matrix(matrix.multiply(scales[:, np.newaxis]))
+    matrix.eliminate_zeros()
+    return matrix
+
+
+class TestQuantizedCSR:
+    """Test int8 codes with per-row scales"""
+
+    def test_error_within_half_a_step_per_row(self, similarity):
+        """Test every value is restored to within half of its own row's quantization step"""
+        quantized = QuantizedCSR.from_csr(similarity)
+        restored = quantized.tocsr()
+
+        assert quantized.codes.dtype == np.int8
+        assert np.abs(quantized.codes.data).max() == 127
+        assert restored.dtype == np.float32
+        error = np.abs((restored - similarity).toarray())
+        steps = np.abs(similarity).max(axis=1).toarray() / 127
+        assert np.all(error <= steps / 2 + 1e-7)
+
+    def test_row_selection(self, similarity):
+        """Test selecting rows dequantizes just those rows, integers included"""
+        quantized = QuantizedCSR.from_csr(similarity)
+        np.testing.assert_array_equal(quantized[[3, 7, 9]].toarray(), quantized.tocsr()[[3, 7, 9]].toarray())
+        np.testing.assert_array_equal(quantized[3].toarray(), quantized.tocsr()[[3]].toarray())
+        assert quantized[7].nnz == 0
+
+    def test_requantizing_is_stable(self, similarity):
+        """Test quantizing dequantized rows gives back the same codes"""
+        quantized = QuantizedCSR.from_csr(similarity)
+        again = QuantizedCSR.from_csr(quantized.tocsr())
+        np.testing.assert_array_equal(again.codes.data, quantized.codes.data)
+
+    def test_compact_helpers(self, similarity):
+        """Test the precision helpers pick the storage type and leave float64 alone"""
+        assert compact_similarity(similarity, "float64") is similarity
+        assert compact_similarity(similarity, "float32").dtype == np.float32
+        assert isinstance(compact_similarity(similarity, "int8"), QuantizedCSR)
+        assert expanded(similarity) is similarity
+
+        stars = csr_matrix(np.array([[5.0, 0, 3.0], [0, 1.0, 0]]))
+        assert compact_ratings(stars, "int8").dtype == np.uint8
+        assert compact_ratings(stars, "float32").dtype == np.float32
+        half_stars = csr_matrix(np.array([[4.5, 0, 3.0]]))
+        assert compact_ratings(half_stars, "int8").dtype == np.float32
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,71 @@
+"""
+Unit tests for vectorized ranking metrics
+Branch: feature/ml-model
+"""
+
+import pytest
+import numpy as np
+from scipy.sparse import csr_matrix
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ranking_metrics import ranking_hits, ranking_metric_sums
+
+
+def reference_metrics(ranked, relevant, k):
+    """Textbook per-user definitions"""
+    hits = [item in relevant for item in ranked[:k]]
+    n_hits = sum(hits)
+    dcg = sum(1 / np.log2(rank + 2) for rank, hit in enumerate(hits) if hit)
+    idcg = sum(1 / np.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    precisions = [sum(hits[: rank + 1]) / (rank + 1) for rank, hit in enumerate(hits) if hit]
+    return {
+        "precision": n_hits / k,
+        "recall": n_hits / len(relevant),
+        "ndcg": dcg / idcg,
+        "map": sum(precisions) / min(len(relevant), k),
+    }
+
+
+class TestRankingMetrics:
+    """Test batch metrics against per-user loops"""
+
+    def test_matches_reference(self):
+        """Test batch sums equal the sum of per-user textbook metrics"""
+        rng = np.random.default_rng(0)
+        n_users, n_items, k = 30, 50, 5
+        top_items = np.array([rng.choice(n_items, size=k, replace=False) for _ in range(n_users)])
+        relevant_sets = [set(rng.choice(n_items, size=rng.integers(1, 8), replace=False)) for _ in range(n_users)]
+
+        rows = np.repeat(np.arange(n_users), [len(items) for items in relevant_sets])
+        cols = np.concatenate([sorted(items) for items in relevant_sets])
+        relevant = csr_matrix((np.ones(len(cols)), (rows, cols)), shape=(n_users, n_items))
+
+        hits = ranking_hits(top_items, np.ones_like(top_items, dtype=bool), relevant)
+        sums = ranking_metric_sums(hits, np.diff(relevant.indptr), k)
+
+        expected = [reference_metrics(list(top_items[u]), relevant_sets[u], k) for u in range(n_users)]
+        for name in ["precision", "recall", "ndcg", "map"]:
+            assert sums[name] == pytest.approx(sum(metrics[name] for metrics in expected))
+
+    def test_invalid_slots_never_hit(self):
+        """Test padded slots are not counted even if they point at a relevant item"""
+        relevant = csr_matrix(np.array([[1, 0, 1, 0]]))
+        top_items = np.array([[0, 2, 0]])
+        valid = np.array([[True, False, False]])
+
+        hits = ranking_hits(top_items, valid, relevant)
+
+        np.testing.assert_array_equal(hits, [[True, False, False]])
+
+    def test_no_relevant_items(self):
+        """Test an empty relevance matrix yields no hits"""
+        hits = ranking_hits(np.array([[0, 1]]), np.ones((1, 2), dtype=bool), csr_matrix((1, 3)))
+        assert not hits.any()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
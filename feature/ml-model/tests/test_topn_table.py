@@ -0,0 +1,122 @@
+"""
+Unit tests for the precomputed top-N table
+Branch: feature/ml-model
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from recommendation_model import CollaborativeFilteringModel
+from topn_table import TopNTable, save_topn_arrays, write_topn_table
+
+
+@pytest.fixture
+def trained_model():
+    """Model trained on a small random dataset with string product ids"""
+    rng = np.random.default_rng(11)
+    n = 500
+    df = pd.DataFrame(
+        {
+            "user_id": rng.integers(0, 30, n),
+            "product_id": [f"P{i}" for i in rng.integers(0, 60, n)],
+            "rating": rng.integers(1, 6, n).astype(float),
+        }
+    ).drop_duplicates(subset=["user_id", "product_id"])
+
+    model = CollaborativeFilteringModel(min_interactions=1)
+    model.create_interaction_matrix(df)
+    model.compute_user_similarity()
+    model.compute_item_similarity()
+    return model
+
+
+class TestTopNTable:
+    """Test writing and reading the top-N table"""
+
+    def test_matches_batch_recommendations(self, trained_model, tmp_path):
+        """Test every user's slice equals recommend_products_batch"""
+        path = str(tmp_path / "topn")
+        manifest = write_topn_table(trained_model, path, n=5, block_size=7)
+        table = TopNTable(path)
+
+        user_ids = list(trained_model.user_lookup.labels)
+        expected = trained_model.recommend_products_batch(user_ids, n=5)
+
+        assert len(table) == len(user_ids)
+        assert manifest["n_entries"] == sum(len(recs) for recs in expected)
+        for user_id, recs in zip(user_ids, expected):
+            product_ids, scores = table.lookup(user_id)
+            assert product_ids.tolist() == [product for product, _ in recs]
+            np.testing.assert_allclose(scores, [score for _, score in recs], rtol=1e-6)
+
+    def test_arrays_are_memory_mapped(self, trained_model, tmp_path):
+        """Test the reader does not load the arrays into memory"""
+        path = str(tmp_path / "topn")
+        write_topn_table(trained_model, path)
+        table = TopNTable(path)
+
+        assert isinstance(table.items, np.memmap)
+        assert table.items.dtype == np.int32
+        assert table.scores.dtype == np.float32
+
+    def test_unknown_user(self, trained_model, tmp_path):
+        """Test users missing from the table return None"""
+        path = str(tmp_path / "topn")
+        write_topn_table(trained_model, path)
+        table = TopNTable(path)
+
+        assert 999 not in table
+        assert table.lookup(999) is None
+
+    def test_rewrite_replaces_table(self, tmp_path):
+        """Test writing over an open table publishes the new one and leaves the mapped one intact"""
+        path = str(tmp_path / "topn")
+        save_topn_arrays(path, [1], [10, 20], [0, 2], [1, 0], [0.9, 0.5])
+        previous = TopNTable(path)
+        save_topn_arrays(path, [1, 2], [10, 20], [0, 1, 1], [0], [0.7])
+
+        table = TopNTable(path)
+        assert table.lookup(1)[0].tolist() == [10]
+        assert table.lookup(2)[0].tolist() == []
+        assert previous.lookup(1)[0].tolist() == [20, 10]
+        assert os.path.islink(path)
+
+        # Only the published version and the one before stay on disk
+        save_topn_arrays(path, [3], [10, 20], [0, 1], [1], [0.4])
+        assert len([entry for entry in os.listdir(tmp_path) if entry.startswith("topn.v")]) == 2
+
+    def test_session_without_neighbor_graph(self, trained_model, tmp_path):
+        """Test tables written without neighbors hold no neighbor arrays and score no session"""
+        path = str(tmp_path / "topn")
+        manifest = write_topn_table(trained_model, path, neighbor_k=None)
+        table = TopNTable(path)
+
+        assert manifest["n_neighbor_entries"] is None
+        assert not table.has_neighbors
+        assert table.score_session(["P1", "P2"], n=5) is None
+
+    def test_neighbor_graph_is_pruned(self, trained_model, tmp_path):
+        """Test every product keeps at most neighbor_k neighbors, never itself"""
+        path = str(tmp_path / "topn")
+        write_topn_table(trained_model, path, neighbor_k=3)
+        table = TopNTable(path)
+
+        assert np.diff(table.neighbor_offsets).max() <= 3
+        rows = np.repeat(np.arange(len(table.product_ids)), np.diff(table.neighbor_offsets))
+        assert not np.any(table.neighbor_items == rows)
+        assert np.all(table.neighbor_scores > 0)
+
+    def test_inconsistent_offsets_rejected(self, tmp_path):
+        """Test offsets must cover the item array"""
+        with pytest.raises(ValueError):
+            save_topn_arrays(str(tmp_path / "topn"), [1, 2], [10], [0, 1], [0], [0.5])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
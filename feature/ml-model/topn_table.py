@@ -0,0 +1,211 @@
+"""
+Precomputed Top-N Recommendation Table
+Branch: feature/ml-model
+
+Every known user's top-N is scored once, offline, and written as flat arrays:
+
+- ``items.npy``   int32 product positions, all users concatenated
+- ``scores.npy``  float32 scores aligned with ``items.npy``
+- ``offsets.npy`` int64, user ``u`` owns ``items[offsets[u]:offsets[u + 1]]``
+- ``user_ids.npy`` / ``product_ids.npy`` original ids for rows and positions
+- ``neighbor_items.npy`` / ``neighbor_scores.npy`` / ``neighbor_offsets.npy``
+  optional item neighbor graph in the same layout, product ``i`` owning
+  ``neighbor_items[neighbor_offsets[i]:neighbor_offsets[i + 1]]``
+- ``manifest.json`` format version and scoring parameters
+
+The reader only needs numpy and memory-maps the arrays, so serving a known
+user is a dict lookup plus one array slice, and a session of viewed products
+is scored by summing the neighbor slices of the products in it.
+"""
+
+import json
+import os
+import time
+import logging
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from model_store import new_version_directory, publish_version
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+ARRAY_FILES = ("items", "scores", "offsets", "user_ids", "product_ids")
+NEIGHBOR_FILES = ("neighbor_items", "neighbor_scores", "neighbor_offsets")
+
+
+def _id_array(labels) -> np.ndarray:
+    """Ids as a plain numpy array that can be memory-mapped (no object dtype)"""
+    array = np.asarray(labels)
+    if array.dtype == object:
+        array = array.astype(str)
+    return array
+
+
+def save_topn_arrays(
+    path: str,
+    user_ids,
+    product_ids,
+    offsets: np.ndarray,
+    items: np.ndarray,
+    scores: np.ndarray,
+    metadata: Dict = None,
+    neighbors=None,
+):
+    """Write a top-N table directory from already computed arrays and return its manifest
+
+    ``neighbors`` optionally holds ``(offsets, items, scores)`` of a product
+    neighbor graph, laid out like the user arrays, used to score sessions. The table is written to a new version
+    directory and ``path`` is switched to it at the end, so a reader never sees a half-written table.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    user_ids = _id_array(user_ids)
+    if len(offsets) != len(user_ids) + 1:
+        raise ValueError("offsets must have one entry per user plus one")
+    if len(items) != len(scores) or offsets[-1] != len(items):
+        raise ValueError("items and scores must match the offsets")
+
+    arrays = {
+        "items": np.asarray(items, dtype=np.int32),
+        "scores": np.asarray(scores, dtype=np.float32),
+        "offsets": offsets,
+        "user_ids": user_ids,
+        "product_ids": _id_array(product_ids),
+    }
+    if neighbors is not None:
+        neighbor_offsets, neighbor_items, neighbor_scores = neighbors
+        if len(neighbor_offsets) != len(arrays["product_ids"]) + 1 or neighbor_offsets[-1] != len(neighbor_items):
+            raise ValueError("neighbor offsets must have one entry per product plus one and cover the neighbor items")
+        arrays["neighbor_items"] = np.asarray(neighbor_items, dtype=np.int32)
+        arrays["neighbor_scores"] = np.asarray(neighbor_scores, dtype=np.float32)
+        arrays["neighbor_offsets"] = np.asarray(neighbor_offsets, dtype=np.int64)
+    staging = new_version_directory(path)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), array, allow_pickle=False)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "n_users": len(user_ids),
+        "n_entries": int(len(items)),
+        "n_neighbor_entries": None if neighbors is None else int(len(arrays["neighbor_items"])),
+    }
+    manifest.update(metadata or {})
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    publish_version(path, staging)
+    return manifest
+
+
+def write_topn_table(
+    model, path: str, n: int = None, alpha: float = 0.5, block_size: int = 1024, neighbor_k: int = 50
+) -> Dict:
+    """Score every known user of a trained model and write the top-N table
+
+    The ``neighbor_k`` strongest session neighbors of every product are stored
+    too, so users missing from the table can be scored from what they viewed
+    (``neighbor_k=None`` leaves them out). Returns the manifest written with the table.
+    """
+    if n is None:
+        n = model.n_recommendations
+
+    start_time = time.perf_counter()
+    n_users = model.user_item_matrix.shape[0]
+    lengths = np.zeros(n_users, dtype=np.int64)
+    item_blocks, score_blocks = [], []
+
+    for start, top_indices, top_scores in model._top_n_blocks(np.arange(n_users), n, alpha, block_size):
+        valid = top_indices >= 0
+        lengths[start : start + len(top_indices)] = valid.sum(axis=1)
+        item_blocks.append(top_indices[valid].astype(np.int32))
+        score_blocks.append(top_scores[valid].astype(np.float32))
+
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    items = np.concatenate(item_blocks) if item_blocks else np.zeros(0, dtype=np.int32)
+    scores = np.concatenate(score_blocks) if score_blocks else np.zeros(0, dtype=np.float32)
+
+    neighbors = None
+    if neighbor_k is not None:
+        graph = model.item_neighbor_graph(neighbor_k, block_size)
+        neighbors = (graph.indptr, graph.indices, graph.data)
+
+    metadata = {"n": n, "alpha": alpha, "neighbor_k": neighbor_k, "created_at": time.time()}
+    manifest = save_topn_arrays(
+        path, model.user_lookup.labels, model.product_lookup.labels, offsets, items, scores, metadata, neighbors
+    )
+
+    logger.info(f"Top-N table for {n_users} users written to {path} in {time.perf_counter() - start_time:.1f}s")
+    return manifest
+
+
+class TopNTable:
+    """Read-only, memory-mapped view of a precomputed top-N table"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Resolve the version link once, so a rewrite during the load cannot mix two tables
+        path = os.path.realpath(path)
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported top-N table format: {self.manifest.get('format_version')}")
+
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAY_FILES}
+        self.items = arrays["items"]
+        self.scores = arrays["scores"]
+        self.offsets = arrays["offsets"]
+        self.product_ids = arrays["product_ids"]
+        self.user_rows = {user_id: row for row, user_id in enumerate(arrays["user_ids"].tolist())}
+
+        self.has_neighbors = all(os.path.isfile(os.path.join(path, f"{name}.npy")) for name in NEIGHBOR_FILES)
+        self.product_rows = {}
+        if self.has_neighbors:
+            neighbors = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in NEIGHBOR_FILES}
+            self.neighbor_items = neighbors["neighbor_items"]
+            self.neighbor_scores = neighbors["neighbor_scores"]
+            self.neighbor_offsets = neighbors["neighbor_offsets"]
+            self.product_rows = {product_id: row for row, product_id in enumerate(self.product_ids.tolist())}
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        """Whether ``path`` holds a complete table"""
+        return bool(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+    def __len__(self) -> int:
+        return len(self.user_rows)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self.user_rows
+
+    def lookup(self, user_id) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Product ids and scores of a user's top-N, best first, or None if the user is not in the table"""
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return None
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.product_ids[self.items[start:end]], self.scores[start:end]
+
+    def score_session(self, product_ids, n: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Top-n product ids and scores for a session of viewed products, best first
+
+        Every product scores the summed neighbor weights of the viewed products,
+        gathered from their slices of the neighbor graph without a Python loop.
+        Viewed products are never returned. Returns None if the table has no
+        neighbor graph or none of the viewed products is known.
+        """
+        rows = np.unique([self.product_rows[pid] for pid in product_ids if pid in self.product_rows]).astype(np.int64)
+        if not self.has_neighbors or len(rows) == 0:
+            return None
+
+        starts, ends = self.neighbor_offsets[rows], self.neighbor_offsets[rows + 1]
+        lengths = ends - starts
+        # Positions of every neighbor slice of the session, concatenated
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        candidates, inverse = np.unique(self.neighbor_items[positions], return_inverse=True)
+        scores = np.bincount(inverse.ravel(), weights=self.neighbor_scores[positions], minlength=len(candidates))
+
+        keep = ~np.isin(candidates, rows)
+        candidates, scores = candidates[keep], scores[keep]
+        best = np.lexsort((candidates, -scores))[:n]
+        return self.product_ids[candidates[best]], scores[best].astype(np.float32)